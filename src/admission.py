@@ -0,0 +1,117 @@
+import asyncio
+import threading
+
+
+class Overloaded(Exception):
+    """La file d'attente est pleine : la requête doit être réessayée plus tard"""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Admission:
+    """Contrôle d'admission asynchrone : concurrence bornée et file d'attente bornée.
+
+    Au plus `limit` requêtes s'exécutent en même temps (ex. appels Ollama) ;
+    `max_queue` autres peuvent attendre leur tour. Au-delà, ou si l'attente
+    dépasse `timeout` secondes, `Overloaded` est levée plutôt que d'empiler
+    du travail que le serveur ne pourra pas servir à temps.
+    """
+
+    def __init__(self, limit, max_queue, timeout=None):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    def check(self):
+        """Refuse immédiatement si la file d'attente est déjà pleine"""
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded("File d'attente pleine", retry_after=self._retry_after())
+
+    async def acquire(self):
+        self.check()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise Overloaded("Délai d'attente dépassé", retry_after=self._retry_after())
+        finally:
+            self.waiting -= 1
+        self.active += 1
+
+    def release(self):
+        self.active -= 1
+        self._semaphore.release()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+    def stats(self):
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_queue": self.max_queue,
+            "rejected": self.rejected
+        }
+
+    def _retry_after(self):
+        # Estimation grossière : une "vague" de requêtes par place libérée
+        return max(1, self.waiting // max(1, self.limit))
+
+
+async def iterate_in_thread(executor, make_iterator):
+    """Consomme un itérateur bloquant dans `executor` et en relaie les éléments.
+
+    L'itérateur tourne dans un thread du pool ; ses éléments sont transmis à la
+    boucle asyncio au fur et à mesure. Si le consommateur s'arrête (client
+    déconnecté), l'itérateur est fermé au prochain élément.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    stopped = threading.Event()
+    done = object()
+
+    def publish(item):
+        if not stopped.is_set():
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+
+    def produce():
+        iterator = make_iterator()
+        try:
+            for item in iterator:
+                if stopped.is_set():
+                    break
+                publish((item, None))
+        except Exception as e:
+            publish((done, e))
+        else:
+            publish((done, None))
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close:
+                close()
+
+    producer = loop.run_in_executor(executor, produce)
+    try:
+        while True:
+            item, error = await queue.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                break
+            yield item
+    finally:
+        # Le producteur s'arrête de lui-même au prochain élément
+        stopped.set()
@@ -0,0 +1,198 @@
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import numpy as np
+import os
+import re
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Portées dont les vecteurs restent en mémoire (les plus récemment consultées)
+MAX_LOADED_SCOPES = 8
+
+
+def normalize_question(question):
+    """Normalise une question pour la correspondance exacte (casse, espaces, ponctuation finale)"""
+    question = re.sub(r'\s+', ' ', question.strip().lower())
+    return question.rstrip(' ?!.')
+
+
+def cache_scope(collection_name, corpus_version, model_name, temperature, settings=None):
+    """Portée d'une réponse : collection, corpus indexé, réglages de découpage et de
+    recherche (`settings`, sérialisable en JSON), modèle et température arrondie au dixième"""
+    digest = hashlib.md5(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+    return f"{collection_name}|{corpus_version}|{digest}|{model_name}|{round(temperature, 1):.1f}"
+
+
+def _normalize_vector(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / (np.linalg.norm(vector) or 1.0)
+
+
+class AnswerCache:
+    """Cache persistant des réponses RAG, exact et sémantique.
+
+    Une question est servie depuis le cache si sa forme normalisée a déjà été vue
+    dans la même portée, ou si son embedding a une similarité cosinus supérieure
+    à `threshold` avec celui d'une question en cache. Les entrées expirent après
+    `ttl` secondes et, au-delà de `max_entries`, les moins récemment utilisées
+    sont évincées.
+    """
+
+    def __init__(self, path, threshold=0.95, ttl=24 * 3600, max_entries=1000):
+        self.path = path
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Vecteurs normalisés par portée, chargés à la demande et limités aux
+        # MAX_LOADED_SCOPES portées les plus récentes : {scope: (ids, matrice)}
+        self._vectors = OrderedDict()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " scope TEXT NOT NULL,"
+            " question_hash TEXT NOT NULL,"
+            " question TEXT NOT NULL,"
+            " embedding BLOB NOT NULL,"
+            " answer TEXT NOT NULL,"
+            " sources TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " UNIQUE (scope, question_hash))"
+        )
+        self._conn.commit()
+
+    def lookup(self, scope, question, embedding):
+        """Retourne {"answer", "sources"} si une réponse correspond, sinon None"""
+        now = time.time()
+        question_hash = hashlib.sha256(normalize_question(question).encode('utf-8')).hexdigest()
+        with self._lock:
+            self._expire(now)
+            row = self._conn.execute(
+                "SELECT id, answer, sources FROM answers WHERE scope = ? AND question_hash = ?",
+                (scope, question_hash)
+            ).fetchone()
+            if row is None:
+                match = self._nearest(scope, _normalize_vector(embedding))
+                if match is not None:
+                    row = self._conn.execute(
+                        "SELECT id, answer, sources FROM answers WHERE id = ?",
+                        (match,)
+                    ).fetchone()
+                    if row is not None:
+                        self.semantic_hits += 1
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._conn.execute("UPDATE answers SET last_used = ? WHERE id = ?", (now, row[0]))
+            self._conn.commit()
+            return {"answer": row[1], "sources": json.loads(row[2])}
+
+    def store(self, scope, question, embedding, answer, sources):
+        """Enregistre une réponse complète pour la question donnée"""
+        now = time.time()
+        question_hash = hashlib.sha256(normalize_question(question).encode('utf-8')).hexdigest()
+        vector = _normalize_vector(embedding)
+        with self._lock:
+            previous = self._conn.execute(
+                "SELECT id FROM answers WHERE scope = ? AND question_hash = ?",
+                (scope, question_hash)
+            ).fetchone()
+            if previous:
+                self._forget([previous[0]])
+            cursor = self._conn.execute(
+                "INSERT OR REPLACE INTO answers "
+                "(scope, question_hash, question, embedding, answer, sources, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (scope, question_hash, question, vector.tobytes(),
+                 answer, json.dumps(sources, default=str), now, now)
+            )
+            if scope in self._vectors:
+                ids, matrix = self._vectors[scope]
+                if matrix.shape[1] == len(vector):
+                    self._vectors[scope] = (np.append(ids, cursor.lastrowid), np.vstack([matrix, vector]))
+                else:
+                    # Autre modèle d'embedding : la portée sera rechargée à la prochaine recherche
+                    del self._vectors[scope]
+            self._evict()
+            self._conn.commit()
+
+    def stats(self):
+        """Compteurs de hits/misses (chaque hit est un appel LLM évité)"""
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": size
+        }
+
+    def _nearest(self, scope, vector):
+        loaded = self._vectors.get(scope)
+        if loaded is None or loaded[1].shape[1] != len(vector):
+            ids, rows = [], []
+            for entry_id, blob in self._conn.execute(
+                "SELECT id, embedding FROM answers WHERE scope = ?", (scope,)
+            ):
+                stored = np.frombuffer(blob, dtype=np.float32)
+                if len(stored) == len(vector):
+                    ids.append(entry_id)
+                    rows.append(stored)
+            matrix = np.vstack(rows) if rows else np.empty((0, len(vector)), dtype=np.float32)
+            loaded = (np.array(ids, dtype=np.int64), matrix)
+            self._vectors[scope] = loaded
+            while len(self._vectors) > MAX_LOADED_SCOPES:
+                self._vectors.popitem(last=False)
+        self._vectors.move_to_end(scope)
+
+        ids, matrix = loaded
+        if not len(ids):
+            return None
+        scores = matrix @ vector
+        best = int(np.argmax(scores))
+        return int(ids[best]) if scores[best] >= self.threshold else None
+
+    def _forget(self, ids):
+        for scope, (scope_ids, matrix) in list(self._vectors.items()):
+            keep = ~np.isin(scope_ids, ids)
+            if keep.all():
+                continue
+            if keep.any():
+                self._vectors[scope] = (scope_ids[keep], matrix[keep])
+            else:
+                # Plus aucune réponse dans cette portée (corpus réindexé, entrées expirées)
+                del self._vectors[scope]
+
+    def _expire(self, now):
+        expired = [row[0] for row in self._conn.execute(
+            "SELECT id FROM answers WHERE created_at < ?", (now - self.ttl,)
+        )]
+        if expired:
+            self._conn.executemany("DELETE FROM answers WHERE id = ?", [(i,) for i in expired])
+            self._forget(expired)
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        evicted = [row[0] for row in self._conn.execute(
+            "SELECT id FROM answers ORDER BY last_used ASC LIMIT ?", (count - self.max_entries,)
+        )]
+        self._conn.executemany("DELETE FROM answers WHERE id = ?", [(i,) for i in evicted])
+        self._forget(evicted)
+        logger.debug(f"{len(evicted)} réponses évincées du cache")
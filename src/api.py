@@ -0,0 +1,307 @@
+"""API HTTP asynchrone du RAG, pour les outils internes.
+
+Les appels bloquants (Chroma, Drive, Ollama) tournent sur un pool de threads
+borné ; les requêtes qui sollicitent Ollama passent par un contrôle
+d'admission (concurrence et file d'attente bornées) et reçoivent une 503 avec
+`Retry-After` quand le serveur est saturé. L'ingestion est un travail
+d'arrière-plan, dans une file persistante partagée avec l'interface
+Streamlit, dont l'état se consulte par son identifiant. Les deux processus
+peuvent tourner sur le même stockage : les écritures d'une collection sont
+sérialisées par un verrou de fichier, et chacun reprend ce que l'autre a
+indexé ou supprimé avant de lire ou d'écrire. Chaque requête
+peut viser une collection nommée (`collection`) et, pour /query, se limiter
+aux chunks de certains documents (`file_ids`).
+
+Lancement :
+    python src/api.py
+ou  uvicorn api:app --app-dir src --host 0.0.0.0 --port 8000
+
+Endpoints :
+    GET  /documents              PDFs du dossier Drive et état d'indexation
+    GET  /collections            bases de connaissances enregistrées (découpage, statistiques)
+    PUT  /collections/{name}/chunking  politique de découpage (les documents sont à réindexer)
+    POST /upload                 publie des PDFs (multipart) puis lance leur ingestion
+    POST /ingest                 lance l'ingestion (202 + identifiant du travail)
+    GET  /ingest                 dernières ingestions (d'une collection avec `collection`)
+    GET  /ingest/{job_id}        avancement d'une ingestion
+    POST /query                  question RAG (JSON, ou SSE si `stream` est vrai)
+    GET  /health, GET /metrics   état du serveur et métriques Prometheus
+"""
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+from typing import List, Optional, Tuple
+from admission import Admission, Overloaded, iterate_in_thread
+from chunking import normalize_chunk_policy
+from config import Config
+from engine import DEFAULT_COLLECTION, get_engine
+from instrumentation import metrics
+import asyncio
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class QueryRequest(BaseModel):
+    question: str
+    chat_history: List[Tuple[str, str]] = []
+    temperature: Optional[float] = None
+    stream: bool = False
+    # None : toute la collection ; sinon seuls les chunks de ces documents
+    file_ids: Optional[List[str]] = None
+    collection: str = DEFAULT_COLLECTION
+
+
+class ChunkPolicyRequest(BaseModel):
+    # "structured" (tokens) ou "recursive" (caractères) ; champs absents : valeurs par défaut
+    strategy: Optional[str] = None
+    max_tokens: Optional[int] = None
+    min_tokens: Optional[int] = None
+    overlap_tokens: Optional[int] = None
+    chunk_size: Optional[int] = None
+    chunk_overlap: Optional[int] = None
+
+
+class IngestRequest(BaseModel):
+    # None : tous les PDFs du dossier
+    file_ids: Optional[List[str]] = None
+    collection: str = DEFAULT_COLLECTION
+
+
+@asynccontextmanager
+async def lifespan(app):
+    state = app.state
+    state.executor = ThreadPoolExecutor(max_workers=Config.API_WORKERS, thread_name_prefix='api')
+    state.admission = Admission(
+        Config.API_OLLAMA_CONCURRENCY,
+        Config.API_MAX_QUEUE,
+        timeout=Config.API_QUEUE_TIMEOUT
+    )
+    # La collection par défaut (base vectorielle, index BM25) est rouverte
+    # avant d'accepter des requêtes, pour que la première ne paie pas le chargement
+    state.engine = await asyncio.get_running_loop().run_in_executor(state.executor, get_engine)
+    await asyncio.get_running_loop().run_in_executor(
+        state.executor, lambda: state.engine.rag_handler().load()
+    )
+    yield
+    state.engine.jobs.shutdown()
+    state.executor.shutdown(wait=False, cancel_futures=True)
+
+
+app = FastAPI(title="RAG Chat API", lifespan=lifespan)
+
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request, exc):
+    return JSONResponse(
+        {"detail": str(exc)},
+        status_code=503,
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+
+async def run_blocking(request, function, *args):
+    """Exécute un appel bloquant sur le pool de threads de l'API"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(request.app.state.executor, lambda: function(*args))
+
+
+async def collection_handler(request, name):
+    """Handler d'une collection nommée ; 400 si le nom est invalide"""
+    try:
+        return await run_blocking(request, request.app.state.engine.rag_handler, name)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.get("/health")
+async def health(request: Request):
+    state = request.app.state
+    # Le retriever relit le stockage si l'autre processus a écrit : hors de la boucle
+    indexed = await run_blocking(request, lambda: state.engine.rag_handler().retriever is not None)
+    return {
+        "status": "ok",
+        "indexed": indexed,
+        "ollama": state.engine.ollama.status(),
+        "admission": state.admission.stats()
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return metrics.prometheus_text()
+
+
+@app.get("/documents")
+async def list_documents(request: Request, refresh: bool = False,
+                         collection: str = DEFAULT_COLLECTION):
+    engine = request.app.state.engine
+    rag_handler = await collection_handler(request, collection)
+
+    def documents():
+        pdfs = engine.drive_handler.list_public_pdfs(force_refresh=refresh)
+        if pdfs is None:
+            raise HTTPException(502, "Listing Google Drive indisponible")
+        return [
+            {
+                "id": pdf['id'],
+                "name": pdf['name'],
+                "link": pdf.get('webViewLink'),
+                "modified": pdf.get('modifiedTime'),
+                "indexed": rag_handler.is_indexed(pdf['id'], pdf.get('md5Checksum'))
+            }
+            for pdf in pdfs
+        ]
+
+    return await run_blocking(request, documents)
+
+
+@app.get("/collections")
+async def list_collections(request: Request):
+    return await run_blocking(request, request.app.state.engine.collections)
+
+
+@app.put("/collections/{name}/chunking")
+async def set_chunking(request: Request, name: str, body: ChunkPolicyRequest):
+    policy = {key: value for key, value in body.model_dump().items() if value is not None}
+    try:
+        # Avant l'ouverture de la collection, qui la crée si elle n'existe pas
+        normalize_chunk_policy(policy)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    rag_handler = await collection_handler(request, name)
+    try:
+        removed = await run_blocking(request, rag_handler.set_chunk_policy, policy)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return {"chunking": rag_handler.chunk_policy, "removed": removed}
+
+
+@app.post("/upload")
+async def upload(request: Request, files: List[UploadFile] = File(...),
+                 collection: str = Form(DEFAULT_COLLECTION), ingest: bool = Form(True)):
+    """Publie les PDFs dans le dossier Drive puis, par défaut, les ingère en arrière-plan"""
+    state = request.app.state
+    await collection_handler(request, collection)
+    drive_handler = await run_blocking(request, lambda: state.engine.drive_handler)
+    # Les fichiers sont envoyés depuis les tampons de la requête, sans copie
+    results = await run_blocking(
+        request, drive_handler.upload_pdfs, [(file.filename, file.file) for file in files]
+    )
+    uploaded = [
+        {
+            "name": result['name'],
+            "status": result['status'],
+            "id": result['file']['id'] if result['file'] else None,
+            "error": result['error']
+        }
+        for result in results
+    ]
+    pdfs = [result['file'] for result in results if result['file']]
+    if not ingest or not pdfs:
+        return {"files": uploaded, "job": None}
+    job = await run_blocking(request, state.engine.ingest_in_background, pdfs, collection)
+    return JSONResponse(
+        {"files": uploaded, "job": job},
+        status_code=202,
+        headers={"Location": f"/ingest/{job['id']}"}
+    )
+
+
+@app.post("/ingest", status_code=202)
+async def ingest(request: Request, body: IngestRequest):
+    state = request.app.state
+    await collection_handler(request, body.collection)
+    drive_handler = await run_blocking(request, lambda: state.engine.drive_handler)
+    pdfs = await run_blocking(request, drive_handler.list_public_pdfs)
+    if pdfs is None:
+        raise HTTPException(502, "Listing Google Drive indisponible")
+    if body.file_ids is not None:
+        by_id = {pdf['id']: pdf for pdf in pdfs}
+        missing = [file_id for file_id in body.file_ids if file_id not in by_id]
+        if missing:
+            raise HTTPException(404, f"PDFs introuvables: {', '.join(missing)}")
+        pdfs = [by_id[file_id] for file_id in body.file_ids]
+
+    job = await run_blocking(request, state.engine.ingest_in_background, pdfs, body.collection)
+    return JSONResponse(job, status_code=202, headers={"Location": f"/ingest/{job['id']}"})
+
+
+@app.get("/ingest")
+async def ingest_jobs(request: Request, collection: Optional[str] = None, limit: int = 20):
+    return await run_blocking(request, request.app.state.engine.jobs.list, collection, limit)
+
+
+@app.get("/ingest/{job_id}")
+async def ingest_status(request: Request, job_id: str):
+    job = await run_blocking(request, request.app.state.engine.jobs.get, job_id)
+    if job is None:
+        raise HTTPException(404, "Travail inconnu")
+    return job
+
+
+@app.post("/query")
+async def query(request: Request, body: QueryRequest):
+    state = request.app.state
+    rag_handler = await collection_handler(request, body.collection)
+    admission = state.admission
+
+    if not body.stream:
+        async with admission:
+            return await run_blocking(
+                request,
+                rag_handler.get_response,
+                body.question,
+                body.chat_history,
+                body.temperature,
+                body.file_ids
+            )
+
+    # Refus immédiat (503) si la file est pleine ; sinon la place est attendue
+    # dans le flux lui-même et reste réservée jusqu'à sa fin (ou la déconnexion)
+    admission.check()
+
+    async def events():
+        try:
+            await admission.acquire()
+        except Overloaded as e:
+            yield sse_event("error", {"detail": str(e), "retry_after": e.retry_after})
+            return
+        try:
+            stream = iterate_in_thread(
+                state.executor,
+                lambda: rag_handler.stream_response(
+                    body.question, body.chat_history, body.temperature, body.file_ids
+                )
+            )
+            async for kind, value in stream:
+                if kind == "token":
+                    yield sse_event("token", {"text": value})
+                else:
+                    yield sse_event(kind, value)
+            yield sse_event("done", {})
+        except Exception as e:
+            logger.error(f"Erreur pendant le streaming de la réponse: {e}")
+            yield sse_event("error", {"detail": str(e)})
+        finally:
+            admission.release()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    logging.basicConfig(level=Config.LOG_LEVEL)
+    uvicorn.run(app, host=Config.API_HOST, port=Config.API_PORT)
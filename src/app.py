@@ -1,94 +1,304 @@
 import streamlit as st
-from pathlib import Path
-import shutil
-from rag_handler import RAGHandler
-from drive_handler import GoogleDriveHandler
-import os
+from concurrent.futures import ThreadPoolExecutor
+from admission import Overloaded
+from chunking import LEGACY_POLICY, normalize_chunk_policy
+from config import Config
+from engine import DEFAULT_COLLECTION, get_engine, validate_collection_name
+from conversation import message_text
+from instrumentation import metrics, profiled
+import logging
+import time
 
+logging.basicConfig(level=Config.LOG_LEVEL)
 st.set_page_config(page_title="RAG Chat App", layout="wide")
 
 # Constantes
-TEMP_DIR = Path("storage/temp")
-TEMP_DIR.mkdir(parents=True, exist_ok=True)
+UPLOAD_LABELS = {
+    "upload": "⬆️ envoi",
+    "share": "🔓 partage",
+    "done": "✅ publié",
+    "exists": "✅ déjà dans le bucket",
+    "error": "❌ erreur"
+}
+PROGRESS_LABELS = {
+    "download": "⬇️ téléchargement",
+    "parse": "📖 lecture",
+    "index": "🧮 indexation",
+    "done": "✅ indexé",
+    "cached": "✅ déjà à jour",
+    "error": "❌ erreur"
+}
+DEBUG_TRACES = 20
+SHOWN_JOBS = 3
+JOB_POLL_SECONDS = 2
+NEW_COLLECTION = "➕ Nouvelle base..."
+CHUNK_STRATEGIES = {
+    "structured": "Structuré (tokens, titres et tableaux préservés)",
+    "recursive": "Caractères (ancien découpage)"
+}
 
 def init_session_state():
-    if 'drive_handler' not in st.session_state:
-        st.session_state.drive_handler = GoogleDriveHandler()
-    if 'rag_handler' not in st.session_state:
-        st.session_state.rag_handler = RAGHandler()
-    if 'pdf_files' not in st.session_state:
-        st.session_state.pdf_files = []
+    # Les handlers Drive/RAG sont partagés par le moteur du processus :
+    # la session ne garde que l'historique et les réglages.
     if 'selected_pdfs' not in st.session_state:
         st.session_state.selected_pdfs = []
     if 'chat_history' not in st.session_state:
         st.session_state.chat_history = []
-    if 'processed_pdfs' not in st.session_state:
-        st.session_state.processed_pdfs = False
     if 'use_rag' not in st.session_state:
         st.session_state.use_rag = True
     if 'temperature' not in st.session_state:
         st.session_state.temperature = 0.7
+    if 'collection' not in st.session_state:
+        st.session_state.collection = DEFAULT_COLLECTION
+    if 'active_jobs' not in st.session_state:
+        st.session_state.active_jobs = set()
 
-def save_uploaded_file_temp(uploaded_file):
-    """Sauvegarde temporairement un fichier uploadé"""
-    temp_path = TEMP_DIR / uploaded_file.name
-    with open(temp_path, "wb") as f:
-        f.write(uploaded_file.getbuffer())
-    return temp_path
+def format_turn_stats(stats):
+    """Résumé du coût d'une réponse : durées, appels LLM et tokens estimés"""
+    timings = " · ".join(
+        f"{step} {seconds:.2f}s" for step, seconds in stats["timings"].items()
+    )
+    origin = "cache" if stats["cache_hit"] else f"{stats['llm_calls']} appel(s) LLM"
+    return (
+        f"⏱️ {timings} — {origin}, ~{stats['prompt_tokens']} tokens en entrée, "
+        f"~{stats['completion_tokens']} en sortie"
+    )
 
-def cleanup_temp_files():
-    """Nettoie les fichiers temporaires"""
-    for file in TEMP_DIR.glob("*"):
-        if file.is_file():
-            file.unlink()
+def format_sources(sources):
+    """Une ligne par document cité, avec les pages exactes des passages retenus"""
+    pages = {}
+    for source in sources:
+        name = source.get('source', 'Document inconnu')
+        pages.setdefault(name, set())
+        if source.get('page') is not None:
+            pages[name].add(int(source['page']) + 1)
+    lines = []
+    for name, numbers in pages.items():
+        if numbers:
+            label = "p." if len(numbers) == 1 else "pp."
+            lines.append(f"📄 {name} — {label} {', '.join(str(n) for n in sorted(numbers))}")
+        else:
+            lines.append(f"📄 {name}")
+    return lines
+
+def format_collection(collection):
+    return f"📚 {collection['name']} ({collection['documents']} PDF(s), {collection['chunks']} chunks)"
+
+def format_chunk_stats(stats):
+    policy = stats["policy"]
+    if policy["strategy"] == "structured":
+        label = f"✂️ {policy['min_tokens']}–{policy['max_tokens']} tokens par chunk"
+    else:
+        label = f"✂️ {policy['chunk_size']} caractères par chunk"
+    if stats["mean_chunk_tokens"]:
+        label += f" — ~{stats['mean_chunk_tokens']:.0f} tokens en moyenne sur {stats['chunks']} chunks"
+    return label
+
+def chunk_policy_form():
+    """Politique de découpage d'une nouvelle base"""
+    with st.expander("✂️ Découpage des documents"):
+        strategy = st.selectbox("Stratégie", list(CHUNK_STRATEGIES), format_func=CHUNK_STRATEGIES.get)
+        if strategy == "recursive":
+            return LEGACY_POLICY
+        max_tokens = st.number_input("Tokens max par chunk", 64, 2048, Config.CHUNK_MAX_TOKENS, step=32)
+        # Bornes qui suivent max_tokens : la politique proposée est toujours valide
+        min_tokens = st.number_input(
+            "Tokens min (fragments fusionnés en dessous)", 0, max_tokens,
+            min(Config.CHUNK_MIN_TOKENS, max_tokens), step=16
+        )
+        overlap_tokens = st.number_input(
+            "Tokens de recouvrement entre chunks", 0, max_tokens // 2 - 1,
+            min(Config.CHUNK_OVERLAP_TOKENS, max_tokens // 2 - 1), step=8
+        )
+        return {
+            "strategy": strategy,
+            "max_tokens": max_tokens,
+            "min_tokens": min_tokens,
+            "overlap_tokens": overlap_tokens
+        }
+
+def select_collection(engine):
+    """Choix de la base de connaissances parmi celles enregistrées sur disque"""
+    collections = {collection['name']: collection for collection in engine.collections()}
+    names = list(collections)
+    current = st.session_state.collection
+    choice = st.selectbox(
+        "Base de connaissances",
+        names + [NEW_COLLECTION],
+        index=names.index(current) if current in names else 0,
+        format_func=lambda name: format_collection(collections[name]) if name in collections else name
+    )
+    if choice == NEW_COLLECTION:
+        name = st.text_input("Nom de la nouvelle base", placeholder="ex. scolarite-2024")
+        policy = chunk_policy_form()
+        if name and st.button("Créer"):
+            try:
+                validate_collection_name(name)
+                if name in collections:
+                    raise ValueError(f"La base {name} existe déjà")
+                # Validée avant l'ouverture, qui écrit le manifeste : une politique
+                # invalide ne laisse pas de base à moitié créée
+                policy = normalize_chunk_policy(policy)
+                engine.rag_handler(name).set_chunk_policy(policy)
+                engine.rag_handler(name).load()
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                choose_collection(name)
+                st.rerun()
+    elif choice != current:
+        choose_collection(choice)
+    rag_handler = engine.rag_handler(st.session_state.collection)
+    st.caption(format_chunk_stats(rag_handler.chunk_stats()))
+    return rag_handler
+
+def choose_collection(name):
+    st.session_state.collection = name
+    # L'historique porte sur les documents de l'ancienne base
+    st.session_state.chat_history = []
+
+def show_debug_panel():
+    """Panneau de diagnostic : dernières requêtes et export des métriques"""
+    with st.expander("🛠️ Debug"):
+        traces = metrics.recent_traces(DEBUG_TRACES)
+        if traces:
+            st.dataframe([
+                {
+                    "type": trace["name"],
+                    **{f"{stage} (ms)": round(seconds * 1000) for stage, seconds in trace["timings"].items()},
+                    **trace["counts"]
+                }
+                for trace in traces
+            ])
+        else:
+            st.caption("Aucune requête mesurée pour l'instant.")
+        col1, col2 = st.columns(2)
+        col1.download_button("Prometheus", metrics.prometheus_text(), file_name="metrics.txt")
+        col2.download_button("JSON", metrics.to_json(), file_name="metrics.json")
+
+def publish_pdfs(engine, drive_handler, uploaded_files):
+    """Publie les PDFs uploadés puis lance leur ingestion en arrière-plan dans la base courante"""
+    status = st.status(f"Publication de {len(uploaded_files)} PDF(s)...", expanded=True)
+    placeholders = {uploaded.name: status.empty() for uploaded in uploaded_files}
+    progress = {}
+
+    def show_progress():
+        for name, (stage, detail) in list(progress.items()):
+            label = UPLOAD_LABELS[stage]
+            if stage == "upload":
+                label = f"{label} {detail:.0%}"
+            placeholders[name].write(f"📄 {name} : {label}")
+
+    # Les envois tournent dans des threads : l'affichage est rafraîchi d'ici
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        future = pool.submit(
+            drive_handler.upload_pdfs,
+            [(uploaded.name, uploaded) for uploaded in uploaded_files],
+            lambda name, stage, detail: progress.__setitem__(name, (stage, detail))
+        )
+        while not future.done():
+            show_progress()
+            time.sleep(0.2)
+    results = future.result()
+    show_progress()
+
+    pdfs = [result['file'] for result in results if result['file']]
+    if any(result['status'] == 'error' for result in results):
+        status.update(label="❌ Erreur lors de la publication de certains PDFs", state="error")
+    else:
+        status.update(label=f"✅ {len(pdfs)} PDF(s) publié(s)", state="complete", expanded=False)
+    if pdfs:
+        schedule_ingest(engine, pdfs)
+
+def schedule_ingest(engine, pdfs):
+    """Planifie l'ingestion de PDFs dans la base courante ; l'avancement s'affiche dans la barre latérale"""
+    try:
+        engine.ingest_in_background(pdfs, st.session_state.collection)
+    except Overloaded:
+        st.warning("Trop d'ingestions en cours : traitez ces PDFs plus tard.")
+    else:
+        st.toast(f"⏳ Ingestion de {len(pdfs)} PDF(s) planifiée")
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def show_ingest_jobs(engine):
+    """Avancement des dernières ingestions de la base courante, quelle que soit la session qui les a lancées"""
+    jobs = engine.jobs.list(lane=st.session_state.collection, limit=SHOWN_JOBS)
+    active = {job["id"] for job in jobs if job["status"] in ("queued", "running")}
+    finished = st.session_state.active_jobs - active
+    st.session_state.active_jobs = active
+    if finished:
+        # Une ingestion vient de se terminer : la liste des PDFs indexés (✅) doit suivre
+        st.rerun()
+    if not jobs:
+        return
+    st.subheader("Ingestions en arrière-plan")
+    for job in jobs:
+        items = job["items"].values()
+        processed = sum(1 for item in items if item["stage"] in ("done", "cached", "error"))
+        if job["status"] == "done":
+            st.success(f"🎉 {job['result']['indexed']} PDF(s) indexé(s) dans {job['result']['collection']}")
+        elif job["status"] == "error":
+            st.error(f"❌ Ingestion interrompue après {job['attempts']} essai(s) : {job['error']}")
+        elif job["status"] == "queued" and job["attempts"]:
+            st.warning(f"🔁 Nouvel essai prévu ({job['attempts']}/{Config.INGEST_JOB_ATTEMPTS}) : {job['error']}")
+        elif job["status"] == "queued":
+            st.info(f"⏳ {job['total']} PDF(s) en attente")
+        else:
+            st.progress(processed / max(1, job["total"]), text=f"⏳ {processed}/{job['total']} PDF(s) traité(s)")
+        for item in items:
+            if job["status"] == "running" and item["stage"] not in ("done", "cached", "error"):
+                st.caption(f"📄 {item['name']} : {PROGRESS_LABELS[item['stage']]}")
+            elif item["stage"] == "error":
+                st.caption(f"❌ {item['name']} : {item['detail']}")
 
 def main():
     st.title("RAG Chat Application")
     
     init_session_state()
+    engine = get_engine()
+    drive_handler = engine.drive_handler
     
     # Sidebar pour la gestion des PDFs
     with st.sidebar:
+        rag_handler = select_collection(engine)
+
         st.header("Gestion des PDFs")
         
         # Bouton de rafraîchissement
         if st.button("🔄 Rafraîchir les PDFs"):
-            st.session_state.pdf_files = st.session_state.drive_handler.list_public_pdfs()
+            pdf_files = drive_handler.list_public_pdfs(force_refresh=True)
+            if pdf_files is None:
+                st.error("Impossible de lister les PDFs du bucket, l'index n'a pas été modifié")
+            else:
+                # Retire de l'index les documents supprimés du bucket
+                rag_handler.prune_documents([pdf['id'] for pdf in pdf_files])
         
-        # Zone d'upload
-        uploaded_file = st.file_uploader(
-            "📄 Uploader un PDF",
-            type=['pdf']
+        # Zone d'upload : les PDFs publiés sont ensuite indexés en arrière-plan
+        uploaded_files = st.file_uploader(
+            "📄 Uploader des PDFs",
+            type=['pdf'],
+            accept_multiple_files=True
         )
         
-        if uploaded_file:
-            if st.button("⬆️ Publier dans le bucket"):
-                with st.spinner("Publication en cours..."):
-                    # Sauvegarde temporaire
-                    temp_path = save_uploaded_file_temp(uploaded_file)
-                    
-                    # Upload vers Google Drive
-                    if st.session_state.drive_handler.upload_pdf(str(temp_path)):
-                        st.success("✅ PDF publié avec succès!")
-                        # Rafraîchir la liste
-                        st.session_state.pdf_files = st.session_state.drive_handler.list_public_pdfs()
-                    else:
-                        st.error("❌ Erreur lors de la publication")
-                    
-                    # Nettoyage
-                    cleanup_temp_files()
+        if uploaded_files and st.button(f"⬆️ Publier {len(uploaded_files)} PDF(s) dans le bucket"):
+            publish_pdfs(engine, drive_handler, uploaded_files)
+
+        show_ingest_jobs(engine)
         
-        # Liste des PDFs disponibles
+        # Liste des PDFs disponibles (servie par le cache du listing Drive)
         st.subheader("PDFs dans le bucket")
+        pdf_files = drive_handler.list_public_pdfs()
         
-        if not st.session_state.pdf_files:
+        if not pdf_files:
             st.info("Aucun PDF disponible. Cliquez sur Rafraîchir ou uploadez-en un!")
         else:
             selected_pdfs = []
-            for pdf in st.session_state.pdf_files:
+            for pdf in pdf_files:
                 col1, col2 = st.columns([3, 1])
                 with col1:
-                    if st.checkbox(f"📄 {pdf['name']}", key=pdf['id']):
+                    # ✅ : déjà indexé dans la base courante, dans sa version actuelle
+                    indexed = rag_handler.is_indexed(pdf['id'], pdf.get('md5Checksum'))
+                    if st.checkbox(f"{'✅' if indexed else '📄'} {pdf['name']}", key=pdf['id']):
                         selected_pdfs.append(pdf)
                 with col2:
                     st.markdown(f"[🔗]({pdf['webViewLink']})")
@@ -97,35 +307,22 @@ def main():
             
             col1, col2 = st.columns(2)
             
-            # Bouton de traitement
+            # Bouton de traitement : l'ingestion tourne dans la file du moteur, pas dans la session
             if selected_pdfs and col1.button("🔄 Traiter"):
-                with st.spinner("Traitement des PDFs..."):
-                    # Téléchargement temporaire pour le traitement
-                    pdf_paths = []
-                    for pdf in selected_pdfs:
-                        temp_path = TEMP_DIR / pdf['name']
-                        # TODO: Ajouter la méthode download_pdf dans drive_handler
-                        if st.session_state.drive_handler.download_pdf(pdf['id'], str(temp_path)):
-                            pdf_paths.append(str(temp_path))
-                    
-                    if pdf_paths:
-                        st.session_state.rag_handler.process_pdfs(pdf_paths)
-                        st.session_state.processed_pdfs = True
-                        st.success("🎉 Base de connaissances créée!")
-                        cleanup_temp_files()
-                    else:
-                        st.error("❌ Erreur lors du téléchargement des PDFs")
+                schedule_ingest(engine, selected_pdfs)
             
             # Bouton de suppression
             if selected_pdfs and col2.button("🗑️ Supprimer"):
                 with st.spinner("Suppression..."):
+                    deleted = []
                     for pdf in selected_pdfs:
-                        if st.session_state.drive_handler.delete_pdf(pdf['id']):
+                        if drive_handler.delete_pdf(pdf['id']):
+                            deleted.append(pdf['id'])
                             st.success(f"✅ {pdf['name']} supprimé!")
                         else:
                             st.error(f"❌ Erreur lors de la suppression de {pdf['name']}")
-                    # Rafraîchir la liste
-                    st.session_state.pdf_files = st.session_state.drive_handler.list_public_pdfs()
+                    # Un seul lot : manifeste et index BM25 réécrits une fois
+                    rag_handler.remove_documents(deleted)
         
         # Toggle pour RAG
         st.session_state.use_rag = st.toggle("🔍 Utiliser RAG", value=True)
@@ -133,6 +330,23 @@ def main():
             st.info("Mode RAG : Les réponses seront basées sur les documents uploadés")
         else:
             st.warning("Mode standard : Les réponses seront générées sans contexte")
+
+        # Filtre sur l'index partagé : changer de sélection ne réindexe rien
+        file_ids = None
+        limit = st.toggle(
+            "🎯 Limiter aux PDFs sélectionnés",
+            value=True,
+            help="Sans sélection, la recherche porte sur toute la base"
+        )
+        if st.session_state.use_rag and limit and st.session_state.selected_pdfs:
+            file_ids = [pdf['id'] for pdf in st.session_state.selected_pdfs]
+            missing = [
+                pdf['name'] for pdf in st.session_state.selected_pdfs
+                if not rag_handler.is_indexed(pdf['id'], pdf.get('md5Checksum'))
+            ]
+            st.caption(f"Recherche limitée à {len(file_ids)} PDF(s) sélectionné(s)")
+            if missing:
+                st.warning(f"Pas encore traités (ou modifiés depuis) : {', '.join(missing)}")
         
         st.session_state.temperature = st.slider(
             "🌡️ Température",
@@ -143,13 +357,22 @@ def main():
             help="Contrôle la créativité du modèle"
         )
 
+        cache_stats = rag_handler.answer_cache.stats()
+        st.caption(
+            f"💾 Cache de réponses : {cache_stats['hits']} appels LLM évités "
+            f"({cache_stats['semantic_hits']} par similarité), {cache_stats['misses']} manqués"
+        )
+
+        show_debug_panel()
+
     # Zone de chat
     st.header("💬 Chat")
     
     # Affichage de l'historique
     for message in st.session_state.chat_history:
         with st.chat_message(message["role"]):
-            st.write(message["content"])
+            content = message["content"]
+            st.write(content["answer"] if isinstance(content, dict) else content)
 
     # Zone de saisie
     if prompt := st.chat_input("Posez votre question..."):
@@ -158,29 +381,53 @@ def main():
         with st.chat_message("user"):
             st.write(prompt)
         
-        if not st.session_state.processed_pdfs:
+        if rag_handler.retriever_for(file_ids) is None:
             with st.chat_message("assistant"):
-                st.write("⚠️ Veuillez d'abord traiter des PDFs.")
+                if file_ids:
+                    st.write("⚠️ Aucun des PDFs sélectionnés n'est indexé : traitez-les d'abord.")
+                else:
+                    st.write("⚠️ Veuillez d'abord traiter des PDFs.")
         else:
             with st.chat_message("assistant"):
-                with st.spinner("Réflexion en cours..."):
-                    if st.session_state.use_rag:
-                        response = st.session_state.rag_handler.get_response(
+                if st.session_state.use_rag:
+                    events = rag_handler.stream_response(
+                        prompt,
+                        [(msg["role"], message_text(msg["content"])) for msg in st.session_state.chat_history[:-1]],
+                        temperature=st.session_state.temperature,
+                        file_ids=file_ids
+                    )
+                    answer_container = st.container()
+                    sources_container = st.container()
+                    sources = []
+                    stats = {}
+
+                    def answer_tokens():
+                        for kind, value in events:
+                            if kind == "sources":
+                                # Les sources s'affichent dès la fin de la recherche
+                                sources.extend(value)
+                                with sources_container.expander("Sources"):
+                                    for line in format_sources(value):
+                                        st.write(line)
+                            elif kind == "stats":
+                                stats.update(value)
+                            else:
+                                yield value
+
+                    with answer_container, profiled("query"):
+                        answer = st.write_stream(answer_tokens())
+                    if stats:
+                        st.caption(format_turn_stats(stats))
+                    response = {"answer": answer, "sources": sources}
+                else:
+                    response = st.write_stream(
+                        rag_handler.stream_direct_response(
                             prompt,
-                            [(msg["role"], msg["content"]) for msg in st.session_state.chat_history[:-1]]
+                            temperature=st.session_state.temperature
                         )
-                    else:
-                        response = st.session_state.rag_handler.get_direct_response(prompt)
-                    
-                    if isinstance(response, dict):
-                        st.write(response["answer"])
-                        with st.expander("Sources"):
-                            for source in response["sources"]:
-                                st.write(f"📄 {source.get('source', 'Document inconnu')}")
-                    else:
-                        st.write(response)
-                    
-                    st.session_state.chat_history.append({"role": "assistant", "content": response})
+                    )
+                
+                st.session_state.chat_history.append({"role": "assistant", "content": response})
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,112 @@
+"""Compare la publication de PDFs un par un (ancien chemin) et par lots parallèles et résumables.
+
+Ancien chemin : pour chaque fichier, copie dans un fichier temporaire, upload
+puis appel séparé pour la permission publique, et relisting du dossier.
+Nouveau chemin : `GoogleDriveHandler.upload_pdfs`, envoi depuis le tampon en
+mémoire, `--workers` fichiers en parallèle, permissions en une requête
+batch. Avec `--failure-rate`, une partie des morceaux est perdue en route :
+les uploads doivent reprendre et les MD5 côté Drive rester exacts.
+
+Tout tourne contre le faux Drive (`--latency` par appel, `--bandwidth`).
+
+Usage :
+    python src/benchmarks/bulk_upload.py --files 40 --pages 5 --workers 1,4,8 \
+        --latency 0.05 --failure-rate 0.1
+"""
+import argparse
+import hashlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+
+def parse_ints(value):
+    return [int(v) for v in value.split(',') if v]
+
+
+def legacy_upload(drive_handler, paths, temp_dir):
+    """Reproduit l'ancienne publication depuis Streamlit, fichier par fichier"""
+    from googleapiclient.http import MediaFileUpload
+
+    service = drive_handler.service
+    for path in paths:
+        temp_path = os.path.join(temp_dir, os.path.basename(path))
+        with open(path, 'rb') as source, open(temp_path, 'wb') as temp:
+            temp.write(source.read())
+        file = service.files().create(
+            body={'name': os.path.basename(path), 'parents': [drive_handler.public_folder_id]},
+            media_body=MediaFileUpload(temp_path, mimetype='application/pdf', resumable=True),
+            fields='id'
+        ).execute()
+        service.permissions().create(fileId=file['id'], body={'type': 'anyone', 'role': 'reader'}).execute()
+        drive_handler.list_public_pdfs(force_refresh=True)
+        os.remove(temp_path)
+
+
+def run(label, paths, args, upload):
+    from drive_handler import GoogleDriveHandler
+    from fake_drive import FakeDriveService
+
+    service = FakeDriveService(
+        latency=args.latency,
+        bandwidth=args.bandwidth,
+        upload_failure_rate=args.failure_rate if label != 'legacy' else 0.0
+    )
+    drive_handler = GoogleDriveHandler(service=service)
+    calls = service.calls
+    start = time.perf_counter()
+    upload(drive_handler)
+    seconds = time.perf_counter() - start
+
+    expected = {}
+    for path in paths:
+        with open(path, 'rb') as f:
+            expected[os.path.basename(path)] = hashlib.md5(f.read()).hexdigest()
+    published = {pdf['name']: pdf.get('md5Checksum') for pdf in drive_handler.list_public_pdfs(force_refresh=True)}
+    intact = sum(published.get(name) == md5 for name, md5 in expected.items())
+    print(
+        f"{label:<12} {seconds:>8.2f} {len(paths) / seconds:>9.1f} {service.calls - calls:>8} "
+        f"{service.upload_failures:>8} {intact:>4}/{len(paths)}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=40)
+    parser.add_argument('--pages', type=int, default=5)
+    parser.add_argument('--workers', type=parse_ints, default=[1, 4, 8])
+    parser.add_argument('--chunk-kb', type=int, default=256, help="Taille des morceaux (multiple de 256)")
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--bandwidth', type=float, default=20e6)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='rag-upload-') as workdir:
+        os.environ['STORAGE_DIR'] = os.path.join(workdir, 'storage')
+        os.environ['DRIVE_UPLOAD_CHUNK_SIZE'] = str(args.chunk_kb * 1024)
+        from synthetic_pdfs import generate_corpus
+
+        paths, _ = generate_corpus(os.path.join(workdir, 'corpus'), args.files, args.pages, 0)
+        print(f"{len(paths)} PDF(s), {sum(os.path.getsize(p) for p in paths) / 1e6:.1f} Mo\n")
+        print(f"{'chemin':<12} {'durée (s)':>8} {'fichiers/s':>9} {'appels':>8} {'pertes':>8} {'MD5 ok':>6}")
+
+        run('legacy', paths, args, lambda handler: legacy_upload(handler, paths, workdir))
+        for workers in args.workers:
+            def bulk(handler, workers=workers):
+                handler.uploader.workers = workers
+                streams = []
+                for path in paths:
+                    with open(path, 'rb') as f:
+                        streams.append((os.path.basename(path), io.BytesIO(f.read())))
+                handler.upload_pdfs(streams)
+
+            run(f'bulk x{workers}', paths, args, bulk)
+
+
+if __name__ == '__main__':
+    main()
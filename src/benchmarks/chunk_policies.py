@@ -0,0 +1,157 @@
+"""Compare les politiques de découpage : nombre et taille des chunks, coût d'embedding, taille de l'index et qualité de recherche.
+
+Le corpus synthétique est structuré (articles numérotés, paragraphes,
+tableau en colonnes). Chaque politique indexe le même corpus dans sa propre
+collection, avec le backend NumPy et un faux serveur Ollama dont le coût
+d'embedding est proportionnel au nombre de textes (`--embed-latency-per-input`).
+
+Qualité : recall@k (le bon document parmi les k chunks retrouvés) et
+intégrité, c'est-à-dire la part des questions dont le contexte utile tient
+dans un même chunk indexé :
+
+    table    la ligne du tableau, son montant et l'en-tête des colonnes
+    section  l'identifiant cherché et le titre de son article
+
+La colonne "complet" compte les questions pour lesquelles un chunk
+effectivement retrouvé contient tout ce contexte (recherche et découpage).
+
+Usage :
+    python src/benchmarks/chunk_policies.py --documents 20 --pages 3 \
+        --policies recursive:500:50,structured:256:64:32,structured:512:128:64
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+
+def parse_policies(value):
+    """`recursive:taille:chevauchement` ou `structured:max:min:chevauchement`, séparés par des virgules"""
+    policies = []
+    for spec in value.split(','):
+        strategy, *numbers = spec.split(':')
+        numbers = [int(n) for n in numbers]
+        if strategy == 'recursive':
+            policies.append(dict(zip(('strategy', 'chunk_size', 'chunk_overlap'), [strategy] + numbers)))
+        else:
+            policies.append(dict(zip(('strategy', 'max_tokens', 'min_tokens', 'overlap_tokens'), [strategy] + numbers)))
+    return policies
+
+
+def label(policy):
+    if policy['strategy'] == 'recursive':
+        return f"recursive {policy['chunk_size']}/{policy['chunk_overlap']}c"
+    return f"structured {policy['max_tokens']}/{policy['min_tokens']}/{policy['overlap_tokens']}t"
+
+
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+
+def embed_seconds():
+    from instrumentation import metrics
+
+    return sum(
+        h['sum'] for h in json.loads(metrics.to_json())['histograms']
+        if h['name'] == 'rag_stage_duration_seconds' and h['labels'].get('stage') == 'embed'
+    )
+
+
+def run(index, policy, paths, questions):
+    from config import Config
+    from rag_handler import RAGHandler
+
+    rag_handler = RAGHandler(model_name='bench', collection_name=f'bench-{index}', chunk_policy=policy)
+    sizes = directory_size(Config.VECTOR_DIR) + directory_size(Config.KEYWORD_INDEX_DIR)
+    embed_before = embed_seconds()
+    start = time.perf_counter()
+    rag_handler.process_pdfs(paths)
+    seconds = time.perf_counter() - start
+    stats = rag_handler.chunk_stats()
+
+    _, texts, metadatas = rag_handler.vector_store.get_all()
+    hits = {'recall': 0, 'complete': 0, 'table': 0, 'section': 0}
+    kinds = {'table': 0, 'section': 0}
+    for question in questions:
+        def complete(text):
+            return all(expected in text for expected in question['expect'])
+
+        kinds[question['kind']] += 1
+        hits[question['kind']] += any(
+            complete(text) for text, metadata in zip(texts, metadatas)
+            if metadata.get('file_id') == question['document']
+        )
+        documents = rag_handler.retriever.invoke(question['question'])
+        relevant = [doc for doc in documents if doc.metadata.get('file_id') == question['document']]
+        hits['recall'] += bool(relevant)
+        hits['complete'] += any(complete(doc.page_content) for doc in relevant)
+    return {
+        'policy': label(policy),
+        'chunks': stats['chunks'],
+        'mean_tokens': stats['mean_chunk_tokens'],
+        'max_tokens': stats['max_chunk_tokens'],
+        'ingest_s': seconds,
+        'embed_s': embed_seconds() - embed_before,
+        'index_kb': (directory_size(Config.VECTOR_DIR) + directory_size(Config.KEYWORD_INDEX_DIR) - sizes) / 1024,
+        'recall': hits['recall'] / max(1, len(questions)),
+        'complete': hits['complete'] / max(1, len(questions)),
+        'table': hits['table'] / max(1, kinds['table']),
+        'section': hits['section'] / max(1, kinds['section'])
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--documents', type=int, default=20)
+    parser.add_argument('--pages', type=int, default=3)
+    parser.add_argument('--policies', type=parse_policies,
+                        default=parse_policies('recursive:500:50,structured:256:64:32,structured:512:128:64'))
+    parser.add_argument('--top-k', type=int, default=4)
+    parser.add_argument('--embed-latency-per-input', type=float, default=0.002)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='rag-chunking-')
+    try:
+        # La configuration est lue à l'import : l'environnement doit être prêt avant
+        os.environ['STORAGE_DIR'] = os.path.join(workdir, 'storage')
+        os.environ['VECTOR_BACKEND'] = 'numpy'
+        os.environ['RETRIEVAL_K'] = str(args.top_k)
+        from fake_ollama import FakeOllamaServer
+        from synthetic_pdfs import generate_structured_corpus
+
+        server = FakeOllamaServer(embed_latency_per_input=args.embed_latency_per_input).start()
+        os.environ['OLLAMA_HOST'] = server.url
+        try:
+            paths, questions = generate_structured_corpus(
+                os.path.join(workdir, 'corpus'), args.documents, args.pages, args.seed
+            )
+            print(f"{len(paths)} PDF(s), {len(questions)} question(s)\n")
+            print(
+                f"{'politique':<26} {'chunks':>7} {'tok moy':>8} {'tok max':>8} {'embed (s)':>10} "
+                f"{'index Ko':>9} {'recall':>7} {'tableau':>8} {'section':>8} {'complet':>8}"
+            )
+            for index, policy in enumerate(args.policies):
+                row = run(index, policy, paths, questions)
+                print(
+                    f"{row['policy']:<26} {row['chunks']:>7} {row['mean_tokens']:>8.0f} {row['max_tokens']:>8} "
+                    f"{row['embed_s']:>10.2f} {row['index_kb']:>9.0f} {row['recall']:>7.2f} "
+                    f"{row['table']:>8.2f} {row['section']:>8.2f} {row['complete']:>8.2f}"
+                )
+        finally:
+            server.stop()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Mesure le débit d'embedding (chunks/s) selon la taille des lots et la concurrence.
+
+Usage :
+    python src/benchmarks/embedding_throughput.py --host http://localhost:11434 \
+        --batch-sizes 8,16,32,64 --workers 1,2,4,8 --chunks 512
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_pipeline import BatchedEmbeddings, EmbeddingCache, format_report
+from ollama_client import OllamaClient, OllamaEmbeddings
+
+WORDS = (
+    "attestation étudiant contribution vie campus culture année universitaire "
+    "paiement numéro référence établissement formation inscription document"
+).split()
+
+
+def synthetic_chunks(count, seed=0, duplicate_ratio=0.0):
+    """Génère des chunks d'environ 500 caractères, avec une part de doublons"""
+    rng = random.Random(seed)
+    chunks = []
+    for i in range(count):
+        if chunks and rng.random() < duplicate_ratio:
+            chunks.append(rng.choice(chunks))
+            continue
+        words = [rng.choice(WORDS) for _ in range(70)]
+        chunks.append(f"{i} " + " ".join(words))
+    return chunks
+
+
+def parse_ints(value):
+    return [int(v) for v in value.split(',') if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default=os.getenv('OLLAMA_HOST', 'http://localhost:11434'))
+    parser.add_argument('--model', default='mistral')
+    parser.add_argument('--chunks', type=int, default=256)
+    parser.add_argument('--batch-sizes', type=parse_ints, default=[8, 32])
+    parser.add_argument('--workers', type=parse_ints, default=[1, 4])
+    parser.add_argument('--duplicate-ratio', type=float, default=0.0)
+    args = parser.parse_args()
+
+    chunks = synthetic_chunks(args.chunks, duplicate_ratio=args.duplicate_ratio)
+    embeddings = OllamaEmbeddings(OllamaClient(host=args.host, embed_model=args.model))
+
+    print(f"{'batch':>6} {'workers':>8} {'froid (chunks/s)':>18} {'cache (chunks/s)':>18}")
+    for batch_size in args.batch_sizes:
+        for workers in args.workers:
+            with tempfile.TemporaryDirectory() as tmp:
+                cache = EmbeddingCache(os.path.join(tmp, 'cache.sqlite'))
+                pipeline = BatchedEmbeddings(
+                    embeddings,
+                    model_name=args.model,
+                    cache=cache,
+                    batch_size=batch_size,
+                    max_workers=workers
+                )
+                pipeline.embed_documents(chunks)
+                cold = pipeline.last_report
+                pipeline.embed_documents(chunks)
+                warm = pipeline.last_report
+                cache.close()
+            print(
+                f"{batch_size:>6} {workers:>8} "
+                f"{cold['chunks_per_sec']:>18.1f} {warm['chunks_per_sec']:>18.1f}"
+            )
+            print(f"    {format_report(cold)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,376 @@
+"""Faux service Google Drive v3, en mémoire, pour les benchmarks hors ligne.
+
+Il implémente le sous-ensemble de l'API utilisé par `GoogleDriveHandler` et
+`DriveListing` : `files().list/get/get_media/create/delete`,
+`permissions().create`, `changes().getStartPageToken/list` et les requêtes
+batch (`new_batch_http_request`). Les requêtes s'exécutent comme celles du
+client officiel (`request.execute()`), le téléchargement de `get_media`
+accepte les requêtes par plage d'octets et les uploads résumables suivent le
+protocole de `next_chunk` (session, morceaux, reprise après erreur).
+
+`latency` simule l'aller-retour réseau de chaque appel (en secondes),
+`bandwidth` le débit des transferts (octets/s, 0 = illimité) et
+`upload_failure_rate` la probabilité qu'un morceau d'upload soit reçu par le
+serveur sans que la réponse parvienne au client.
+"""
+from datetime import datetime, timezone
+import hashlib
+import itertools
+import json
+import random
+import re
+import threading
+import time
+
+from googleapiclient.errors import HttpError
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+
+
+class FakeRequest:
+    def __init__(self, service, action):
+        self._service = service
+        self._action = action
+
+    def execute(self, http=None, num_retries=0):
+        self._service.wait()
+        return self._action()
+
+
+class FakeResponse(dict):
+    """Réponse façon httplib2 : en-têtes en minuscules et attribut `status`"""
+
+    def __init__(self, status, headers=None):
+        super().__init__(headers or {})
+        self.status = status
+        self.reason = ''
+
+
+class FakeMediaHttp:
+    """Client HTTP servant le contenu des fichiers, avec l'en-tête Range"""
+
+    def __init__(self, service):
+        self._service = service
+
+    def request(self, uri, method='GET', headers=None, **kwargs):
+        self._service.wait()
+        file_id = uri.rsplit('/', 1)[-1]
+        content = self._service.content(file_id)
+        if content is None:
+            return FakeResponse(404), b''
+        match = re.match(r"bytes=(\d+)-(\d*)", (headers or {}).get('range', ''))
+        if not match:
+            self._service.transfer(len(content))
+            return FakeResponse(200), content
+        start = int(match.group(1))
+        if start >= len(content):
+            return FakeResponse(416, {'content-range': f"bytes */{len(content)}"}), b''
+        end = min(int(match.group(2)) if match.group(2) else len(content) - 1, len(content) - 1)
+        body = content[start:end + 1]
+        self._service.transfer(len(body))
+        return FakeResponse(206, {'content-range': f"bytes {start}-{end}/{len(content)}"}), body
+
+
+class FakeUploadStatus:
+    def __init__(self, resumable_progress, total_size):
+        self.resumable_progress = resumable_progress
+        self.total_size = total_size
+
+    def progress(self):
+        return self.resumable_progress / self.total_size if self.total_size else 1.0
+
+
+class FakeUploadHttp:
+    """Client HTTP répondant aux demandes d'état d'une session d'upload (`bytes */taille`)"""
+
+    def __init__(self, service):
+        self._service = service
+
+    def request(self, uri, method='PUT', headers=None, **kwargs):
+        self._service.wait()
+        session = self._service.upload_session(uri)
+        if session is None:
+            return FakeResponse(404), b''
+        if session['file'] is not None:
+            return FakeResponse(200), json.dumps(session['file']).encode('utf-8')
+        received = len(session['data'])
+        return FakeResponse(308, {'range': f"bytes=0-{received - 1}"} if received else {}), b''
+
+
+class FakeUploadRequest(FakeRequest):
+    """Création de fichier avec contenu : `execute()` d'un bloc ou `next_chunk()` résumable"""
+
+    def __init__(self, service, body, media_body):
+        super().__init__(service, lambda: service.create_file(body, media_body))
+        self._body = body
+        self.resumable = media_body
+        self.resumable_uri = None
+        self.resumable_progress = 0
+        self.http = FakeUploadHttp(service)
+        self._in_error_state = False
+
+    def next_chunk(self, http=None, num_retries=0):
+        service = self._service
+        size = self.resumable.size()
+        if self.resumable_uri is None:
+            service.wait()
+            self.resumable_uri = service.start_upload(self._body)
+        elif self._in_error_state:
+            # Comme le client officiel : on redemande l'octet atteint
+            resp, content = self.http.request(self.resumable_uri)
+            if resp.status == 404:
+                raise HttpError(resp, content, uri=self.resumable_uri)
+            if resp.status == 200:
+                return FakeUploadStatus(size, size), json.loads(content)
+            received = resp.get('range')
+            self.resumable_progress = int(received.rpartition('-')[2]) + 1 if received else 0
+            self._in_error_state = False
+
+        data = self.resumable.getbytes(self.resumable_progress, self.resumable.chunksize())
+        service.wait()
+        service.transfer(len(data))
+        file = service.upload_chunk(self.resumable_uri, self.resumable_progress, data, size, self.resumable)
+        if service.fail_upload():
+            self._in_error_state = True
+            raise ConnectionResetError("Connexion interrompue pendant l'upload (simulé)")
+        self.resumable_progress += len(data)
+        if file is not None:
+            return FakeUploadStatus(size, size), file
+        return FakeUploadStatus(self.resumable_progress, size), None
+
+
+class FakeBatch:
+    """Requête batch : un seul aller-retour pour toutes les requêtes ajoutées"""
+
+    def __init__(self, service, callback=None):
+        self._service = service
+        self._callback = callback
+        self._requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        self._requests.append((request, callback, request_id or str(len(self._requests) + 1)))
+
+    def execute(self, http=None):
+        self._service.wait()
+        for request, callback, request_id in self._requests:
+            response, exception = None, None
+            try:
+                response = request._action()
+            except Exception as e:
+                exception = e
+            (callback or self._callback)(request_id, response, exception)
+
+
+class FakeMediaRequest(FakeRequest):
+    def __init__(self, service, file_id):
+        super().__init__(service, lambda: service.content(file_id))
+        self.uri = f"fake://drive/files/{file_id}"
+        self.http = FakeMediaHttp(service)
+
+
+class _Files:
+    def __init__(self, service):
+        self._service = service
+
+    def list(self, q='', pageSize=100, pageToken=None, **kwargs):
+        return FakeRequest(self._service, lambda: self._service.list_files(q, pageSize, pageToken))
+
+    def get(self, fileId, **kwargs):
+        return FakeRequest(self._service, lambda: self._service.metadata(fileId))
+
+    def get_media(self, fileId, **kwargs):
+        return FakeMediaRequest(self._service, fileId)
+
+    def create(self, body, media_body=None, **kwargs):
+        if media_body is not None:
+            return FakeUploadRequest(self._service, body, media_body)
+        return FakeRequest(self._service, lambda: self._service.create_file(body, media_body))
+
+    def delete(self, fileId, **kwargs):
+        return FakeRequest(self._service, lambda: self._service.delete_file(fileId))
+
+
+class _Permissions:
+    def __init__(self, service):
+        self._service = service
+
+    def create(self, fileId, body, **kwargs):
+        return FakeRequest(self._service, lambda: self._service.add_permission(fileId, body))
+
+
+class _Changes:
+    def __init__(self, service):
+        self._service = service
+
+    def getStartPageToken(self, **kwargs):
+        return FakeRequest(self._service, lambda: {'startPageToken': str(self._service.change_count())})
+
+    def list(self, pageToken, pageSize=100, **kwargs):
+        return FakeRequest(self._service, lambda: self._service.list_changes(pageToken, pageSize))
+
+
+class FakeDriveService:
+    """Stockage Drive en mémoire, sûr entre threads"""
+
+    def __init__(self, latency=0.0, bandwidth=0, upload_failure_rate=0.0, seed=0):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.upload_failure_rate = upload_failure_rate
+        self.calls = 0
+        self.upload_failures = 0
+        self._random = random.Random(seed)
+        self._uploads = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._files = {}
+        self._contents = {}
+        self._permissions = {}
+        self._changes = []
+
+    def files(self):
+        return _Files(self)
+
+    def permissions(self):
+        return _Permissions(self)
+
+    def changes(self):
+        return _Changes(self)
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self, callback)
+
+    def wait(self):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def transfer(self, size):
+        if self.bandwidth:
+            time.sleep(size / self.bandwidth)
+
+    def content(self, file_id):
+        with self._lock:
+            return self._contents.get(file_id)
+
+    def fail_upload(self):
+        with self._lock:
+            failed = self._random.random() < self.upload_failure_rate
+            self.upload_failures += failed
+            return failed
+
+    def start_upload(self, body):
+        with self._lock:
+            uri = f"fake://upload/{next(self._ids)}"
+            self._uploads[uri] = {'body': body, 'data': bytearray(), 'file': None}
+            return uri
+
+    def upload_session(self, uri):
+        with self._lock:
+            return self._uploads.get(uri)
+
+    def upload_chunk(self, uri, offset, data, size, media_body):
+        """Reçoit un morceau ; crée le fichier (et le retourne) une fois le contenu complet"""
+        with self._lock:
+            session = self._uploads.get(uri)
+            if session is None:
+                raise KeyError(f"Session d'upload inconnue: {uri}")
+            del session['data'][offset:]
+            session['data'] += data
+            complete = len(session['data']) >= size
+        if not complete:
+            return None
+        file = self.create_file(session['body'], content=bytes(session['data']), mimetype=media_body.mimetype())
+        with self._lock:
+            session['file'] = file
+        return file
+
+    def metadata(self, file_id):
+        with self._lock:
+            if file_id not in self._files:
+                raise KeyError(f"Fichier introuvable: {file_id}")
+            return dict(self._files[file_id])
+
+    def list_files(self, q, page_size, page_token):
+        with self._lock:
+            files = [f for f in self._files.values() if _matches(f, q)]
+        files.sort(key=lambda f: f['id'])
+        start = int(page_token or 0)
+        result = {'files': [dict(f) for f in files[start:start + page_size]]}
+        if start + page_size < len(files):
+            result['nextPageToken'] = str(start + page_size)
+        return result
+
+    def create_file(self, body, media_body=None, content=None, mimetype=None):
+        if media_body is not None:
+            content = media_body.getbytes(0, media_body.size())
+            mimetype = media_body.mimetype()
+        content = content or b''
+        with self._lock:
+            file_id = f"fake{next(self._ids):06d}"
+            mime_type = body.get('mimeType') or mimetype
+            file = {
+                'id': file_id,
+                'name': body['name'],
+                'mimeType': mime_type or 'application/octet-stream',
+                'parents': list(body.get('parents', [])),
+                'trashed': False,
+                'modifiedTime': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+                'webViewLink': f"https://drive.example/file/{file_id}",
+            }
+            if mime_type != FOLDER_MIME_TYPE:
+                file['md5Checksum'] = hashlib.md5(content).hexdigest()
+                file['size'] = str(len(content))
+                self._contents[file_id] = content
+            self._files[file_id] = file
+            self._changes.append({'fileId': file_id, 'removed': False, 'file': dict(file)})
+            return dict(file)
+
+    def delete_file(self, file_id):
+        with self._lock:
+            if self._files.pop(file_id, None) is None:
+                raise KeyError(f"Fichier introuvable: {file_id}")
+            self._contents.pop(file_id, None)
+            self._changes.append({'fileId': file_id, 'removed': True})
+        return ''
+
+    def add_permission(self, file_id, body):
+        with self._lock:
+            self._permissions.setdefault(file_id, []).append(body)
+        return {'id': f"perm-{file_id}", **body}
+
+    def change_count(self):
+        with self._lock:
+            return len(self._changes)
+
+    def list_changes(self, page_token, page_size):
+        start = int(page_token)
+        with self._lock:
+            changes = self._changes[start:start + page_size]
+            total = len(self._changes)
+        result = {'changes': changes}
+        if start + page_size < total:
+            result['nextPageToken'] = str(start + page_size)
+        else:
+            result['newStartPageToken'] = str(total)
+        return result
+
+
+def _matches(file, q):
+    """Évalue le sous-ensemble de la syntaxe `q` utilisé par l'application"""
+    for clause in filter(None, (c.strip() for c in q.split(' and '))):
+        parent = re.fullmatch(r"'([^']*)' in parents", clause)
+        field = re.fullmatch(r"(\w+)\s*=\s*'?([^']*)'?", clause)
+        if parent:
+            if parent.group(1) not in file.get('parents', []):
+                return False
+        elif field:
+            key, value = field.groups()
+            actual = file.get(key)
+            if isinstance(actual, bool):
+                actual = str(actual).lower()
+            if actual != value:
+                return False
+        else:
+            raise ValueError(f"Requête non supportée par le faux Drive: {clause}")
+    return True
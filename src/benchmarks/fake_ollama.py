@@ -0,0 +1,240 @@
+"""Faux serveur Ollama pour les benchmarks hors ligne.
+
+Il répond aux routes utilisées par langchain-ollama (`/api/embed`,
+`/api/embeddings`, `/api/generate`, `/api/chat`) avec :
+
+- des embeddings déterministes : sac de mots haché (blake2b) puis normalisé,
+  si bien que deux textes partageant du vocabulaire sont proches ;
+- une génération en streaming dont la latence est réglable (délai avant le
+  premier token, débit en tokens/s, latence fixe et par texte des embeddings) ;
+- le chargement des modèles : un modèle absent de la mémoire coûte
+  `load_latency` et reste chargé `keep_alive` (5 minutes par défaut, comme
+  Ollama) ; `load_duration` est rapporté dans les réponses.
+
+Le serveur tourne dans un thread du processus appelant :
+
+    with FakeOllamaServer(tokens_per_second=50) as server:
+        os.environ['OLLAMA_HOST'] = server.url
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import hashlib
+import json
+import re
+import threading
+import time
+
+import numpy as np
+
+WORD_PATTERN = re.compile(r"\w+")
+ANSWER_WORDS = (
+    "selon le document la contribution est due par chaque étudiant inscrit "
+    "dans un établissement avant son inscription et son montant est fixé chaque année"
+).split()
+
+
+def fake_embedding(text, dimensions=384):
+    """Embedding déterministe d'un texte (identique d'un processus à l'autre)"""
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for word in WORD_PATTERN.findall(text.lower()):
+        digest = int.from_bytes(hashlib.blake2b(word.encode('utf-8'), digest_size=8).digest(), 'big')
+        vector[digest % dimensions] += 1.0 if digest & (1 << 63) else -1.0
+    norm = np.linalg.norm(vector)
+    if not norm:
+        vector[0] = norm = 1.0
+    return (vector / norm).tolist()
+
+
+def fake_answer(prompt, tokens):
+    """Réponse déterministe de `tokens` mots, dérivée du prompt"""
+    seed = int.from_bytes(hashlib.blake2b(prompt.encode('utf-8'), digest_size=4).digest(), 'big')
+    return [
+        ANSWER_WORDS[(seed + i) % len(ANSWER_WORDS)] + ("" if i == tokens - 1 else " ")
+        for i in range(tokens)
+    ]
+
+
+def keep_alive_seconds(value):
+    """Convertit le `keep_alive` d'une requête ("30m", "1h", 300, -1) en secondes"""
+    if value is None:
+        return 300.0
+    if isinstance(value, str):
+        match = re.fullmatch(r"(-?[\d.]+)(ms|s|m|h)?", value.strip())
+        if not match:
+            return 300.0
+        number = float(match.group(1))
+        value = number * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}.get(match.group(2) or "s")
+    return float("inf") if value < 0 else float(value)
+
+
+class FakeOllamaServer:
+    """Serveur HTTP imitant Ollama, démarré sur un port libre de localhost"""
+
+    def __init__(self, dimensions=384, embed_latency=0.0, embed_latency_per_input=0.0,
+                 first_token_latency=0.0, tokens_per_second=0.0, answer_tokens=40,
+                 load_latency=0.0, max_loaded_models=None):
+        self.dimensions = dimensions
+        self.embed_latency = embed_latency
+        self.embed_latency_per_input = embed_latency_per_input
+        self.first_token_latency = first_token_latency
+        self.tokens_per_second = tokens_per_second
+        self.answer_tokens = answer_tokens
+        self.load_latency = load_latency
+        self.max_loaded_models = max_loaded_models
+        self.loaded = {}
+        self.requests = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _handler_class(self))
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def count(self, route):
+        with self._lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+
+    def load(self, model, keep_alive=None):
+        """Charge le modèle s'il n'est pas en mémoire ; retourne la durée de chargement (s)"""
+        now = time.monotonic()
+        with self._lock:
+            expires = self.loaded.get(model)
+            cold = expires is None or expires < now
+            if not cold:
+                self.loaded.pop(model)
+        if cold and self.load_latency:
+            time.sleep(self.load_latency)
+        with self._lock:
+            self.loaded = {name: at for name, at in self.loaded.items() if at >= now}
+            if self.max_loaded_models and len(self.loaded) >= self.max_loaded_models:
+                # Décharge le modèle le moins récemment utilisé
+                self.loaded.pop(next(iter(self.loaded)))
+            self.loaded[model] = time.monotonic() + keep_alive_seconds(keep_alive)
+        return self.load_latency if cold else 0.0
+
+    def embed(self, texts):
+        time.sleep(self.embed_latency + self.embed_latency_per_input * len(texts))
+        return [fake_embedding(text, self.dimensions) for text in texts]
+
+    def generate(self, prompt):
+        """Produit les tokens de la réponse au rythme configuré (aucun pour un prompt vide)"""
+        if not prompt:
+            return
+        if self.first_token_latency:
+            time.sleep(self.first_token_latency)
+        delay = 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+        for i, token in enumerate(fake_answer(prompt, self.answer_tokens)):
+            if delay and i:
+                time.sleep(delay)
+            yield token
+
+
+def _handler_class(fake):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # En-têtes et corps partent en deux écritures : sans TCP_NODELAY, une
+        # connexion réutilisée attendrait l'ACK retardé (~40 ms), ce qu'Ollama ne fait pas
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            fake.count(self.path)
+            if self.path == '/api/version':
+                self._send_json({"version": "0.0.0-fake"})
+            elif self.path == '/api/tags':
+                self._send_json({"models": []})
+            else:
+                self._send_json({"error": "not found"}, status=404)
+
+        def do_HEAD(self):
+            self.send_response(200)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def do_POST(self):
+            fake.count(self.path)
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length) or b'{}')
+            model = body.get('model', 'fake')
+            load = 0.0
+            if self.path in ('/api/embed', '/api/embeddings', '/api/generate', '/api/chat'):
+                load = fake.load(model, body.get('keep_alive'))
+
+            if self.path == '/api/embed':
+                texts = body.get('input', [])
+                if isinstance(texts, str):
+                    texts = [texts]
+                self._send_json({"model": model, "embeddings": fake.embed(texts),
+                                 "load_duration": int(load * 1e9)})
+            elif self.path == '/api/embeddings':
+                self._send_json({"embedding": fake.embed([body.get('prompt', '')])[0]})
+            elif self.path in ('/api/generate', '/api/chat'):
+                if self.path == '/api/chat':
+                    prompt = "\n".join(m.get('content', '') for m in body.get('messages', []))
+                else:
+                    prompt = body.get('prompt', '')
+                self._generate(model, prompt, body.get('stream', True), self.path == '/api/chat', load)
+            elif self.path == '/api/show':
+                self._send_json({"modelfile": "", "parameters": "", "details": {}})
+            else:
+                self._send_json({"error": "not found"}, status=404)
+
+        def _generate(self, model, prompt, stream, chat, load):
+            def part(text, done):
+                created_at = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+                data = {"model": model, "created_at": created_at, "done": done}
+                if chat:
+                    data["message"] = {"role": "assistant", "content": text}
+                else:
+                    data["response"] = text
+                if done:
+                    data.update(done_reason="stop", prompt_eval_count=len(prompt) // 4,
+                                eval_count=fake.answer_tokens, load_duration=int(load * 1e9))
+                return data
+
+            if not stream:
+                self._send_json(part("".join(fake.generate(prompt)), True))
+                return
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for token in fake.generate(prompt):
+                self._write_chunk(part(token, False))
+            self._write_chunk(part("", True))
+            self.wfile.write(b"0\r\n\r\n")
+
+        def _write_chunk(self, data):
+            line = json.dumps(data).encode('utf-8') + b"\n"
+            self.wfile.write(f"{len(line):X}\r\n".encode('ascii') + line + b"\r\n")
+            self.wfile.flush()
+
+        def _send_json(self, data, status=200):
+            payload = json.dumps(data).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    return Handler
@@ -0,0 +1,179 @@
+"""Compare la recherche dense seule à la recherche hybride BM25 + vecteurs (RRF).
+
+Le corpus est synthétique : chaque chunk contient du texte courant et un
+identifiant unique (numéro d'attestation, référence...). Les requêtes portent
+soit sur un identifiant exact, soit sur le thème d'un chunk. Les embeddings
+sont simulés par un hachage de trigrammes de caractères, ce qui reproduit la
+faiblesse des modèles denses sur les codes sans dépendre d'Ollama.
+
+Les chunks sont indexés dans une collection (`RAGHandler`, backend NumPy par
+défaut) et les requêtes passent par son retriever, comme dans l'application :
+modes "dense" (poids BM25 nul), "hybride" (`retriever`) et "filtré"
+(`retriever_for` sur `--filter-files` documents dont celui de la cible).
+Les latences comprennent l'embedding simulé de la requête.
+
+Usage :
+    python src/benchmarks/hybrid_retrieval.py --chunks 100000 --queries 200 --k 4
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TOPICS = [
+    "contribution vie étudiante campus paiement attestation",
+    "inscription université formation année diplôme",
+    "logement résidence bourse aide sociale",
+    "santé médecine préventive consultation",
+    "sport association culture événement",
+    "bibliothèque emprunt ressources numériques",
+]
+FILLER = "le la les un une des de du et pour avec dans sur par au aux ce cette".split()
+DIMENSIONS = 256
+
+
+def embed(text):
+    """Embedding simulé : trigrammes de caractères hachés, normalisé"""
+    vector = np.zeros(DIMENSIONS, dtype=np.float32)
+    text = f"  {text.lower()}  "
+    for i in range(len(text) - 2):
+        vector[hash(text[i:i + 3]) % DIMENSIONS] += 1.0
+    return vector / (np.linalg.norm(vector) or 1.0)
+
+
+class HashEmbeddings:
+    """Embeddings simulés, à l'interface des embeddings LangChain"""
+
+    def embed_documents(self, texts):
+        return [embed(text).tolist() for text in texts]
+
+    def embed_query(self, text):
+        return embed(text).tolist()
+
+
+class PassThroughSplitter:
+    """Chaque page est déjà un chunk"""
+
+    def split_documents(self, documents):
+        return documents
+
+
+def build_corpus(count, rng):
+    chunks = []
+    for i in range(count):
+        topic = rng.choice(TOPICS)
+        words = topic.split() + [rng.choice(FILLER) for _ in range(40)]
+        rng.shuffle(words)
+        identifier = f"CVEC-{rng.randint(2000, 2030)}-{rng.randint(0, 36 ** 5):07X}"
+        chunks.append((f"{' '.join(words)} référence {identifier}", identifier, topic))
+    return chunks
+
+
+def index_corpus(rag_handler, corpus, chunks_per_file):
+    """Indexe le corpus par documents de `chunks_per_file` chunks ; retourne le
+    (file_id, chunk_id) de chaque chunk"""
+    from langchain_core.documents import Document
+
+    locations = []
+    for start in range(0, len(corpus), chunks_per_file):
+        file_id = f"doc-{start // chunks_per_file}"
+        pages = [Document(page_content=text, metadata={"page": 0}) for text, _, _ in corpus[start:start + chunks_per_file]]
+        rag_handler.index_document(file_id, "v1", pages, name=f"{file_id}.pdf",
+                                   text_splitter=PassThroughSplitter())
+        locations += [(file_id, f"{file_id}:v1:{i}") for i in range(len(pages))]
+    rag_handler.build_retriever()
+    return locations
+
+
+def recall(results, expected):
+    return sum(1 for got, want in zip(results, expected) if want in got) / len(expected)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--chunks', type=int, default=20000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=4)
+    parser.add_argument('--fetch-k', type=int, default=20)
+    parser.add_argument('--chunks-per-file', type=int, default=100)
+    parser.add_argument('--filter-files', type=int, default=5)
+    parser.add_argument('--backend', choices=('numpy', 'chroma'), default='numpy')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='rag-hybrid-')
+    try:
+        # La configuration est lue à l'import : l'environnement doit être prêt avant
+        os.environ['STORAGE_DIR'] = workdir
+        os.environ['VECTOR_BACKEND'] = args.backend
+        os.environ['RETRIEVAL_K'] = str(args.k)
+        os.environ['RETRIEVAL_FETCH_K'] = str(args.fetch_k)
+        from rag_handler import RAGHandler
+
+        rng = random.Random(args.seed)
+        corpus = build_corpus(args.chunks, rng)
+        rag_handler = RAGHandler(model_name='bench', collection_name='bench', embeddings=HashEmbeddings())
+        start = time.perf_counter()
+        locations = index_corpus(rag_handler, corpus, args.chunks_per_file)
+        print(f"Indexation ({args.backend} + BM25): {len(locations)} chunks en {time.perf_counter() - start:.1f}s")
+
+        dense = rag_handler.retriever.model_copy(update={"keyword_weight": 0.0})
+        file_ids = sorted({file_id for file_id, _ in locations})
+        modes = {
+            "dense": lambda target: dense,
+            "hybride": lambda target: rag_handler.retriever,
+            "filtré": lambda target: rag_handler.retriever_for(
+                [target] + rng.sample(file_ids, min(len(file_ids), args.filter_files) - 1)
+            ),
+        }
+
+        targets = rng.sample(range(len(corpus)), args.queries)
+        suites = {
+            "identifiant": [(f"attestation {corpus[i][1]}", i) for i in targets],
+            "thème": [(f"{corpus[i][2]} {corpus[i][1]}", i) for i in targets],
+        }
+
+        print(f"\n{'requêtes':>12} {'mode':>8} {'recall@k':>9} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+        for name, queries in suites.items():
+            expected = [locations[i][1] for _, i in queries]
+            for mode, make_retriever in modes.items():
+                results, latencies = [], []
+                for query, i in queries:
+                    start = time.perf_counter()
+                    documents = make_retriever(locations[i][0]).invoke(query)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    results.append([document.metadata.get("chunk_id") for document in documents])
+                print(
+                    f"{name:>12} {mode:>8} {recall(results, expected):>9.2f} "
+                    f"{statistics.median(latencies):>9.2f} {percentile(latencies, 0.99):>9.2f}"
+                )
+
+        keyword_index = rag_handler.keyword_index
+        keyword_latencies = []
+        for query, _ in suites["identifiant"]:
+            start = time.perf_counter()
+            keyword_index.search(query, k=args.fetch_k)
+            keyword_latencies.append((time.perf_counter() - start) * 1000)
+        print(
+            f"\nBM25 seul: p50 {statistics.median(keyword_latencies):.2f} ms, "
+            f"p99 {percentile(keyword_latencies, 0.99):.2f} ms"
+        )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
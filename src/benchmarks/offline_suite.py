@@ -0,0 +1,281 @@
+"""Benchmark de bout en bout, entièrement hors ligne.
+
+Ollama est remplacé par un faux serveur HTTP (embeddings déterministes,
+génération à latence réglable) et Google Drive par un faux service en
+mémoire ; le corpus est un ensemble de PDFs synthétiques. Pour chaque taille
+de corpus et chaque chemin d'ingestion, une mesure tourne dans un
+sous-processus avec son propre répertoire de stockage, ce qui isole la
+mémoire résidente et les caches.
+
+Chemins d'ingestion :
+    drive  upload vers le faux Drive, listing puis `IngestPipeline`
+    local  `RAGHandler.process_pdfs` sur les fichiers locaux
+
+Mesures : débit d'ingestion, latence de recherche (p50/p99, recall@k),
+latence de réponse de bout en bout via `get_response` (p50/p99, premier
+token), réouverture de la collection par un nouveau handler (démarrage à
+froid jusqu'à la première recherche), latences Drive et pic de mémoire
+résidente. Les résultats sont écrits en JSON pour comparer deux exécutions.
+
+Usage :
+    python src/benchmarks/offline_suite.py --documents 10,50,200 --pages 5 \
+        --output benchmark-results.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, SRC_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else None
+
+
+def latency_summary(seconds):
+    """p50/p99/moyenne en millisecondes"""
+    if not seconds:
+        return {'count': 0}
+    return {
+        'count': len(seconds),
+        'p50_ms': statistics.median(seconds) * 1000,
+        'p99_ms': percentile(seconds, 0.99) * 1000,
+        'mean_ms': statistics.fmean(seconds) * 1000
+    }
+
+
+def peak_rss_mb():
+    """Pic de mémoire résidente du processus et de ses enfants (pool de parsing)"""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss est en Ko sous Linux, en octets sous macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return {'self': own / scale, 'children_max': children / scale}
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def run_worker(args):
+    """Une mesure complète, dans un répertoire de stockage jetable"""
+    workdir = tempfile.mkdtemp(prefix='rag-bench-')
+    try:
+        # La configuration est lue à l'import : l'environnement doit être prêt avant
+        os.environ['STORAGE_DIR'] = os.path.join(workdir, 'storage')
+        from fake_ollama import FakeOllamaServer
+        server = FakeOllamaServer(
+            embed_latency=args.embed_latency,
+            embed_latency_per_input=args.embed_latency_per_input,
+            first_token_latency=args.first_token_latency,
+            tokens_per_second=args.tokens_per_second,
+            answer_tokens=args.answer_tokens
+        ).start()
+        os.environ['OLLAMA_HOST'] = server.url
+        try:
+            return _measure(args, workdir, server)
+        finally:
+            server.stop()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _measure(args, workdir, server):
+    from fake_drive import FakeDriveService
+    from synthetic_pdfs import generate_corpus
+    from drive_handler import GoogleDriveHandler
+    from ingest_pipeline import IngestPipeline
+    from instrumentation import metrics
+    from rag_handler import RAGHandler
+
+    paths, questions = generate_corpus(
+        os.path.join(workdir, 'corpus'), args.documents, args.pages, args.seed
+    )
+    corpus_bytes = sum(os.path.getsize(path) for path in paths)
+    result = {
+        'ingest_path': args.ingest,
+        'documents': args.documents,
+        'pages': args.documents * args.pages,
+        'corpus_mb': corpus_bytes / 1e6
+    }
+
+    rag_handler = RAGHandler(model_name='bench', collection_name='bench')
+    drive = {}
+    if args.ingest == 'drive':
+        drive_handler = GoogleDriveHandler(
+            service=FakeDriveService(latency=args.drive_latency, bandwidth=args.drive_bandwidth)
+        )
+        upload_times = [timed(drive_handler.upload_pdf, path)[1] for path in paths]
+        pdfs, list_seconds = timed(drive_handler.list_public_pdfs, force_refresh=True)
+        drive.update(upload=latency_summary(upload_times), list_ms=list_seconds * 1000)
+        pipeline = IngestPipeline(drive_handler, rag_handler)
+        indexed, ingest_seconds = timed(pipeline.run, pdfs)
+        names = {pdf['id']: pdf['name'] for pdf in pdfs}
+    else:
+        indexed, ingest_seconds = timed(rag_handler.process_pdfs, paths)
+        names = {os.path.basename(path): os.path.basename(path) for path in paths}
+
+    chunks = rag_handler.vector_store.count()
+    result['ingest'] = {
+        'indexed': indexed,
+        'chunks': chunks,
+        'seconds': ingest_seconds,
+        'documents_per_s': indexed / ingest_seconds,
+        'pages_per_s': result['pages'] / ingest_seconds,
+        'chunks_per_s': chunks / ingest_seconds,
+        'mb_per_s': result['corpus_mb'] / ingest_seconds,
+        'stages_s': {
+            h['labels']['stage']: h['sum']
+            for h in json.loads(metrics.to_json())['histograms']
+            if h['name'] == 'rag_stage_duration_seconds'
+        }
+    }
+
+    # Recherche : un identifiant par page, le bon document doit être dans les k premiers
+    sample = questions[:args.queries]
+    retrieve_times, hits = [], 0
+    for question, expected in sample:
+        documents, seconds = timed(rag_handler.retriever.invoke, question)
+        retrieve_times.append(seconds)
+        hits += any(names.get(doc.metadata.get('file_id')) == expected for doc in documents)
+    result['retrieval'] = {**latency_summary(retrieve_times), 'recall_at_k': hits / max(1, len(sample))}
+
+    # Réponse complète : questions distinctes, pour ne pas mesurer le cache de réponses
+    answer_times, first_tokens, cache_hits = [], [], 0
+    for question, _ in questions[-args.answers:]:
+        response, seconds = timed(rag_handler.get_response, question, [])
+        answer_times.append(seconds)
+        stats = response['stats'] or {}
+        cache_hits += stats.get('cache_hit', False)
+        if 'first_token' in stats.get('timings', {}):
+            first_tokens.append(stats['timings']['first_token'])
+    result['answer'] = {
+        **latency_summary(answer_times),
+        'first_token': latency_summary(first_tokens),
+        'cache_hits': cache_hits
+    }
+
+    # Démarrage à froid : un nouveau handler rouvre la collection sans réindexer
+    reopened, construct_seconds = timed(RAGHandler, model_name='bench', collection_name='bench')
+    _, attach_seconds = timed(reopened.load)
+    question = questions[0][0]
+    _, first_seconds = timed(lambda: reopened.retriever.invoke(question))
+    result['reopen'] = {
+        'construct_ms': construct_seconds * 1000,
+        'attach_ms': attach_seconds * 1000,
+        'first_retrieval_ms': first_seconds * 1000
+    }
+
+    if args.ingest == 'drive':
+        delete_times = [timed(drive_handler.delete_pdf, pdf['id'])[1] for pdf in pdfs[:args.queries]]
+        drive['delete'] = latency_summary(delete_times)
+        result['drive'] = drive
+
+    result['ollama_requests'] = dict(server.requests)
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+
+def print_table(results):
+    print(
+        f"\n{'chemin':>6} {'docs':>6} {'chunks':>7} {'docs/s':>8} {'chunks/s':>9} "
+        f"{'ret p50':>8} {'ret p99':>8} {'recall':>7} {'rép p50':>8} {'rép p99':>8} {'RSS Mo':>7}"
+    )
+    for r in results:
+        if 'error' in r:
+            print(f"{r['ingest_path']:>6} {r['documents']:>6}  erreur: {r['error']}")
+            continue
+        print(
+            f"{r['ingest_path']:>6} {r['documents']:>6} {r['ingest']['chunks']:>7} "
+            f"{r['ingest']['documents_per_s']:>8.1f} {r['ingest']['chunks_per_s']:>9.0f} "
+            f"{r['retrieval']['p50_ms']:>8.1f} {r['retrieval']['p99_ms']:>8.1f} "
+            f"{r['retrieval']['recall_at_k']:>7.2f} "
+            f"{r['answer']['p50_ms']:>8.0f} {r['answer']['p99_ms']:>8.0f} "
+            f"{r['peak_rss_mb']['self']:>7.0f}"
+        )
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=SRC_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--documents', default='10,50', help="tailles de corpus (nombre de PDFs)")
+    parser.add_argument('--pages', type=int, default=5, help="pages par PDF")
+    parser.add_argument('--ingest', default='drive,local', help="chemins d'ingestion mesurés")
+    parser.add_argument('--queries', type=int, default=100, help="requêtes de recherche")
+    parser.add_argument('--answers', type=int, default=20, help="réponses complètes")
+    parser.add_argument('--embed-latency', type=float, default=0.005, help="latence par appel d'embedding (s)")
+    parser.add_argument('--embed-latency-per-input', type=float, default=0.001, help="latence par texte (s)")
+    parser.add_argument('--first-token-latency', type=float, default=0.05, help="délai avant le premier token (s)")
+    parser.add_argument('--tokens-per-second', type=float, default=200, help="débit de génération (0 = illimité)")
+    parser.add_argument('--answer-tokens', type=int, default=40)
+    parser.add_argument('--drive-latency', type=float, default=0.01, help="aller-retour Drive simulé (s)")
+    parser.add_argument('--drive-bandwidth', type=float, default=0, help="débit Drive simulé (octets/s)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark-results.json')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        args.documents = int(args.documents)
+        print(json.dumps(run_worker(args)))
+        return
+
+    options = [
+        f"--{name.replace('_', '-')}={value}" for name, value in vars(args).items()
+        if name not in ('documents', 'ingest', 'output', 'worker')
+    ]
+    results = []
+    for ingest in args.ingest.split(','):
+        for documents in args.documents.split(','):
+            print(f"Mesure {ingest} / {documents} PDF(s)...", file=sys.stderr)
+            command = [
+                sys.executable, __file__, '--worker',
+                f'--documents={documents}', f'--ingest={ingest}', *options
+            ]
+            proc = subprocess.run(command, capture_output=True, text=True)
+            if proc.returncode != 0:
+                error = proc.stderr.strip().splitlines()[-1:] or ['code de sortie non nul']
+                results.append({'ingest_path': ingest, 'documents': int(documents), 'error': error[0]})
+                continue
+            results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    report = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'parameters': {k: v for k, v in vars(args).items() if k not in ('worker', 'output')},
+        'results': results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print_table(results)
+    print(f"\nRésultats écrits dans {args.output}")
+
+
+if __name__ == '__main__':
+    main()
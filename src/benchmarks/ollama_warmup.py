@@ -0,0 +1,159 @@
+"""Mesure la première question après démarrage (modèles froids ou préchargés) et la réutilisation des connexions Ollama.
+
+Scénarios, chacun précédé du déchargement des modèles (`keep_alive=0`) :
+
+    cold     première question sans préchargement : embedding de la question
+             puis génération, chaque modèle étant chargé à la demande
+    warmup   `OllamaClient.warmup()` au démarrage, puis la même question
+    idle     deux questions séparées de `--idle` secondes, avec le
+             `keep_alive` demandé : le modèle a-t-il été déchargé entre-temps ?
+
+Puis `--requests` petites requêtes d'embedding, avec un client partagé
+(pool de connexions HTTP) ou un client neuf par requête (comportement de
+l'ancien `get_llm`, qui recréait un client à chaque appel).
+
+Sans `--host`, un faux serveur Ollama simule le chargement des modèles
+(`--load-latency`) et leur rétention en mémoire.
+
+Usage :
+    python src/benchmarks/ollama_warmup.py --load-latency 2 --idle 1 --keep-alive 0.5
+    python src/benchmarks/ollama_warmup.py --host http://localhost:11434 --model mistral
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+QUESTION = "Quel est le montant de la contribution de vie étudiante et de campus ?"
+
+
+def unload(client):
+    """Demande à Ollama de décharger les modèles du client"""
+    raw = client._client
+    raw.generate(model=client.chat_model, prompt="", keep_alive=0)
+    if client.embed_model != client.chat_model:
+        raw.embed(model=client.embed_model, input=["unload"], keep_alive=0)
+
+
+def ask(client):
+    """Une question : embedding de la requête puis génération ; retourne (total, premier token)"""
+    start = time.perf_counter()
+    client.embed([QUESTION])
+    first_token = None
+    for _ in client.generate_stream(QUESTION, temperature=0.0):
+        if first_token is None:
+            first_token = time.perf_counter() - start
+    return time.perf_counter() - start, first_token
+
+
+def started(client):
+    """Démarrage "cold" si l'un des modèles a dû être chargé pendant la dernière question"""
+    return 'cold' if 'cold' in client.status()['last_start'].values() else 'warm'
+
+
+def scenario(name, make_client, warmup=False, idle=None):
+    client = make_client()
+    unload(client)
+    start = time.perf_counter()
+    if warmup:
+        client.warmup()
+    warmup_seconds = time.perf_counter() - start
+    total, first_token = ask(client)
+    row = {
+        'scenario': name,
+        'warmup_s': warmup_seconds if warmup else None,
+        'first_token_s': first_token,
+        'total_s': total,
+        'start': started(client)
+    }
+    if idle is not None:
+        time.sleep(idle)
+        total, first_token = ask(client)
+        row.update(first_token_s=first_token, total_s=total, start=started(client))
+    return row
+
+
+def connection_reuse(make_client, requests):
+    """Latence d'une petite requête avec un client partagé ou un client neuf à chaque fois"""
+    shared = make_client()
+    shared.embed(["préchauffage"])
+    results = {}
+    for mode in ('shared', 'per-request'):
+        latencies = []
+        for i in range(requests):
+            client = shared if mode == 'shared' else make_client()
+            start = time.perf_counter()
+            client.embed([f"requête {i}"])
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        results[mode] = {
+            'p50_ms': statistics.median(latencies) * 1000,
+            'p99_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default=None, help="Ollama réel (par défaut : faux serveur local)")
+    parser.add_argument('--model', default='mistral')
+    parser.add_argument('--embed-model', default=None)
+    parser.add_argument('--keep-alive', default='30m')
+    parser.add_argument('--idle', type=float, default=1.0)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--load-latency', type=float, default=1.0)
+    parser.add_argument('--first-token-latency', type=float, default=0.05)
+    parser.add_argument('--tokens-per-second', type=float, default=200.0)
+    args = parser.parse_args()
+
+    server = None
+    host = args.host
+    if host is None:
+        from fake_ollama import FakeOllamaServer
+        server = FakeOllamaServer(
+            load_latency=args.load_latency,
+            first_token_latency=args.first_token_latency,
+            tokens_per_second=args.tokens_per_second,
+            answer_tokens=20
+        ).start()
+        host = server.url
+
+    from ollama_client import OllamaClient
+
+    def make_client(keep_alive=None):
+        return OllamaClient(
+            host=host,
+            chat_model=args.model,
+            embed_model=args.embed_model,
+            keep_alive=keep_alive
+        )
+
+    try:
+        rows = [
+            scenario('cold', make_client),
+            scenario('warmup', make_client, warmup=True),
+            scenario(f'idle {args.idle:g}s', lambda: make_client(args.keep_alive), warmup=True, idle=args.idle)
+        ]
+        print(f"keep_alive={args.keep_alive}\n")
+        print(f"{'scénario':<12} {'warmup (s)':>11} {'1er token (s)':>14} {'total (s)':>10} {'modèle':>7}")
+        for row in rows:
+            warmup = f"{row['warmup_s']:.3f}" if row['warmup_s'] is not None else "-"
+            print(
+                f"{row['scenario']:<12} {warmup:>11} {row['first_token_s'] or 0:>14.3f} "
+                f"{row['total_s']:>10.3f} {row['start']:>7}"
+            )
+
+        reuse = connection_reuse(make_client, args.requests)
+        print(f"\n{'client':<12} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+        for mode, stats in reuse.items():
+            print(f"{mode:<12} {stats['p50_ms']:>9.2f} {stats['p99_ms']:>9.2f}")
+    finally:
+        if server:
+            server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""Test de charge : mémoire et démarrage à froid des sessions selon leur nombre.
+
+Compare l'ancien modèle (un RAGHandler/GoogleDriveHandler par session) au
+moteur partagé du processus. Chaque mesure tourne dans un sous-processus
+distinct pour que la mémoire résidente ne soit pas polluée par la précédente.
+Dans les deux modes, la session ouvre sa collection (`load`) comme à la
+première question. Avec `--documents N` (par défaut), la collection est
+d'abord remplie d'un corpus synthétique, indexé via un faux serveur Ollama
+dans un répertoire temporaire : l'index BM25 et les vecteurs que relit chaque
+session ont alors une taille réaliste. `--documents 0` mesure le stockage
+courant (STORAGE_DIR). Les modules sont importés avant la mesure : le
+démarrage à froid et la mémoire ne comptent que ce que crée chaque session.
+
+Usage :
+    python src/benchmarks/session_load.py --sessions 1,10,50 [--documents 50] [--with-drive]
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SRC_DIR)
+
+# chromadb ne supporte pas la création simultanée de clients sur un même répertoire
+_chroma_connect_lock = threading.Lock()
+
+
+def rss_mb():
+    """Mémoire résidente courante du processus, en Mo"""
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def start_session(mode, with_drive):
+    """Reproduit ce que fait une nouvelle session Streamlit à son premier affichage"""
+    if mode == 'per-session':
+        # Ancien modèle : chaque session construit ses propres clients (Ollama,
+        # embeddings, cache de réponses, Chroma) et ouvre sa collection
+        from config import Config
+        from ollama_client import OllamaClient
+        from rag_handler import RAGHandler, create_answer_cache, create_embeddings
+        ollama = OllamaClient()
+        chroma_client = None
+        if Config.VECTOR_BACKEND == 'chroma':
+            from vector_backends import SharedChromaClient
+            with _chroma_connect_lock:
+                chroma_client = SharedChromaClient(Config.CHROMA_PATH)
+        handler = RAGHandler(
+            chroma_client=chroma_client,
+            embeddings=create_embeddings(ollama),
+            answer_cache=create_answer_cache(),
+            ollama_client=ollama
+        )
+        session = {'rag_handler': handler.load()}
+        if with_drive:
+            from drive_handler import GoogleDriveHandler
+            session['drive_handler'] = GoogleDriveHandler()
+    else:
+        from engine import get_engine
+        engine = get_engine()
+        # La collection n'est ouverte qu'une fois par processus, à la première session
+        session = {'rag_handler': engine.rag_handler().load()}
+        if with_drive:
+            session['drive_handler'] = engine.drive_handler
+    session['chat_history'] = []
+    return session
+
+
+def seed_collection(workdir, documents, pages):
+    """Indexe un corpus synthétique dans la collection par défaut"""
+    from rag_handler import RAGHandler
+    from synthetic_pdfs import generate_corpus
+
+    paths, _ = generate_corpus(os.path.join(workdir, 'corpus'), documents, pages)
+    rag_handler = RAGHandler()
+    rag_handler.process_pdfs(paths)
+    return rag_handler.chunk_stats()['chunks']
+
+
+def run_worker(mode, sessions, with_drive):
+    # Imports communs aux deux modes, hors de la mesure
+    import engine
+    import rag_handler
+    from config import Config
+    if Config.VECTOR_BACKEND == 'chroma':
+        import chromadb
+    if with_drive:
+        import drive_handler
+    baseline = rss_mb()
+    barrier = threading.Barrier(sessions)
+    alive = []
+
+    def cold_start(_):
+        barrier.wait()
+        start = time.perf_counter()
+        alive.append(start_session(mode, with_drive))
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=sessions) as executor:
+        durations = sorted(executor.map(cold_start, range(sessions)))
+
+    return {
+        'mode': mode,
+        'sessions': sessions,
+        'cold_start_p50_s': durations[len(durations) // 2],
+        'cold_start_max_s': durations[-1],
+        'rss_mb': rss_mb(),
+        'rss_delta_mb': rss_mb() - baseline
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', default='1,5,10,25')
+    parser.add_argument('--modes', default='per-session,shared')
+    parser.add_argument('--with-drive', action='store_true', help="inclut l'authentification Drive")
+    parser.add_argument('--documents', type=int, default=50,
+                        help="taille du corpus synthétique indexé avant la mesure (0 : stockage courant)")
+    parser.add_argument('--pages', type=int, default=5)
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = run_worker(args.modes, int(args.sessions), args.with_drive)
+        print(json.dumps(result))
+        return
+
+    workdir = server = None
+    if args.documents:
+        # La configuration est lue à l'import : l'environnement (hérité par les
+        # sous-processus de mesure) doit être prêt avant
+        workdir = tempfile.mkdtemp(prefix='rag-sessions-')
+        os.environ['STORAGE_DIR'] = os.path.join(workdir, 'storage')
+        os.environ['OLLAMA_WARMUP'] = '0'
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        from fake_ollama import FakeOllamaServer
+
+        server = FakeOllamaServer().start()
+        os.environ['OLLAMA_HOST'] = server.url
+    try:
+        if args.documents:
+            chunks = seed_collection(workdir, args.documents, args.pages)
+            print(f"{args.documents} PDF(s) indexé(s), {chunks} chunk(s)\n")
+        print(f"{'mode':>12} {'sessions':>9} {'p50 (s)':>9} {'max (s)':>9} {'RSS (Mo)':>10} {'Δ RSS (Mo)':>11}")
+        for mode in args.modes.split(','):
+            for sessions in args.sessions.split(','):
+                command = [sys.executable, __file__, '--worker', '--modes', mode, '--sessions', sessions]
+                if args.with_drive:
+                    command.append('--with-drive')
+                output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                print(
+                    f"{mode:>12} {result['sessions']:>9} {result['cold_start_p50_s']:>9.3f} "
+                    f"{result['cold_start_max_s']:>9.3f} {result['rss_mb']:>10.1f} {result['rss_delta_mb']:>11.1f}"
+                )
+    finally:
+        if server is not None:
+            server.stop()
+        if workdir is not None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
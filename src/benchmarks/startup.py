@@ -0,0 +1,157 @@
+"""Mesure le démarrage de l'application : temps d'import, modules lourds chargés et premier affichage Streamlit.
+
+Chaque mesure tourne dans un sous-processus neuf, pour que les imports ne
+soient pas déjà en cache :
+
+    imports   import des modules de l'application (hors Streamlit) : durée et
+              modules lourds (langchain, chromadb, googleapiclient...) chargés
+    premier   premier run complet de `app.py` (`AppTest`) : imports de
+              l'application, moteur, sélecteur de base, listing Drive
+    rerun     run suivant de la même session (coût d'une interaction)
+
+Le démarrage propre à Streamlit (import, découverte des composants) est
+payé avant, sur un script vide, et rapporté à part : il ne dépend pas de
+l'application.
+
+Le premier affichage est mesuré deux fois sur le même répertoire de
+stockage : installation neuve, puis redémarrage (état Drive et manifestes
+déjà présents). Drive est remplacé par le faux service (`--latency` par
+appel, dossier public et `--files` PDFs déjà en ligne) et Ollama par le faux
+serveur ; le nombre d'appels Drive du premier run est rapporté.
+
+Usage :
+    python src/benchmarks/startup.py --repeat 3 --latency 0.1
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, SRC_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+HEAVY_MODULES = (
+    "langchain", "langchain_community", "langchain_core", "chromadb", "googleapiclient",
+    "google_auth_oauthlib", "pypdf", "ollama", "fastapi"
+)
+APP_MODULES = ("config", "instrumentation", "admission", "chunking", "conversation", "engine")
+
+
+def heavy_modules():
+    return [name for name in HEAVY_MODULES if name in sys.modules]
+
+
+def measure_imports():
+    start = time.perf_counter()
+    for name in APP_MODULES:
+        __import__(name)
+    return {"import_ms": (time.perf_counter() - start) * 1000, "heavy": heavy_modules()}
+
+
+def measure_first_paint(args):
+    from fake_ollama import FakeOllamaServer
+
+    server = FakeOllamaServer().start()
+    os.environ['OLLAMA_HOST'] = server.url
+    try:
+        from fake_drive import FakeDriveService, FOLDER_MIME_TYPE
+
+        # Dossier public et PDFs déjà en ligne (identifiants identiques d'un processus à l'autre)
+        service = FakeDriveService(latency=args.latency)
+        folder = service.create_file({'name': "RAG-Chat-Public-PDFs", 'mimeType': FOLDER_MIME_TYPE})
+        for i in range(args.files):
+            service.create_file(
+                {'name': f"document-{i:05d}.pdf", 'parents': [folder['id']]},
+                content=b"%PDF-1.4 " + bytes(str(i), 'ascii'),
+                mimetype='application/pdf'
+            )
+
+        start = time.perf_counter()
+        from streamlit.testing.v1 import AppTest
+        AppTest.from_string("import streamlit as st\nst.write('ok')").run()
+        streamlit_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        import drive_handler
+
+        # Le moteur construit son GoogleDriveHandler sans argument : le faux service devient la valeur par défaut
+        drive_handler.GoogleDriveHandler.__init__.__defaults__ = (service,)
+        calls = service.calls
+        app = AppTest.from_file(os.path.join(SRC_DIR, 'app.py'), default_timeout=120).run()
+        first = time.perf_counter() - start
+        if app.exception:
+            raise RuntimeError(app.exception[0].message)
+        first_calls = service.calls - calls
+        heavy = heavy_modules()
+
+        start = time.perf_counter()
+        app.run()
+        rerun = time.perf_counter() - start
+        return {
+            "streamlit_ms": streamlit_seconds * 1000,
+            "first_ms": first * 1000,
+            "rerun_ms": rerun * 1000,
+            "drive_calls": first_calls,
+            "heavy": heavy
+        }
+    finally:
+        server.stop()
+
+
+def run_child(phase, args, storage):
+    env = dict(os.environ, STORAGE_DIR=storage, OLLAMA_WARMUP='false')
+    command = [
+        sys.executable, os.path.abspath(__file__), '--child', phase,
+        '--latency', str(args.latency), '--files', str(args.files)
+    ]
+    output = subprocess.run(command, env=env, capture_output=True, text=True, check=False)
+    if output.returncode != 0:
+        raise RuntimeError(output.stderr[-2000:])
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.1, help="Aller-retour Drive simulé (s)")
+    parser.add_argument('--files', type=int, default=20)
+    parser.add_argument('--child', choices=('imports', 'paint'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = measure_imports() if args.child == 'imports' else measure_first_paint(args)
+        print(json.dumps(result))
+        return
+
+    imports, cold, warm = [], [], []
+    for _ in range(args.repeat):
+        storage = tempfile.mkdtemp(prefix='rag-startup-')
+        try:
+            imports.append(run_child('imports', args, storage))
+            cold.append(run_child('paint', args, storage))
+            warm.append(run_child('paint', args, storage))
+        finally:
+            shutil.rmtree(storage, ignore_errors=True)
+
+    print(f"imports      {statistics.median(r['import_ms'] for r in imports):>8.0f} ms   "
+          f"modules lourds : {', '.join(imports[-1]['heavy']) or '-'}")
+    print(f"streamlit    {statistics.median(r['streamlit_ms'] for r in cold + warm):>8.0f} ms   (hors application)")
+    print(f"\n{'démarrage':<12} {'premier (ms)':>12} {'rerun (ms)':>11} {'appels Drive':>13}")
+    for label, rows in (('neuf', cold), ('redémarrage', warm)):
+        print(
+            f"{label:<12} {statistics.median(r['first_ms'] for r in rows):>12.0f} "
+            f"{statistics.median(r['rerun_ms'] for r in rows):>11.0f} "
+            f"{statistics.median(r['drive_calls'] for r in rows):>13.0f}"
+        )
+    print(f"\nmodules lourds après le premier affichage : {', '.join(warm[-1]['heavy']) or '-'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+"""Générateur de corpus PDF synthétique pour les benchmarks.
+
+Les PDFs sont écrits directement (police Helvetica standard, une page de texte
+par page PDF) pour ne dépendre d'aucune bibliothèque d'édition. Chaque page
+contient du texte courant sur un thème et un identifiant unique ; les
+questions générées avec le corpus portent sur ces identifiants, ce qui permet
+de vérifier que la recherche retrouve le bon document.
+
+`generate_structured_corpus` produit des pages structurées (titre, articles
+numérotés, paragraphes, tableau en colonnes) et des questions indiquant les
+textes qui doivent se retrouver dans un même chunk (ligne de tableau et son
+en-tête, identifiant et titre de sa section).
+
+Usage autonome :
+    python src/benchmarks/synthetic_pdfs.py --documents 20 --pages 5 --output /tmp/corpus
+"""
+import argparse
+import os
+import random
+
+TOPICS = [
+    "contribution vie etudiante campus paiement attestation",
+    "inscription universite formation annee diplome",
+    "logement residence bourse aide sociale",
+    "sante medecine preventive consultation",
+    "sport association culture evenement",
+    "bibliotheque emprunt ressources numeriques",
+]
+FILLER = "le la les un une des de du et pour avec dans sur par au aux ce cette".split()
+LINE_WIDTH = 90
+LINES_PER_PAGE = 60
+# Séparateur des colonnes de tableau (deux espaces ou plus après extraction "layout")
+TABLE_GAP = "     "
+
+
+def page_text(rng, identifier):
+    """Texte d'une page : thème, remplissage et identifiant à retrouver"""
+    topic = rng.choice(TOPICS)
+    words = []
+    for _ in range(350):
+        words.append(rng.choice(topic.split()) if rng.random() < 0.3 else rng.choice(FILLER))
+    words.insert(rng.randrange(len(words)), f"reference {identifier}")
+    return topic, " ".join(words)
+
+
+def wrap(text, width=LINE_WIDTH):
+    """Coupe le texte en lignes ; lignes vides et lignes de tableau sont conservées telles quelles"""
+    lines = []
+    for paragraph in text.split("\n"):
+        if not paragraph.strip() or TABLE_GAP in paragraph:
+            lines.append(paragraph.strip())
+            continue
+        line = ""
+        for word in paragraph.split():
+            if line and len(line) + len(word) + 1 > width:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+        if line:
+            lines.append(line)
+    return lines[:LINES_PER_PAGE]
+
+
+def _escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def write_pdf(path, pages):
+    """Écrit un PDF minimal dont chaque page contient le texte donné"""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # arbre des pages, complété une fois les pages numérotées
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    page_refs = []
+    for text in pages:
+        commands = ["BT", "/F1 10 Tf", "12 TL", "50 800 Td"]
+        commands += [f"({_escape(line)}) '" for line in wrap(text)]
+        commands.append("ET")
+        stream = "\n".join(commands).encode('latin-1', 'replace')
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        page_refs.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % ref for ref in page_refs)
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_refs))
+
+    data = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    data += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    data += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def generate_corpus(directory, documents, pages=5, seed=0):
+    """Génère `documents` PDFs de `pages` pages dans `directory`.
+
+    Retourne la liste des fichiers et la liste des questions
+    `(question, nom du fichier attendu)`, une par page.
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    paths, questions = [], []
+    for i in range(documents):
+        name = f"document-{i:05d}.pdf"
+        texts = []
+        for page in range(pages):
+            identifier = f"CVEC-{2000 + i % 31}-{rng.randrange(36 ** 5):07X}"
+            topic, text = page_text(rng, identifier)
+            texts.append(text)
+            questions.append((f"Que dit le document sur {topic.split()[0]} reference {identifier} ?", name))
+        path = os.path.join(directory, name)
+        write_pdf(path, texts)
+        paths.append(path)
+    return paths, questions
+
+
+def sentences(rng, topic, count):
+    words = topic.split()
+    result = []
+    for _ in range(count):
+        sentence = [rng.choice(words) if rng.random() < 0.3 else rng.choice(FILLER) for _ in range(rng.randint(8, 16))]
+        result.append(" ".join(sentence).capitalize() + ".")
+    return result
+
+
+def structured_page(rng, document, page):
+    """Page structurée : titre, deux articles, paragraphes et tableau ; retourne le texte et les questions.
+
+    Les paragraphes sont assez longs pour être coupés par un découpage de
+    500 caractères, et l'identifiant y est placé au hasard : seul un
+    découpage qui rappelle le titre de section le garde avec son contexte.
+    """
+    topic = rng.choice(TOPICS)
+    words = topic.split()
+    lines = [f"DOCUMENT {document} PAGE {page + 1}", ""]
+    questions = []
+    identifier = f"CVEC-{2000 + document % 31}-{rng.randrange(36 ** 5):07X}"
+    target = rng.randrange(2)
+    for article in range(2):
+        heading = f"Article {page * 2 + article + 1} - {words[article].capitalize()}"
+        lines += [heading, ""]
+        for paragraph_index in range(2):
+            paragraph = sentences(rng, topic, rng.randint(5, 8))
+            if article == target and paragraph_index == 1:
+                paragraph.insert(rng.randrange(len(paragraph) + 1), f"La reference est {identifier}.")
+                questions.append({
+                    "question": f"Que dit le document sur {words[0]} reference {identifier} ?",
+                    "kind": "section",
+                    "expect": [identifier, heading]
+                })
+            lines += [" ".join(paragraph), ""]
+        if article == 1:
+            lines.append(TABLE_GAP.join(["Annee", "Montant", "Code"]))
+            for row in range(8):
+                code = f"TAB-{document:03d}-{page:02d}-{row}"
+                amount = f"{rng.randrange(50, 500)} EUR"
+                lines.append(TABLE_GAP.join([str(2016 + row), amount, code]))
+                if row == 6:
+                    questions.append({
+                        "question": f"Quel est le montant associe au code {code} ?",
+                        "kind": "table",
+                        "expect": [code, amount, "Montant"]
+                    })
+            lines.append("")
+    lines.append(f"Page {page + 1}")
+    return "\n".join(lines), questions
+
+
+def generate_structured_corpus(directory, documents, pages=5, seed=0):
+    """Génère des PDFs structurés ; retourne les fichiers et les questions.
+
+    Chaque question est un dict `question`, `document` (nom du fichier
+    attendu), `kind` ("section" ou "table") et `expect` (textes attendus
+    ensemble dans un même chunk).
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    paths, questions = [], []
+    for i in range(documents):
+        name = f"structured-{i:05d}.pdf"
+        texts = []
+        for page in range(pages):
+            text, page_questions = structured_page(rng, i, page)
+            texts.append(text)
+            questions.extend({**question, "document": name} for question in page_questions)
+        path = os.path.join(directory, name)
+        write_pdf(path, texts)
+        paths.append(path)
+    return paths, questions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--documents', type=int, default=10)
+    parser.add_argument('--pages', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', required=True)
+    args = parser.parse_args()
+    paths, questions = generate_corpus(args.output, args.documents, args.pages, args.seed)
+    print(f"{len(paths)} PDFs écrits dans {args.output} ({len(questions)} questions)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+"""Compare les bases vectorielles : Chroma et NumPy (float16/int8, exact ou IVF).
+
+Les embeddings sont synthétiques (vecteurs groupés autour de centres
+aléatoires, comme les chunks d'un même document) et la vérité terrain est
+une recherche exacte en float32. Chaque configuration est mesurée dans un
+sous-processus, pour que la mémoire résidente de l'une ne fausse pas les
+autres.
+
+Mesures : durée de construction, recall@k par rapport à la recherche
+exacte, latence de recherche (p50/p99) et mémoire résidente ajoutée. Avec
+`--filter-files N`, chaque requête est limitée aux chunks de N documents
+(filtre `file_ids`, un document = `--chunks-per-file` vecteurs), choisis
+parmi `--selections` sélections distinctes comme le ferait un utilisateur
+qui garde sa sélection ; la vérité terrain est calculée sur ce seul
+sous-ensemble.
+
+Usage :
+    python src/benchmarks/vector_search.py --vectors 200000 --dimensions 768 --k 4
+    python src/benchmarks/vector_search.py --vectors 200000 --filter-files 5
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CONFIGURATIONS = {
+    "chroma": {"backend": "chroma"},
+    "numpy-float32-exact": {"backend": "numpy", "dtype": "float32", "index": "exact"},
+    "numpy-float16-exact": {"backend": "numpy", "dtype": "float16", "index": "exact"},
+    "numpy-int8-exact": {"backend": "numpy", "dtype": "int8", "index": "exact"},
+    "numpy-float16-ivf": {"backend": "numpy", "dtype": "float16", "index": "ivf"},
+    "numpy-int8-ivf": {"backend": "numpy", "dtype": "int8", "index": "ivf"},
+}
+
+
+def make_dataset(vectors, dimensions, queries, seed):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, vectors // 100), dimensions)).astype(np.float32)
+    data = centers[rng.integers(0, len(centers), vectors)]
+    data += 0.5 * rng.normal(size=data.shape).astype(np.float32)
+    picks = data[rng.integers(0, vectors, queries)]
+    query_vectors = picks + 0.3 * rng.normal(size=picks.shape).astype(np.float32)
+    return data, query_vectors
+
+
+def exact_top_k(data, query_vectors, k, filters=None, chunks_per_file=100):
+    normalized = data / np.linalg.norm(data, axis=1, keepdims=True)
+    truth = []
+    for i, query in enumerate(query_vectors):
+        if filters is None:
+            rows = np.arange(len(data))
+        else:
+            rows = np.concatenate([
+                np.arange(f * chunks_per_file, min(len(data), (f + 1) * chunks_per_file))
+                for f in filters[i]
+            ])
+        scores = normalized[rows] @ query
+        top = np.argpartition(-scores, k)[:k] if len(rows) > k else np.arange(len(rows))
+        truth.append(set(rows[top].tolist()))
+    return truth
+
+
+def make_filters(vectors, queries, files, chunks_per_file, selections, seed):
+    """Documents autorisés pour chaque requête, tirés parmi `selections` sélections"""
+    rng = np.random.default_rng(seed + 1)
+    total = (vectors + chunks_per_file - 1) // chunks_per_file
+    pool = [rng.choice(total, min(files, total), replace=False).tolist() for _ in range(selections)]
+    return [pool[i % selections] for i in range(queries)]
+
+
+def rss_mb():
+    # Mémoire résidente courante (Linux), à défaut le pic
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class QueryVector:
+    """Embedding "identité" : la requête passée à Chroma est déjà un vecteur"""
+
+    def embed_query(self, query):
+        return np.asarray(query).tolist()
+
+    def embed_documents(self, texts):
+        raise NotImplementedError
+
+
+def open_backend(settings, directory, args):
+    if settings["backend"] == "chroma":
+        import chromadb
+        from vector_backends import ChromaBackend
+
+        client = chromadb.PersistentClient(path=directory)
+        return ChromaBackend(client, "benchmark", embeddings=QueryVector())
+    from vector_backends import NumpyBackend
+
+    return NumpyBackend(
+        directory,
+        dtype=settings["dtype"],
+        index=settings["index"],
+        nprobe=args.nprobe
+    )
+
+
+def search(backend, query, k, file_ids=None):
+    """Retourne les indices (dans le jeu de données) des k plus proches voisins"""
+    if hasattr(backend, "similarity_search_by_vector"):
+        documents = backend.similarity_search_by_vector(query, k, file_ids=file_ids)
+    else:
+        documents = backend.similarity_search(query, k, file_ids=file_ids)
+    return {document.metadata["i"] for document in documents}
+
+
+def run_configuration(name, args):
+    """Mesure une configuration (exécuté dans un sous-processus)"""
+    data = np.load(os.path.join(args.workdir, "data.npy"), mmap_mode='r')
+    query_vectors = np.load(os.path.join(args.workdir, "queries.npy"))
+    with open(os.path.join(args.workdir, "truth.json")) as f:
+        reference = json.load(f)
+    truth = [set(ids) for ids in reference["truth"]]
+    filters = reference["filters"] or [None] * len(truth)
+    directory = os.path.join(args.workdir, name)
+    baseline = rss_mb()
+
+    start = time.perf_counter()
+    backend = open_backend(CONFIGURATIONS[name], directory, args)
+    for offset in range(0, len(data), args.batch):
+        block = np.asarray(data[offset:offset + args.batch])
+        ids = [str(i) for i in range(offset, offset + len(block))]
+        metadatas = [{"i": int(i), "file_id": f"f{int(i) // args.chunks_per_file}"} for i in ids]
+        backend.upsert(ids, block.tolist(), ["" for _ in ids], metadatas)
+    # Premier appel hors chronométrage des requêtes (construction IVF éventuelle)
+    search(backend, query_vectors[0], args.k)
+    backend.persist()
+    build_seconds = time.perf_counter() - start
+
+    latencies, hits = [], 0
+    for query, expected, files in zip(query_vectors, truth, filters):
+        file_ids = [f"f{f}" for f in files] if files is not None else None
+        start = time.perf_counter()
+        found = search(backend, query, args.k, file_ids)
+        latencies.append(time.perf_counter() - start)
+        hits += len(found & expected)
+
+    return {
+        "configuration": name,
+        "build_s": build_seconds,
+        f"recall@{args.k}": hits / (len(truth) * args.k),
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "rss_mb": rss_mb() - baseline
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--vectors', type=int, default=50000)
+    parser.add_argument('--dimensions', type=int, default=768)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=4)
+    parser.add_argument('--nprobe', type=int, default=16)
+    parser.add_argument('--batch', type=int, default=5000)
+    parser.add_argument('--filter-files', type=int, default=0, help="documents autorisés par requête (0 = aucun filtre)")
+    parser.add_argument('--chunks-per-file', type=int, default=100)
+    parser.add_argument('--selections', type=int, default=5, help="sélections distinctes de documents")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--configurations', default=",".join(CONFIGURATIONS))
+    parser.add_argument('--output', help="fichier JSON des résultats")
+    # Usage interne : mesure d'une seule configuration dans un sous-processus
+    parser.add_argument('--run', help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_configuration(args.run, args)))
+        return
+
+    workdir = tempfile.mkdtemp(prefix="vector-bench-")
+    try:
+        data, query_vectors = make_dataset(args.vectors, args.dimensions, args.queries, args.seed)
+        np.save(os.path.join(workdir, "data.npy"), data)
+        np.save(os.path.join(workdir, "queries.npy"), query_vectors)
+        filters = None
+        if args.filter_files:
+            filters = make_filters(
+                args.vectors, args.queries, args.filter_files, args.chunks_per_file, args.selections, args.seed
+            )
+        truth = exact_top_k(data, query_vectors, args.k, filters, args.chunks_per_file)
+        with open(os.path.join(workdir, "truth.json"), "w") as f:
+            json.dump({"truth": [sorted(ids) for ids in truth], "filters": filters}, f)
+        del data
+
+        results = []
+        for name in args.configurations.split(","):
+            command = [
+                sys.executable, os.path.abspath(__file__), "--run", name, "--workdir", workdir,
+                "--k", str(args.k), "--nprobe", str(args.nprobe), "--batch", str(args.batch),
+                "--chunks-per-file", str(args.chunks_per_file)
+            ]
+            completed = subprocess.run(command, capture_output=True, text=True)
+            if completed.returncode != 0:
+                print(f"{name}: échec\n{completed.stderr[-2000:]}", file=sys.stderr)
+                continue
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+            results.append(result)
+            print(
+                f"{name:22s} construction {result['build_s']:7.1f} s  "
+                f"recall@{args.k} {result[f'recall@{args.k}']:.3f}  "
+                f"p50 {result['p50_ms']:7.2f} ms  p99 {result['p99_ms']:7.2f} ms  "
+                f"RAM +{result['rss_mb']:7.1f} Mo"
+            )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"parameters": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
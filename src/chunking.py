@@ -0,0 +1,295 @@
+from langchain_core.documents import Document
+from config import Config
+import re
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+SENTENCE_END = re.compile(r"(?<=[.!?;])\s+")
+# Colonnes séparées par au moins deux espaces (voir `normalize_layout_text`)
+COLUMN_GAP = re.compile(r"\S {2,}\S")
+HEADING_PATTERN = re.compile(
+    r"^(?:(?:\d+(?:\.\d+)*|[IVXLC]+|[A-Z])[.)-]\s+\S"
+    r"|(?:article|chapitre|section|titre|annexe|partie)\s+\w+)",
+    re.IGNORECASE
+)
+HEADING_MAX_CHARS = 80
+
+STRATEGIES = ("structured", "recursive")
+# Découpage historique (caractères), conservé pour les collections déjà indexées ainsi
+LEGACY_POLICY = {"strategy": "recursive", "chunk_size": 500, "chunk_overlap": 50}
+
+
+def count_tokens(text):
+    """Nombre de tokens d'un texte, estimé sur les mots et la ponctuation.
+
+    Ollama n'expose pas le tokenizer des modèles : un mot compte un token par
+    tranche de 4 caractères et chaque signe de ponctuation un token, ce qui
+    suit de près les tokenizers SentencePiece de Mistral/Llama sur du texte
+    français, bien mieux qu'un simple nombre de caractères.
+    """
+    return sum((len(token) + 3) // 4 for token in TOKEN_PATTERN.findall(text))
+
+
+def normalize_chunk_policy(policy=None):
+    """Politique de découpage complète et validée (valeurs par défaut de la configuration)"""
+    policy = dict(policy or {})
+    strategy = policy.get("strategy", Config.CHUNK_STRATEGY)
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Stratégie de découpage inconnue: {strategy} (attendu: {', '.join(STRATEGIES)})")
+    if strategy == "recursive":
+        normalized = {
+            "strategy": strategy,
+            "chunk_size": int(policy.get("chunk_size", LEGACY_POLICY["chunk_size"])),
+            "chunk_overlap": int(policy.get("chunk_overlap", LEGACY_POLICY["chunk_overlap"]))
+        }
+        if normalized["chunk_overlap"] >= normalized["chunk_size"]:
+            raise ValueError("Le chevauchement doit être inférieur à la taille des chunks")
+        return normalized
+    normalized = {
+        "strategy": strategy,
+        "max_tokens": int(policy.get("max_tokens", Config.CHUNK_MAX_TOKENS)),
+        "min_tokens": int(policy.get("min_tokens", Config.CHUNK_MIN_TOKENS)),
+        "overlap_tokens": int(policy.get("overlap_tokens", Config.CHUNK_OVERLAP_TOKENS))
+    }
+    if not 0 <= normalized["min_tokens"] <= normalized["max_tokens"]:
+        raise ValueError("Il faut 0 <= min_tokens <= max_tokens")
+    if not 0 <= normalized["overlap_tokens"] < normalized["max_tokens"] // 2:
+        raise ValueError("Le chevauchement doit être inférieur à la moitié de max_tokens")
+    return normalized
+
+
+def create_splitter(policy=None):
+    """Découpeur correspondant à une politique ; expose `split_documents(pages)`"""
+    policy = normalize_chunk_policy(policy)
+    if policy["strategy"] == "recursive":
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+        return RecursiveCharacterTextSplitter(
+            chunk_size=policy["chunk_size"],
+            chunk_overlap=policy["chunk_overlap"]
+        )
+    return StructuredSplitter(policy["max_tokens"], policy["min_tokens"], policy["overlap_tokens"])
+
+
+def is_heading(line):
+    """Titre : ligne courte, sans ponctuation finale, numérotée, introduite par un mot-clé ou en capitales"""
+    if not line or len(line) > HEADING_MAX_CHARS or COLUMN_GAP.search(line):
+        return False
+    if line[-1] in ".,;!?" or len(line.split()) > 12:
+        return False
+    letters = [c for c in line if c.isalpha()]
+    return bool(HEADING_PATTERN.match(line)) or (len(letters) > 2 and line.isupper())
+
+
+class Block:
+    """Unité de structure d'une page : titre, paragraphe ou tableau"""
+
+    def __init__(self, kind, text):
+        self.kind = kind
+        self.text = text
+        self.tokens = count_tokens(text)
+
+
+def parse_blocks(text):
+    """Découpe le texte d'une page en titres, paragraphes et tableaux.
+
+    Les paragraphes sont séparés par des lignes vides ; une suite d'au moins
+    deux lignes en colonnes (extraction "layout") forme un tableau, gardé
+    d'un seul tenant autant que possible.
+    """
+    blocks = []
+    lines = []
+    table = []
+
+    def flush_lines():
+        if lines:
+            blocks.append(Block("paragraph", "\n".join(lines)))
+            lines.clear()
+
+    def flush_table():
+        if len(table) >= 2:
+            flush_lines()
+            blocks.append(Block("table", "\n".join(table)))
+        else:
+            lines.extend(table)
+        table.clear()
+
+    for line in text.splitlines():
+        line = line.strip()
+        if COLUMN_GAP.search(line):
+            table.append(line)
+            continue
+        flush_table()
+        if not line:
+            flush_lines()
+        elif is_heading(line):
+            flush_lines()
+            blocks.append(Block("heading", line))
+        else:
+            lines.append(line)
+    flush_table()
+    flush_lines()
+    return blocks
+
+
+class StructuredSplitter:
+    """Découpage en chunks de `max_tokens` tokens au plus, aligné sur la structure des pages.
+
+    Les chunks ne traversent jamais une limite de page (la page reste une
+    source exacte) et sont assemblés bloc par bloc : un titre ouvre un
+    nouveau chunk et reste avec le texte qui le suit, un paragraphe ou un
+    tableau n'est coupé que s'il ne tient pas dans la place laissée par le
+    titre de section rappelé en tête (par phrases, ou par lignes en répétant
+    l'en-tête du tableau), avec `overlap_tokens` de recouvrement. Les fragments de moins de `min_tokens`
+    sont fusionnés avec un voisin. Chaque chunk garde le titre de sa section
+    (répété en tête de chunk et dans la métadonnée `section`) et son nombre
+    de tokens (`tokens`).
+    """
+
+    def __init__(self, max_tokens=256, min_tokens=64, overlap_tokens=32):
+        self.max_tokens = max_tokens
+        self.min_tokens = min_tokens
+        self.overlap_tokens = overlap_tokens
+
+    def split_documents(self, documents):
+        chunks = []
+        for document in documents:
+            for text, section in self.split_text(document.page_content):
+                metadata = {**document.metadata, "tokens": count_tokens(text)}
+                if section:
+                    metadata["section"] = section
+                chunks.append(Document(page_content=text, metadata=metadata))
+        return chunks
+
+    def split_text(self, text):
+        """Retourne les `(texte, section)` des chunks d'une page"""
+        chunks = []
+        current = {"parts": [], "tokens": 0, "section": None, "content": False, "repeated": False}
+        section = None
+
+        def flush():
+            if current["content"]:
+                chunks.append(dict(current))
+            current.update(parts=[], tokens=0, section=section, content=False, repeated=False)
+            if section:
+                # La section est rappelée en tête des chunks qui la poursuivent
+                current.update(parts=[section], tokens=count_tokens(section), repeated=True)
+
+        for block in parse_blocks(text):
+            if block.kind == "heading" and block.tokens > self.max_tokens // 2:
+                # Titre trop long pour être rappelé en tête des chunks : traité comme du texte
+                block = Block("paragraph", block.text)
+            if block.kind == "heading":
+                section = block.text
+                if current["content"] and current["tokens"] >= self.min_tokens:
+                    flush()
+                elif not current["content"] and current["repeated"]:
+                    # Nouvelle section : le rappel de la précédente n'a plus lieu d'être
+                    flush()
+                elif current["tokens"] + block.tokens > self.max_tokens:
+                    # Plus de place pour ce titre : ce qui précède forme un chunk à part
+                    current["content"] = True
+                    flush()
+                else:
+                    # Titres successifs, ou section trop courte pour un chunk à elle seule
+                    current["parts"].append(block.text)
+                    current["tokens"] += block.tokens
+                    current["section"] = current["section"] if current["content"] else section
+                continue
+            if current["content"] and current["tokens"] + block.tokens > self.max_tokens:
+                flush()
+            if not current["content"] and current["tokens"] > self.max_tokens // 2:
+                # Titres accumulés qui ne laissent pas assez de place au texte
+                current["content"] = True
+                flush()
+            # Les titres en tête du chunk comptent dans la limite : le bloc est
+            # coupé pour tenir dans la place restante, rappel de section compris
+            budget = self.max_tokens - current["tokens"]
+            pieces = [block] if block.tokens <= budget else self._split_block(block, budget)
+            for piece in pieces:
+                if current["content"] and current["tokens"] + piece.tokens > self.max_tokens:
+                    flush()
+                current["parts"].append(piece.text)
+                current["tokens"] += piece.tokens
+                current["content"] = True
+        flush()
+        return [("\n\n".join(chunk["parts"]), chunk["section"]) for chunk in self._merge_small(chunks)]
+
+    def _merge_small(self, chunks):
+        """Fusionne les chunks trop petits avec le précédent, ou à défaut le suivant"""
+        merged = []
+        for chunk in chunks:
+            if merged and (chunk["tokens"] < self.min_tokens or merged[-1]["tokens"] < self.min_tokens):
+                previous = merged[-1]
+                parts = chunk["parts"]
+                if chunk["section"] and parts and parts[0] == chunk["section"] == previous["section"]:
+                    # Inutile de répéter le titre de section au milieu d'un chunk
+                    parts = parts[1:]
+                tokens = previous["tokens"] + sum(count_tokens(part) for part in parts)
+                if tokens <= self.max_tokens:
+                    previous["parts"] = previous["parts"] + parts
+                    previous["tokens"] = tokens
+                    continue
+            merged.append(chunk)
+        return merged
+
+    def _split_block(self, block, budget):
+        """Coupe un bloc en morceaux de `budget` tokens au plus : tableau par lignes
+        (en-tête répété s'il tient dans la moitié du budget), texte par phrases"""
+        if block.kind == "table":
+            header, *rows = block.text.split("\n")
+            header_tokens = count_tokens(header)
+            if header_tokens <= budget // 2:
+                return self._pack(rows, budget - header_tokens, prefix=header)
+            return self._pack(block.text.split("\n"), budget, separator="\n")
+        overlap = min(self.overlap_tokens, budget // 2)
+        return self._pack(SENTENCE_END.split(block.text), budget, overlap=overlap)
+
+    def _split_words(self, text, budget):
+        """Coupe un texte entre les mots en morceaux de `budget` tokens au plus"""
+        pieces, piece, tokens = [], [], 0
+        for word in text.split():
+            parts = [word]
+            if count_tokens(word) > budget:
+                # Mot trop long (URL, suite de symboles) : tranches de `budget`
+                # caractères, un caractère comptant au plus un token
+                parts = [word[i:i + budget] for i in range(0, len(word), budget)]
+            for part in parts:
+                cost = count_tokens(part)
+                if piece and tokens + cost > budget:
+                    pieces.append(" ".join(piece))
+                    piece, tokens = [], 0
+                piece.append(part)
+                tokens += cost
+        if piece:
+            pieces.append(" ".join(piece))
+        return pieces
+
+    def _pack(self, units, budget, prefix=None, overlap=0, separator=" "):
+        """Regroupe des phrases (ou lignes) en morceaux de `budget` tokens au plus
+        (en-tête `prefix` non compris), avec `overlap` tokens de recouvrement"""
+        fitted = []
+        for unit in units:
+            if count_tokens(unit) <= budget - overlap:
+                fitted.append(unit)
+            else:
+                fitted.extend(self._split_words(unit, budget - overlap))
+        pieces = []
+        current, tokens = [], 0
+        for unit in fitted:
+            cost = count_tokens(unit)
+            if current and tokens + cost > budget:
+                pieces.append(current)
+                # Recouvrement : les dernières phrases du morceau précédent
+                tail, tail_tokens = [], 0
+                for previous in reversed(current):
+                    tail_tokens += count_tokens(previous)
+                    if tail_tokens > overlap:
+                        break
+                    tail.insert(0, previous)
+                current, tokens = tail, sum(count_tokens(u) for u in tail)
+            current.append(unit)
+            tokens += cost
+        if current:
+            pieces.append(current)
+        if prefix is not None:
+            return [Block("table", "\n".join([prefix] + piece)) for piece in pieces]
+        return [Block("table" if separator == "\n" else "paragraph", separator.join(piece)) for piece in pieces]
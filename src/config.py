@@ -11,5 +11,125 @@ class Config:
         'oauth_credentials.json'
     )
     OLLAMA_HOST = os.getenv('OLLAMA_HOST', 'http://localhost:11434')
-    MODEL_NAME = os.getenv('MODEL_NAME', 'llama2')
-    TEMPERATURE = float(os.getenv('TEMPERATURE', '0.7'))
\ No newline at end of file
+    MODEL_NAME = os.getenv('MODEL_NAME', 'mistral')
+    TEMPERATURE = float(os.getenv('TEMPERATURE', '0.7'))
+
+    # Client Ollama : modèle d'embedding (par défaut celui du chat), durée de rétention
+    # des modèles en mémoire ("30m", secondes, -1 = illimité), préchargement au démarrage,
+    # connexions HTTP réutilisées et délai maximal d'une requête (s)
+    EMBED_MODEL = os.getenv('EMBED_MODEL') or None
+    OLLAMA_KEEP_ALIVE = os.getenv('OLLAMA_KEEP_ALIVE', '30m')
+    OLLAMA_WARMUP = os.getenv('OLLAMA_WARMUP', '1') == '1'
+    OLLAMA_MAX_CONNECTIONS = int(os.getenv('OLLAMA_MAX_CONNECTIONS', '16'))
+    OLLAMA_TIMEOUT = float(os.getenv('OLLAMA_TIMEOUT', '300'))
+
+    # Stockage local (base vectorielle et manifeste des documents de chaque collection ;
+    # REGISTRY_PATH est l'ancien registre global, repris par la collection par défaut)
+    STORAGE_DIR = os.getenv('STORAGE_DIR', 'storage')
+    CHROMA_PATH = os.path.join(STORAGE_DIR, 'chromadb')
+    COLLECTIONS_DIR = os.path.join(STORAGE_DIR, 'collections')
+    REGISTRY_PATH = os.path.join(STORAGE_DIR, 'document_registry.json')
+    DEFAULT_COLLECTION = os.getenv('DEFAULT_COLLECTION', 'pdf_collection')
+
+    # Étape d'embedding : taille des lots, requêtes simultanées et cache disque
+    EMBED_BATCH_SIZE = int(os.getenv('EMBED_BATCH_SIZE', '32'))
+    EMBED_MAX_WORKERS = int(os.getenv('EMBED_MAX_WORKERS', '4'))
+    EMBED_CACHE_PATH = os.path.join(STORAGE_DIR, 'embedding_cache.sqlite')
+    EMBED_CACHE_MAX_MB = int(os.getenv('EMBED_CACHE_MAX_MB', '256'))
+
+    # Ingestion : téléchargements Drive simultanés, processus de parsing (0 = nb de cœurs),
+    # délai (s) sans tâche de parsing terminée au-delà duquel l'extraction échoue,
+    # et ingestions d'arrière-plan en attente ou en cours
+    INGEST_DOWNLOAD_WORKERS = int(os.getenv('INGEST_DOWNLOAD_WORKERS', '4'))
+    INGEST_PARSE_WORKERS = int(os.getenv('INGEST_PARSE_WORKERS', '0'))
+    INGEST_PARSE_TIMEOUT = float(os.getenv('INGEST_PARSE_TIMEOUT', '300'))
+    INGEST_MAX_PENDING_JOBS = int(os.getenv('INGEST_MAX_PENDING_JOBS', '16'))
+
+    # File d'ingestion persistante : travaux simultanés (un seul par collection),
+    # tentatives par travail et délai avant le premier nouvel essai (doublé ensuite)
+    JOBS_PATH = os.path.join(STORAGE_DIR, 'jobs.sqlite')
+    INGEST_JOB_WORKERS = int(os.getenv('INGEST_JOB_WORKERS', '2'))
+    INGEST_JOB_ATTEMPTS = int(os.getenv('INGEST_JOB_ATTEMPTS', '3'))
+    INGEST_JOB_RETRY_DELAY = float(os.getenv('INGEST_JOB_RETRY_DELAY', '10'))
+
+    # Téléchargements Drive : taille des morceaux et cache local des PDFs
+    DOWNLOAD_CHUNK_SIZE = int(os.getenv('DOWNLOAD_CHUNK_SIZE', str(8 * 1024 * 1024)))
+    DOWNLOAD_CACHE_DIR = os.path.join(STORAGE_DIR, 'downloads')
+
+    # Listing Drive : durée de validité du cache (secondes) et taille des pages
+    DRIVE_LIST_TTL = float(os.getenv('DRIVE_LIST_TTL', '60'))
+    DRIVE_LIST_PAGE_SIZE = int(os.getenv('DRIVE_LIST_PAGE_SIZE', '1000'))
+
+    # Nombre maximal de connexions HTTP simultanées vers Drive
+    DRIVE_HTTP_POOL_SIZE = int(os.getenv('DRIVE_HTTP_POOL_SIZE', '8'))
+
+    # Identifiant du dossier public Drive, mémorisé après la première recherche
+    # (supprimer le fichier pour le rechercher à nouveau, ex. après un changement de compte)
+    DRIVE_FOLDER_PATH = os.path.join(STORAGE_DIR, 'drive_folder.json')
+
+    # Uploads Drive : fichiers envoyés simultanément, taille des morceaux (multiple de
+    # 256 Ko) et sessions résumables en cours, reprises après une interruption
+    DRIVE_UPLOAD_WORKERS = int(os.getenv('DRIVE_UPLOAD_WORKERS', '4'))
+    DRIVE_UPLOAD_CHUNK_SIZE = int(os.getenv('DRIVE_UPLOAD_CHUNK_SIZE', str(8 * 1024 * 1024)))
+    UPLOAD_SESSIONS_PATH = os.path.join(STORAGE_DIR, 'upload_sessions.sqlite')
+
+    # Cache des réponses : similarité cosinus minimale, durée de vie (s) et taille maximale
+    ANSWER_CACHE_PATH = os.path.join(STORAGE_DIR, 'answer_cache.sqlite')
+    ANSWER_CACHE_THRESHOLD = float(os.getenv('ANSWER_CACHE_THRESHOLD', '0.95'))
+    ANSWER_CACHE_TTL = float(os.getenv('ANSWER_CACHE_TTL', str(24 * 3600)))
+    ANSWER_CACHE_MAX_ENTRIES = int(os.getenv('ANSWER_CACHE_MAX_ENTRIES', '1000'))
+
+    # Recherche hybride : chunks retournés, candidats par moteur et poids de la fusion RRF
+    KEYWORD_INDEX_DIR = os.path.join(STORAGE_DIR, 'keyword_index')
+    RETRIEVAL_K = int(os.getenv('RETRIEVAL_K', '4'))
+    RETRIEVAL_FETCH_K = int(os.getenv('RETRIEVAL_FETCH_K', '20'))
+    RRF_K = int(os.getenv('RRF_K', '60'))
+    RRF_VECTOR_WEIGHT = float(os.getenv('RRF_VECTOR_WEIGHT', '1.0'))
+    RRF_KEYWORD_WEIGHT = float(os.getenv('RRF_KEYWORD_WEIGHT', '1.0'))
+
+    # Conversation : budget de tokens de l'historique et cache des questions reformulées
+    HISTORY_MAX_TOKENS = int(os.getenv('HISTORY_MAX_TOKENS', '1000'))
+    CONDENSE_CACHE_SIZE = int(os.getenv('CONDENSE_CACHE_SIZE', '256'))
+
+    # Journalisation et profilage (RAG_PROFILE=1 active cProfile sur l'ingestion et les requêtes)
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    PROFILE = os.getenv('RAG_PROFILE', '0') == '1'
+    PROFILE_DIR = os.path.join(STORAGE_DIR, 'profiles')
+
+    # API HTTP : requêtes simultanées vers Ollama, file d'attente (backpressure) et pool de threads
+    API_HOST = os.getenv('API_HOST', '127.0.0.1')
+    API_PORT = int(os.getenv('API_PORT', '8000'))
+    API_OLLAMA_CONCURRENCY = int(os.getenv('API_OLLAMA_CONCURRENCY', '4'))
+    API_MAX_QUEUE = int(os.getenv('API_MAX_QUEUE', '64'))
+    API_QUEUE_TIMEOUT = float(os.getenv('API_QUEUE_TIMEOUT', '30'))
+    API_WORKERS = int(os.getenv('API_WORKERS', '32'))
+
+    # Découpage des documents (politique par défaut des nouvelles collections) : "structured"
+    # (chunks en tokens alignés sur titres, paragraphes et pages) ou "recursive" (ancien
+    # découpage en caractères) ; taille maximale, taille minimale avant fusion et recouvrement
+    CHUNK_STRATEGY = os.getenv('CHUNK_STRATEGY', 'structured')
+    CHUNK_MAX_TOKENS = int(os.getenv('CHUNK_MAX_TOKENS', '256'))
+    CHUNK_MIN_TOKENS = int(os.getenv('CHUNK_MIN_TOKENS', '64'))
+    CHUNK_OVERLAP_TOKENS = int(os.getenv('CHUNK_OVERLAP_TOKENS', '32'))
+
+    # Extraction des PDFs : mode pypdf ("layout" ou "plain"), pages par tâche du pool,
+    # cache disque du texte des pages (taille maximale, documents les moins récents
+    # évincés) et pages indexées par lot (mémoire bornée)
+    PDF_EXTRACTION_MODE = os.getenv('PDF_EXTRACTION_MODE', 'layout')
+    EXTRACT_PAGES_PER_TASK = int(os.getenv('EXTRACT_PAGES_PER_TASK', '8'))
+    PAGE_CACHE_PATH = os.path.join(STORAGE_DIR, 'page_cache.sqlite')
+    PAGE_CACHE_MAX_MB = int(os.getenv('PAGE_CACHE_MAX_MB', '256'))
+    INDEX_PAGE_BATCH = int(os.getenv('INDEX_PAGE_BATCH', '16'))
+
+    # Base vectorielle : "chroma" ou "numpy" (vecteurs quantifiés mappés en mémoire) ;
+    # pour numpy, type des vecteurs, index ("auto", "exact" ou "ivf"), seuil de passage
+    # à l'IVF (nb de vecteurs) et nombre de listes IVF parcourues par requête
+    VECTOR_BACKEND = os.getenv('VECTOR_BACKEND', 'chroma')
+    # Chroma : délai minimal (s) entre deux réouvertures du client pour relire les
+    # index HNSW modifiés par un autre processus
+    CHROMA_REOPEN_INTERVAL = float(os.getenv('CHROMA_REOPEN_INTERVAL', '5'))
+    VECTOR_DIR = os.path.join(STORAGE_DIR, 'vectors')
+    VECTOR_DTYPE = os.getenv('VECTOR_DTYPE', 'float16')
+    VECTOR_INDEX = os.getenv('VECTOR_INDEX', 'auto')
+    VECTOR_IVF_THRESHOLD = int(os.getenv('VECTOR_IVF_THRESHOLD', '50000'))
+    VECTOR_IVF_NPROBE = int(os.getenv('VECTOR_IVF_NPROBE', '16'))
@@ -0,0 +1,105 @@
+from collections import OrderedDict
+import hashlib
+import re
+import threading
+
+# Approximation courante pour les modèles de type Llama/Mistral : ~4 caractères par token
+CHARS_PER_TOKEN = 4
+
+# Marqueurs de reprise : une question qui en contient dépend de l'historique
+FOLLOW_UP_WORDS = {
+    # Français
+    "il", "elle", "ils", "elles", "lui", "leur", "leurs", "ça", "ca", "cela", "ceci",
+    "celui", "celle", "ceux", "celles", "précédent", "précédente", "dernier",
+    "dernière", "même", "aussi", "autre", "encore", "davantage", "dessus",
+    # Anglais
+    "it", "its", "they", "them", "their", "this", "that", "these", "those", "he", "she",
+    "him", "her", "previous", "above", "same", "also", "else", "more",
+}
+FOLLOW_UP_PREFIXES = ("et ", "mais ", "donc ", "alors ", "and ", "but ", "so ", "what about")
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def estimate_tokens(text):
+    """Estimation rapide du nombre de tokens d'un texte"""
+    return max(1, len(text) // CHARS_PER_TOKEN) if text else 0
+
+
+def message_text(content):
+    """Texte d'un message d'historique (les réponses RAG sont des dicts)"""
+    if isinstance(content, dict):
+        return content.get("answer", "")
+    return content
+
+
+def trim_history(chat_history, max_tokens):
+    """Garde les messages les plus récents tenant dans le budget de tokens.
+
+    `chat_history` est une liste de tuples (rôle, contenu) ; le résultat est
+    dans le même ordre, avec des contenus textuels.
+    """
+    kept = []
+    budget = max_tokens
+    for role, content in reversed(chat_history):
+        text = message_text(content)
+        cost = estimate_tokens(text)
+        if cost > budget:
+            break
+        kept.append((role, text))
+        budget -= cost
+    kept.reverse()
+    return kept
+
+
+def format_history(chat_history):
+    """Met en forme un historique de tuples (rôle, contenu) pour le prompt"""
+    lines = []
+    for role, content in chat_history:
+        speaker = "Human" if role == "user" else "Assistant"
+        lines.append(f"{speaker}: {message_text(content)}")
+    return "\n".join(lines)
+
+
+def is_self_contained(question):
+    """Heuristique : la question se comprend-elle sans l'historique ?
+
+    Une question courte, qui commence par une conjonction de reprise ou qui
+    contient un pronom/déictique renvoyant au contexte est considérée comme une
+    question de suivi, à reformuler.
+    """
+    text = question.strip().lower()
+    words = WORD_PATTERN.findall(text)
+    if len(words) < 4:
+        return False
+    if text.startswith(FOLLOW_UP_PREFIXES):
+        return False
+    return not any(word in FOLLOW_UP_WORDS for word in words)
+
+
+class CondensedQuestionCache:
+    """Cache LRU des questions reformulées, indexé par (historique, question)"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(history_text, question):
+        return hashlib.sha256(f"{history_text}\x00{question}".encode('utf-8')).hexdigest()
+
+    def get(self, history_text, question):
+        key = self._key(history_text, question)
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, history_text, question, condensed):
+        key = self._key(history_text, question)
+        with self._lock:
+            self._entries[key] = condensed
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -0,0 +1,294 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def compute_file_hash(file_path, chunk_size=1024 * 1024):
+    """Calcule le hash MD5 du contenu d'un fichier.
+
+    MD5 est utilisé car c'est le `md5Checksum` exposé par Google Drive : on peut
+    ainsi savoir qu'un fichier est inchangé sans même le télécharger.
+    """
+    digest = hashlib.md5()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _file_stamp(file):
+    """Empreinte d'un fichier (chemin ou descripteur) : change à chaque réécriture"""
+    stat = os.stat(file)
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def summarize_documents(documents):
+    """Statistiques de découpage d'un ensemble d'entrées du manifeste"""
+    chunks = sum(len(entry['chunk_ids']) for entry in documents.values())
+    # Les documents indexés avant le suivi des tokens n'entrent pas dans la moyenne
+    measured = [entry for entry in documents.values() if entry.get('tokens') is not None]
+    measured_chunks = sum(len(entry['chunk_ids']) for entry in measured)
+    tokens = sum(entry['tokens'] for entry in measured)
+    return {
+        'documents': len(documents),
+        'chunks': chunks,
+        'tokens': tokens,
+        'mean_chunk_tokens': tokens / measured_chunks if measured_chunks else None,
+        'min_chunk_tokens': min((entry['min_tokens'] for entry in measured), default=None),
+        'max_chunk_tokens': max((entry['max_tokens'] for entry in measured), default=None)
+    }
+
+
+def read_manifest(path):
+    """Lit le manifeste d'une collection sans ouvrir sa base vectorielle"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return {
+        **data.get('info', {}),
+        'name': os.path.splitext(os.path.basename(path))[0],
+        **summarize_documents(data.get('documents', {}))
+    }
+
+
+def list_manifests(directory):
+    """Résumé des collections enregistrées, de la plus récemment modifiée à la plus ancienne"""
+    if not os.path.isdir(directory):
+        return []
+    manifests = []
+    for filename in os.listdir(directory):
+        if not filename.endswith('.json'):
+            continue
+        try:
+            manifests.append(read_manifest(os.path.join(directory, filename)))
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Manifeste illisible ignoré ({filename}): {e}")
+    return sorted(manifests, key=lambda m: m.get('updated_at') or 0, reverse=True)
+
+
+class DocumentRegistry:
+    """Manifeste persistant d'une collection : documents indexés et leurs versions.
+
+    Chaque entrée est indexée par l'identifiant Drive du fichier et conserve le
+    hash du contenu (la version), la date de modification Drive, les
+    identifiants des chunks insérés dans la base vectorielle et leur taille
+    en tokens. `info` décrit la collection elle-même (modèle d'embedding,
+    backend, politique de découpage, dates) et permet de vérifier, à la
+    réouverture, que les vecteurs stockés sont réutilisables.
+
+    `legacy_path` désigne un ancien registre global, repris s'il n'existe pas
+    encore de manifeste.
+
+    Un autre processus peut réécrire le manifeste : `changed` le détecte
+    (taille, date et inode du fichier) et `reload` le relit.
+
+    Chaque modification réécrit le manifeste, sauf entre `hold` et `release`
+    (un lot d'ingestion ou de suppressions) : il n'est alors sauvegardé
+    qu'une fois, à la fin, et `reload` réapplique les modifications en attente.
+    """
+
+    VERSION = 2
+
+    def __init__(self, path, legacy_path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        if legacy_path and not os.path.exists(path) and os.path.exists(legacy_path):
+            logger.info(f"Reprise du registre {legacy_path} dans {path}")
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            os.replace(legacy_path, path)
+        self.exists = os.path.exists(path)
+        self.info = {}
+        self._stamp = None
+        self._held = 0
+        # Modifications pas encore sauvegardées : {"documents": {file_id: entrée ou None},
+        # "info": {...}, "clear": bool}, ou None
+        self._pending = None
+        self._documents = self._load()
+
+    def _load(self):
+        if not self.exists:
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._stamp = _file_stamp(f.fileno())
+                data = json.load(f)
+            self.info = data.get('info', {})
+            return data.get('documents', {})
+        except (OSError, ValueError) as e:
+            logger.error(f"Registre illisible ({self.path}), il sera reconstruit: {e}")
+            return {}
+
+    def changed(self):
+        """Indique si le manifeste a été réécrit (par un autre processus) depuis sa lecture"""
+        try:
+            stamp = _file_stamp(self.path)
+        except OSError:
+            stamp = None
+        with self._lock:
+            return stamp != self._stamp
+
+    def reload(self):
+        """Relit le manifeste depuis le disque (en conservant les modifications en attente)"""
+        with self._lock:
+            self.exists = os.path.exists(self.path)
+            self.info = {}
+            self._stamp = None
+            self._documents = self._load()
+            pending = self._pending
+            if pending is not None:
+                if pending["clear"]:
+                    self._documents = {}
+                for file_id, entry in pending["documents"].items():
+                    if entry is None:
+                        self._documents.pop(file_id, None)
+                    else:
+                        self._documents[file_id] = entry
+                self.info.update(pending["info"])
+
+    def hold(self):
+        """Diffère les sauvegardes jusqu'au `release` correspondant"""
+        with self._lock:
+            self._held += 1
+
+    def release(self):
+        """Fin d'un `hold` : le manifeste est sauvegardé s'il a changé et que plus rien ne le retient"""
+        with self._lock:
+            self._held -= 1
+            if not self._held and self._pending is not None:
+                self._save()
+
+    @property
+    def held(self):
+        return self._held > 0
+
+    def _changed(self, file_ids=(), info=None, clear=False):
+        """Sauvegarde une modification, ou la note en attente pendant un `hold`"""
+        if not self._held:
+            self._save()
+            return
+        if self._pending is None:
+            self._pending = {"documents": {}, "info": {}, "clear": False}
+        if clear:
+            self._pending.update(documents={}, clear=True)
+        for file_id in file_ids:
+            self._pending["documents"][file_id] = self._documents.get(file_id)
+        self._pending["info"].update(info or {})
+
+    def _save(self):
+        self._pending = None
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        now = time.time()
+        self.info.setdefault('created_at', now)
+        self.info['updated_at'] = now
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(
+                {'version': self.VERSION, 'info': self.info, 'documents': self._documents},
+                f,
+                indent=2
+            )
+            f.flush()
+            stamp = _file_stamp(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._stamp = stamp
+        self.exists = True
+
+    def get(self, file_id):
+        with self._lock:
+            entry = self._documents.get(file_id)
+            return dict(entry) if entry else None
+
+    def file_ids(self):
+        with self._lock:
+            return list(self._documents)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._documents)
+
+    def set_info(self, **values):
+        """Met à jour la description de la collection (sauvegardée si elle change)"""
+        with self._lock:
+            if any(self.info.get(key) != value for key, value in values.items()):
+                self.info.update(values)
+                self._changed(info=values)
+
+    def version(self, file_ids=None):
+        """Empreinte des documents indexés (change à chaque ajout/modification/suppression).
+
+        Avec `file_ids`, l'empreinte ne porte que sur ces documents.
+        """
+        with self._lock:
+            digest = hashlib.md5()
+            selected = self._documents if file_ids is None else set(file_ids) & self._documents.keys()
+            for file_id in sorted(selected):
+                digest.update(f"{file_id}:{self._documents[file_id]['content_hash']};".encode('utf-8'))
+            return digest.hexdigest()
+
+    def chunk_ids(self, file_ids):
+        """Identifiants des chunks des documents donnés (ceux qui sont indexés)"""
+        with self._lock:
+            return {
+                chunk_id
+                for file_id in file_ids if file_id in self._documents
+                for chunk_id in self._documents[file_id]['chunk_ids']
+            }
+
+    def stats(self):
+        """Statistiques de découpage de la collection (chunks, tokens)"""
+        with self._lock:
+            return summarize_documents(self._documents)
+
+    def is_current(self, file_id, content_hash):
+        """Indique si le document est déjà indexé avec ce contenu"""
+        if not content_hash:
+            return False
+        with self._lock:
+            entry = self._documents.get(file_id)
+            return entry is not None and entry['content_hash'] == content_hash
+
+    def record(self, file_id, content_hash, chunk_ids, name=None, modified=None, chunk_tokens=None):
+        """Enregistre (ou remplace) l'entrée d'un document indexé.
+
+        `chunk_tokens` (taille de chaque chunk en tokens) alimente les
+        statistiques de découpage.
+        """
+        with self._lock:
+            entry = {
+                'name': name,
+                'content_hash': content_hash,
+                'modified': modified,
+                'chunk_ids': list(chunk_ids),
+                'indexed_at': time.time()
+            }
+            if chunk_tokens:
+                entry.update(
+                    tokens=sum(chunk_tokens),
+                    min_tokens=min(chunk_tokens),
+                    max_tokens=max(chunk_tokens)
+                )
+            self._documents[file_id] = entry
+            self._changed([file_id])
+
+    def remove(self, file_id):
+        """Supprime l'entrée d'un document et retourne ses identifiants de chunks"""
+        with self._lock:
+            entry = self._documents.pop(file_id, None)
+            if entry is None:
+                return []
+            self._changed([file_id])
+            return entry['chunk_ids']
+
+    def clear(self):
+        """Oublie tous les documents (leurs vecteurs doivent être supprimés à part)"""
+        with self._lock:
+            self._documents = {}
+            self._changed(clear=True)
+
+    def save(self):
+        with self._lock:
+            self._save()
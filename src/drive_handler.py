@@ -1,16 +1,23 @@
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
-from google.auth.transport.requests import Request
-from googleapiclient.http import MediaFileUpload
-from googleapiclient.http import MediaIoBaseDownload
+from googleapiclient.errors import HttpError
+from google_auth_httplib2 import AuthorizedHttp
+import glob
+import hashlib
+import httplib2
+import json
 import os
+import re
 import pickle
 from config import Config
+from drive_listing import DriveListing
+from drive_upload import DriveUploader, UploadSessions
+from file_lock import FileLock
+from http_pool import HttpPool
+from instrumentation import metrics
 import logging
-import io
+import threading
+import time
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 class GoogleDriveHandler:
@@ -26,12 +33,35 @@ class GoogleDriveHandler:
     )
     PUBLIC_FOLDER_NAME = "RAG-Chat-Public-PDFs"
 
-    def __init__(self):
+    def __init__(self, service=None):
+        """`service` permet d'injecter un client Drive (ou un faux) déjà construit"""
         self.creds = None
-        self.service = None
+        self.service = service
         self.public_folder_id = None
-        self._authenticate()
+        self._http_pool = HttpPool(self._new_http, size=Config.DRIVE_HTTP_POOL_SIZE)
+        # Un verrou par fichier Drive : deux ingestions ne téléchargent pas le même PDF en même temps
+        self._fetch_locks = {}
+        self._fetch_locks_lock = threading.Lock()
+        if self.service is None:
+            self._authenticate()
         self._ensure_public_folder_exists()
+        self.listing = DriveListing(
+            self.service,
+            self.public_folder_id,
+            execute=self._execute,
+            ttl=Config.DRIVE_LIST_TTL,
+            page_size=Config.DRIVE_LIST_PAGE_SIZE
+        )
+        self.uploader = DriveUploader(
+            self.service,
+            self.public_folder_id,
+            execute=self._execute,
+            http_pool=self._http_pool,
+            sessions=UploadSessions(Config.UPLOAD_SESSIONS_PATH),
+            listing=self.listing,
+            workers=Config.DRIVE_UPLOAD_WORKERS,
+            chunk_size=Config.DRIVE_UPLOAD_CHUNK_SIZE
+        )
 
     def _authenticate(self):
         logger.debug("Début de l'authentification...")
@@ -51,10 +81,13 @@ class GoogleDriveHandler:
 
         if not self.creds or not self.creds.valid:
             logger.debug("Token invalide ou expiré")
+            # Imports différés : seulement utiles quand le token doit être renouvelé
             if self.creds and self.creds.expired and self.creds.refresh_token:
+                from google.auth.transport.requests import Request
                 logger.debug("Rafraîchissement du token...")
                 self.creds.refresh(Request())
             else:
+                from google_auth_oauthlib.flow import InstalledAppFlow
                 logger.debug("Création d'un nouveau flow OAuth...")
                 flow = InstalledAppFlow.from_client_secrets_file(
                     Config.GOOGLE_CREDENTIALS_FILE, 
@@ -71,18 +104,44 @@ class GoogleDriveHandler:
                 pickle.dump(self.creds, token)
 
         logger.debug("Construction du service Google Drive...")
-        self.service = build('drive', 'v3', credentials=self.creds)
+        # Document de découverte de Drive v3 embarqué dans googleapiclient : aucun appel réseau
+        self.service = build('drive', 'v3', credentials=self.creds, static_discovery=True, cache_discovery=False)
         logger.debug("Authentification terminée avec succès")
 
+    def _new_http(self):
+        """Crée un client HTTP authentifié (None pour un service injecté)"""
+        if self.creds is None:
+            return None
+        return AuthorizedHttp(self.creds, http=httplib2.Http())
+
+    def _execute(self, request):
+        """Exécute une requête Drive sur une connexion empruntée au pool.
+
+        Le service est partagé entre threads alors qu'httplib2 n'est pas
+        thread-safe : chaque requête utilise sa propre connexion.
+        """
+        with self._http_pool.connection() as http:
+            if http is None:
+                return request.execute()
+            return request.execute(http=http)
+
     def _ensure_public_folder_exists(self):
-        """Crée ou récupère le dossier public"""
+        """Crée ou récupère le dossier public.
+
+        Son identifiant est mémorisé (DRIVE_FOLDER_PATH) : les démarrages
+        suivants ne refont ni la recherche ni la mise en partage.
+        """
+        self.public_folder_id = self._load_public_folder_id()
+        if self.public_folder_id:
+            logger.debug(f"Dossier public mémorisé: {self.public_folder_id}")
+            return
         try:
             # Cherche si le dossier existe déjà
-            results = self.service.files().list(
+            results = self._execute(self.service.files().list(
                 q=f"name='{self.PUBLIC_FOLDER_NAME}' and mimeType='application/vnd.google-apps.folder'",
                 spaces='drive',
                 fields='files(id)'
-            ).execute()
+            ))
             files = results.get('files', [])
 
             if files:
@@ -94,20 +153,36 @@ class GoogleDriveHandler:
                     'name': self.PUBLIC_FOLDER_NAME,
                     'mimeType': 'application/vnd.google-apps.folder'
                 }
-                folder = self.service.files().create(
+                folder = self._execute(self.service.files().create(
                     body=folder_metadata,
                     fields='id'
-                ).execute()
+                ))
                 self.public_folder_id = folder['id']
                 logger.debug(f"Dossier public créé: {self.public_folder_id}")
 
             # Rend le dossier public
             self._make_public(self.public_folder_id)
+            self._save_public_folder_id()
 
         except Exception as e:
             logger.error(f"Erreur lors de la création du dossier public: {e}")
             raise
 
+    def _load_public_folder_id(self):
+        try:
+            with open(Config.DRIVE_FOLDER_PATH, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return state.get('id') if state.get('name') == self.PUBLIC_FOLDER_NAME else None
+
+    def _save_public_folder_id(self):
+        os.makedirs(os.path.dirname(Config.DRIVE_FOLDER_PATH) or '.', exist_ok=True)
+        tmp_path = f"{Config.DRIVE_FOLDER_PATH}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'name': self.PUBLIC_FOLDER_NAME, 'id': self.public_folder_id}, f)
+        os.replace(tmp_path, Config.DRIVE_FOLDER_PATH)
+
     def _make_public(self, file_id):
         """Rend un fichier ou dossier public"""
         try:
@@ -115,78 +190,178 @@ class GoogleDriveHandler:
                 'type': 'anyone',
                 'role': 'reader'
             }
-            self.service.permissions().create(
+            self._execute(self.service.permissions().create(
                 fileId=file_id,
                 body=permission
-            ).execute()
+            ))
             logger.debug(f"Fichier/dossier {file_id} rendu public")
         except Exception as e:
             logger.error(f"Erreur lors de la modification des permissions: {e}")
 
     def upload_pdf(self, file_path):
-        """Upload un PDF dans le dossier public"""
+        """Upload un PDF local dans le dossier public ; retourne son identifiant (None en cas d'échec)"""
         try:
-            file_metadata = {
-                'name': os.path.basename(file_path),
-                'parents': [self.public_folder_id]
-            }
-            media = MediaFileUpload(
-                file_path,
-                mimetype='application/pdf',
-                resumable=True
-            )
-            file = self.service.files().create(
-                body=file_metadata,
-                media_body=media,
-                fields='id'
-            ).execute()
-            
-            # Rend le fichier public
-            self._make_public(file['id'])
-            
-            return file['id']
+            with open(file_path, 'rb') as f:
+                result = self.upload_pdfs([(os.path.basename(file_path), f)])[0]
         except Exception as e:
             logger.error(f"Erreur lors de l'upload: {e}")
             return None
+        return result['file']['id'] if result['file'] else None
+
+    def upload_pdfs(self, files, on_progress=None):
+        """Publie plusieurs PDFs (nom, flux binaire) en parallèle, sans copie sur disque.
+
+        Voir `DriveUploader.upload_many` pour le format des résultats et de
+        `on_progress`.
+        """
+        return self.uploader.upload_many(files, on_progress=on_progress)
 
-    def list_public_pdfs(self):
-        """Liste tous les PDFs dans le dossier public"""
+    def list_public_pdfs(self, force_refresh=False):
+        """Liste tous les PDFs dans le dossier public (depuis le cache si frais).
+
+        Retourne None si le listing a échoué : à ne pas confondre avec un
+        dossier vide, en particulier avant de retirer des documents de l'index.
+        """
         try:
-            results = self.service.files().list(
-                q=f"'{self.public_folder_id}' in parents and mimeType='application/pdf'",
-                spaces='drive',
-                fields="files(id, name, webViewLink)"
-            ).execute()
-            return results.get('files', [])
+            return self.listing.list(force_refresh=force_refresh)
         except Exception as e:
             logger.error(f"Erreur lors de la liste des PDFs: {e}")
-            return []
+            return None
 
     def delete_pdf(self, file_id):
         """Supprime un PDF du dossier public"""
         try:
-            self.service.files().delete(fileId=file_id).execute()
+            self._execute(self.service.files().delete(fileId=file_id))
+            self.listing.forget(file_id)
             return True
         except Exception as e:
             logger.error(f"Erreur lors de la suppression: {e}")
             return False
 
-    def download_pdf(self, file_id, output_path):
-        """Télécharge un PDF depuis le dossier public"""
+    def get_metadata(self, file_id):
+        """Retourne les métadonnées utiles au téléchargement d'un fichier"""
+        return self._execute(self.service.files().get(
+            fileId=file_id,
+            fields="id, name, md5Checksum, modifiedTime, size"
+        ))
+
+    def download_pdf(self, file_id, output_path, md5_checksum=None, chunk_size=None):
+        """Télécharge un PDF depuis le dossier public en streaming vers le disque.
+
+        Les morceaux sont écrits au fil de l'eau dans `<output_path>.part`, ce qui
+        permet de reprendre un téléchargement interrompu. Le fichier n'est renommé
+        qu'une fois le md5Checksum Drive vérifié.
+        """
+        with metrics.span("download"):
+            return self._download_pdf(file_id, output_path, md5_checksum, chunk_size)
+
+    def _download_pdf(self, file_id, output_path, md5_checksum, chunk_size):
+        chunk_size = chunk_size or Config.DOWNLOAD_CHUNK_SIZE
+        part_path = f"{output_path}.part"
         try:
+            if md5_checksum is None:
+                md5_checksum = self.get_metadata(file_id).get('md5Checksum')
+
             request = self.service.files().get_media(fileId=file_id)
-            fh = io.BytesIO()
-            downloader = MediaIoBaseDownload(fh, request)
-            done = False
-            while done is False:
-                status, done = downloader.next_chunk()
-            
-            fh.seek(0)
-            with open(output_path, 'wb') as f:
-                f.write(fh.read())
-                f.flush()
-            
+
+            # Reprise : on repart de la fin du fichier partiel existant
+            digest = hashlib.md5()
+            offset = 0
+            if os.path.exists(part_path):
+                with open(part_path, 'rb') as f:
+                    for block in iter(lambda: f.read(chunk_size), b''):
+                        digest.update(block)
+                        offset += len(block)
+                logger.debug(f"Reprise du téléchargement de {file_id} à l'octet {offset}")
+
+            with self._http_pool.connection() as http, open(part_path, 'ab') as f:
+                http = http or request.http
+                while True:
+                    resp, content = self._request_range(http, request.uri, offset, chunk_size)
+                    if resp.status == 416:
+                        # Le fichier partiel est déjà complet
+                        break
+                    if resp.status == 200 and offset:
+                        # Plage ignorée par le serveur : le fichier complet remplace le partiel
+                        f.truncate(0)
+                        digest = hashlib.md5()
+                        offset = 0
+                    f.write(content)
+                    digest.update(content)
+                    offset += len(content)
+                    metrics.increment("rag_download_bytes_total", len(content))
+                    total = _content_range_total(resp)
+                    if resp.status == 200 or not content or (total is not None and offset >= total):
+                        break
+
+            if md5_checksum and digest.hexdigest() != md5_checksum:
+                os.remove(part_path)
+                raise IOError(f"Checksum invalide pour {file_id}")
+
+            os.replace(part_path, output_path)
             return True
         except Exception as e:
             logger.error(f"Erreur lors du téléchargement: {e}")
             return False
+
+    def _request_range(self, http, uri, offset, chunk_size, num_retries=3):
+        """Télécharge une plage d'octets, avec quelques tentatives en cas d'erreur réseau"""
+        headers = {'range': f'bytes={offset}-{offset + chunk_size - 1}'}
+        for attempt in range(num_retries + 1):
+            try:
+                resp, content = http.request(uri, method='GET', headers=headers)
+            except (OSError, httplib2.HttpLib2Error):
+                if attempt == num_retries:
+                    raise
+                time.sleep(2 ** attempt)
+                continue
+            if resp.status in (200, 206, 416):
+                return resp, content
+            if resp.status < 500 or attempt == num_retries:
+                raise HttpError(resp, content, uri=uri)
+            time.sleep(2 ** attempt)
+
+    def fetch_pdf(self, pdf, cache_dir=None):
+        """Retourne le chemin local d'un PDF, en le téléchargeant si nécessaire.
+
+        Le cache est indexé par identifiant Drive et modifiedTime : un PDF inchangé
+        n'est jamais téléchargé deux fois. Les téléchargements d'un même fichier
+        sont sérialisés (entre threads et entre processus) : le second attend le
+        premier puis trouve le PDF en cache. Retourne None en cas d'échec.
+        """
+        cache_dir = cache_dir or Config.DOWNLOAD_CACHE_DIR
+        if not pdf.get('modifiedTime') or 'md5Checksum' not in pdf:
+            pdf = {**pdf, **self.get_metadata(pdf['id'])}
+
+        version = re.sub(r'[^0-9A-Za-z]', '', pdf['modifiedTime'])
+        output_path = os.path.join(cache_dir, f"{pdf['id']}-{version}.pdf")
+        if os.path.exists(output_path):
+            return output_path
+
+        os.makedirs(cache_dir, exist_ok=True)
+        with self._fetch_lock(cache_dir, pdf['id']):
+            if os.path.exists(output_path):
+                return output_path
+            if not self.download_pdf(pdf['id'], output_path, md5_checksum=pdf.get('md5Checksum')):
+                return None
+
+            # Les anciennes versions du fichier ne servent plus
+            for old_path in glob.glob(os.path.join(cache_dir, f"{pdf['id']}-*.pdf")):
+                if old_path != output_path:
+                    os.remove(old_path)
+        return output_path
+
+    def _fetch_lock(self, cache_dir, file_id):
+        # Le fichier de verrou est conservé : le supprimer pendant qu'un autre processus l'attend casserait l'exclusion
+        path = os.path.join(cache_dir, f"{file_id}.lock")
+        with self._fetch_locks_lock:
+            if path not in self._fetch_locks:
+                self._fetch_locks[path] = FileLock(path)
+            return self._fetch_locks[path]
+
+
+def _content_range_total(resp):
+    """Extrait la taille totale de l'en-tête Content-Range (`bytes a-b/total`)"""
+    content_range = resp.get('content-range', '')
+    total = content_range.rpartition('/')[2]
+    return int(total) if total.isdigit() else None
@@ -0,0 +1,121 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PDF_MIME_TYPE = 'application/pdf'
+FILE_FIELDS = "id, name, webViewLink, md5Checksum, modifiedTime, mimeType, parents, trashed"
+
+
+class DriveListing:
+    """Liste en cache des PDFs d'un dossier Drive.
+
+    Le premier chargement parcourt toutes les pages de `files().list`. Ensuite,
+    une fois le TTL écoulé (ou sur demande), seules les modifications sont
+    récupérées via l'API changes à partir du dernier start page token.
+    `service` peut être n'importe quel objet exposant `files()` et `changes()`
+    comme le client Drive v3, ce qui permet de le remplacer par un faux en test.
+    `execute` permet de choisir comment les requêtes sont exécutées (ex. sur une
+    connexion d'un pool).
+    """
+
+    def __init__(self, service, folder_id, ttl=60, page_size=1000, clock=time.monotonic,
+                 execute=None):
+        self.service = service
+        self.execute = execute or (lambda request: request.execute())
+        self.folder_id = folder_id
+        self.ttl = ttl
+        self.page_size = page_size
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._files = None
+        self._page_token = None
+        self._refreshed_at = None
+
+    def list(self, force_refresh=False):
+        """Retourne les PDFs du dossier, triés par nom"""
+        with self._lock:
+            if self._files is None:
+                self._full_refresh()
+            elif force_refresh or self.clock() - self._refreshed_at >= self.ttl:
+                try:
+                    self._incremental_refresh()
+                except Exception as e:
+                    logger.warning(f"Rafraîchissement incrémental impossible, relisting complet: {e}")
+                    self._full_refresh()
+            return sorted(self._files.values(), key=lambda f: f['name'].lower())
+
+    def forget(self, file_id):
+        """Retire immédiatement un fichier du cache (ex. après suppression)"""
+        with self._lock:
+            if self._files is not None:
+                self._files.pop(file_id, None)
+
+    def remember(self, file):
+        """Ajoute immédiatement un fichier au cache (ex. après un upload)"""
+        with self._lock:
+            if self._files is not None:
+                self._files[file['id']] = file
+
+    def invalidate(self):
+        """Force un listing complet au prochain appel"""
+        with self._lock:
+            self._files = None
+
+    def _full_refresh(self):
+        # Le token est pris avant le listing pour ne manquer aucune modification
+        page_token = self.execute(self.service.changes().getStartPageToken())['startPageToken']
+        files = {}
+        next_page = None
+        while True:
+            results = self.execute(self.service.files().list(
+                q=f"'{self.folder_id}' in parents and mimeType='{PDF_MIME_TYPE}' and trashed=false",
+                spaces='drive',
+                pageSize=self.page_size,
+                pageToken=next_page,
+                fields=f"nextPageToken, files({FILE_FIELDS})"
+            ))
+            for file in results.get('files', []):
+                files[file['id']] = file
+            next_page = results.get('nextPageToken')
+            if not next_page:
+                break
+        self._files = files
+        self._page_token = page_token
+        self._refreshed_at = self.clock()
+        logger.debug(f"Listing complet: {len(files)} PDFs")
+
+    def _incremental_refresh(self):
+        page_token = self._page_token
+        changed = 0
+        while page_token:
+            results = self.execute(self.service.changes().list(
+                pageToken=page_token,
+                spaces='drive',
+                pageSize=self.page_size,
+                includeRemoved=True,
+                fields=f"nextPageToken, newStartPageToken, changes(fileId, removed, file({FILE_FIELDS}))"
+            ))
+            for change in results.get('changes', []):
+                self._apply_change(change)
+                changed += 1
+            if 'newStartPageToken' in results:
+                self._page_token = results['newStartPageToken']
+            page_token = results.get('nextPageToken')
+        self._refreshed_at = self.clock()
+        logger.debug(f"Listing incrémental: {changed} modification(s)")
+
+    def _apply_change(self, change):
+        file = change.get('file')
+        in_folder = (
+            not change.get('removed')
+            and file is not None
+            and not file.get('trashed')
+            and file.get('mimeType') == PDF_MIME_TYPE
+            and self.folder_id in file.get('parents', [])
+        )
+        if in_folder:
+            self._files[file['id']] = file
+        else:
+            self._files.pop(change['fileId'], None)
@@ -0,0 +1,275 @@
+from concurrent.futures import ThreadPoolExecutor
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaIoBaseUpload
+from drive_listing import FILE_FIELDS, PDF_MIME_TYPE
+from instrumentation import metrics
+import hashlib
+import httplib2
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Limite de l'API Drive pour une requête batch
+BATCH_SIZE = 100
+PUBLIC_PERMISSION = {'type': 'anyone', 'role': 'reader'}
+
+
+def stream_key(stream, chunk_size=1024 * 1024):
+    """Identifie un contenu par son MD5 et sa taille, sans le copier (le flux est rembobiné)"""
+    digest = hashlib.md5()
+    size = 0
+    stream.seek(0)
+    for block in iter(lambda: stream.read(chunk_size), b''):
+        digest.update(block)
+        size += len(block)
+    stream.seek(0)
+    return digest.hexdigest(), size
+
+
+class UploadSessions:
+    """Sessions d'upload résumables en cours, persistées dans SQLite.
+
+    Chaque session est indexée par le MD5 et la taille du contenu : si le même
+    fichier est republié après une interruption (erreur réseau, redémarrage),
+    l'upload reprend à l'octet où Drive s'était arrêté. Drive conserve une
+    session une semaine ; au-delà de `ttl`, elle est oubliée.
+    """
+
+    def __init__(self, path, ttl=6 * 24 * 3600):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS upload_sessions ("
+            " content_key TEXT PRIMARY KEY,"
+            " name TEXT NOT NULL,"
+            " uri TEXT NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, content_key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT uri FROM upload_sessions WHERE content_key = ? AND created_at > ?",
+                (content_key, time.time() - self.ttl)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, content_key, name, uri):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO upload_sessions (content_key, name, uri, created_at) "
+                "VALUES (?, ?, ?, ?)",
+                (content_key, name, uri, time.time())
+            )
+            self._conn.commit()
+
+    def remove(self, content_key):
+        with self._lock:
+            self._conn.execute("DELETE FROM upload_sessions WHERE content_key = ?", (content_key,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class DriveUploader:
+    """Publication de PDFs dans le dossier public Drive, par lots.
+
+    Chaque fichier est envoyé directement depuis son flux (ex. le tampon
+    d'un upload Streamlit), par morceaux de `chunk_size` octets, via une
+    session résumable : une erreur réseau ou serveur ne fait renvoyer que le
+    morceau en cours, et une session interrompue est reprise depuis
+    `sessions`. Au plus `workers` fichiers sont envoyés simultanément.
+
+    Les métadonnées utiles (lien, MD5, date de modification) reviennent dans
+    la réponse de l'upload ; les permissions publiques sont posées ensuite
+    en une requête batch pour tous les fichiers. Un fichier déjà présent
+    dans le dossier avec le même nom et le même contenu n'est pas renvoyé.
+
+    `on_progress(name, stage, detail)` est appelé avec les étapes "upload"
+    (fraction envoyée), "share", "done", "exists" et "error".
+    """
+
+    def __init__(self, service, folder_id, execute, http_pool, sessions=None, listing=None,
+                 workers=4, chunk_size=8 * 1024 * 1024, num_retries=5):
+        self.service = service
+        self.folder_id = folder_id
+        self.execute = execute
+        self.http_pool = http_pool
+        self.sessions = sessions
+        self.listing = listing
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.num_retries = num_retries
+
+    def upload_many(self, files, on_progress=None):
+        """Publie une liste de (nom, flux binaire) ; retourne un résultat par fichier, dans l'ordre.
+
+        Chaque résultat contient `name`, `status` ("uploaded", "exists" ou
+        "error"), `file` (métadonnées Drive) et `error`.
+        """
+        def notify(name, stage, detail=None):
+            if on_progress:
+                on_progress(name, stage, detail)
+
+        existing = {}
+        if self.listing is not None:
+            existing = {(f['name'], f.get('md5Checksum')): f for f in self.listing.list()}
+
+        results = []
+        pending = []
+        for name, stream in files:
+            md5, size = stream_key(stream)
+            result = {'name': name, 'status': None, 'file': None, 'error': None}
+            results.append(result)
+            if (name, md5) in existing:
+                result.update(status='exists', file=existing[(name, md5)])
+                notify(name, "exists")
+            else:
+                pending.append((result, stream, f"{md5}:{size}"))
+
+        if pending:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(pending))) as pool:
+                futures = [
+                    (result, pool.submit(self._upload, result['name'], stream, key, notify))
+                    for result, stream, key in pending
+                ]
+                for result, future in futures:
+                    try:
+                        result.update(status='uploaded', file=future.result())
+                    except Exception as e:
+                        logger.error(f"Erreur lors de l'upload de {result['name']}: {e}")
+                        result.update(status='error', error=str(e))
+                        notify(result['name'], "error", str(e))
+
+        uploaded = [result for result in results if result['status'] == 'uploaded']
+        for result in uploaded:
+            notify(result['name'], "share")
+        failed = self.share([result['file']['id'] for result in uploaded])
+        for result in uploaded:
+            if result['file']['id'] in failed:
+                # Le fichier est en ligne, mais seulement visible via le dossier public
+                result['error'] = failed[result['file']['id']]
+            if self.listing is not None:
+                self.listing.remember(result['file'])
+            notify(result['name'], "done")
+        return results
+
+    def share(self, file_ids):
+        """Rend des fichiers publics, par requêtes batch ; retourne {file_id: erreur} des échecs"""
+        failed = {}
+
+        def callback(request_id, response, exception):
+            if exception is not None:
+                failed[request_id] = str(exception)
+
+        for start in range(0, len(file_ids), BATCH_SIZE):
+            batch = self.service.new_batch_http_request(callback=callback)
+            for file_id in file_ids[start:start + BATCH_SIZE]:
+                batch.add(
+                    self.service.permissions().create(fileId=file_id, body=PUBLIC_PERMISSION, fields='id'),
+                    request_id=file_id
+                )
+            try:
+                self.execute(batch)
+            except Exception as e:
+                for file_id in file_ids[start:start + BATCH_SIZE]:
+                    failed.setdefault(file_id, str(e))
+        for file_id, error in failed.items():
+            logger.error(f"Erreur lors de la modification des permissions de {file_id}: {error}")
+        return failed
+
+    def _upload(self, name, stream, content_key, notify):
+        with metrics.span("upload"):
+            return self._send(name, stream, content_key, notify)
+
+    def _send(self, name, stream, content_key, notify):
+        media = MediaIoBaseUpload(stream, mimetype=PDF_MIME_TYPE, chunksize=self.chunk_size, resumable=True)
+        request = self.service.files().create(
+            body={'name': name, 'parents': [self.folder_id]},
+            media_body=media,
+            fields=FILE_FIELDS
+        )
+        with self.http_pool.connection() as http:
+            http = http or request.http
+            session_uri = self.sessions.get(content_key) if self.sessions else None
+            if session_uri:
+                file = self._resume(request, http, session_uri, media.size())
+                if file is not None:
+                    self._forget(content_key)
+                    return file
+
+            response = None
+            failures = 0
+            restarted = False
+            sent = request.resumable_progress
+            while response is None:
+                try:
+                    status, response = request.next_chunk(http=http)
+                except (OSError, httplib2.HttpLib2Error, HttpError) as e:
+                    status_code = getattr(getattr(e, 'resp', None), 'status', None)
+                    if status_code in (404, 410) and not restarted:
+                        # Session expirée côté Drive : on repart de zéro
+                        logger.warning(f"Session d'upload expirée pour {name}, nouvel envoi")
+                        self._forget(content_key)
+                        request.resumable_uri = None
+                        request.resumable_progress = 0
+                        session_uri = None
+                        restarted = True
+                        continue
+                    # La session est gardée même si l'upload échoue : un nouvel envoi la reprendra
+                    session_uri = self._save_session(content_key, name, request, session_uri)
+                    retryable = status_code is None or status_code >= 500 or status_code == 429
+                    failures += 1
+                    if not retryable or failures > self.num_retries:
+                        raise
+                    # Au prochain appel, next_chunk redemande à Drive l'octet atteint
+                    logger.warning(f"Upload de {name} interrompu ({e}), reprise (tentative {failures})")
+                    time.sleep(min(2 ** (failures - 1), 30))
+                    continue
+                failures = 0
+                session_uri = self._save_session(content_key, name, request, session_uri)
+                if status is not None:
+                    metrics.increment("rag_upload_bytes_total", status.resumable_progress - sent)
+                    sent = status.resumable_progress
+                    notify(name, "upload", status.progress())
+            metrics.increment("rag_upload_bytes_total", media.size() - sent)
+        self._forget(content_key)
+        notify(name, "upload", 1.0)
+        return response
+
+    def _resume(self, request, http, session_uri, size):
+        """Reprend une session existante : retourne le fichier si elle était terminée"""
+        resp, content = http.request(
+            session_uri, method='PUT', headers={'Content-Range': f"bytes */{size}", 'content-length': '0'}
+        )
+        if resp.status in (200, 201):
+            return json.loads(content)
+        if resp.status == 308:
+            # `range: bytes=0-N` : octets déjà reçus par Drive
+            received = resp.get('range', '')
+            request.resumable_uri = session_uri
+            request.resumable_progress = int(received.rpartition('-')[2]) + 1 if received else 0
+            logger.info(f"Reprise de l'upload à l'octet {request.resumable_progress}")
+            return None
+        logger.info(f"Session d'upload inutilisable (HTTP {resp.status}), nouvel envoi")
+        return None
+
+    def _save_session(self, content_key, name, request, session_uri):
+        if self.sessions and request.resumable_uri and request.resumable_uri != session_uri:
+            self.sessions.put(content_key, name, request.resumable_uri)
+        return request.resumable_uri
+
+    def _forget(self, content_key):
+        if self.sessions:
+            self.sessions.remove(content_key)
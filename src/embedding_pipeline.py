@@ -0,0 +1,227 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.embeddings import Embeddings
+from array import array
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Questions dont l'embedding est gardé en mémoire (voir `BatchedEmbeddings.embed_query`)
+QUERY_CACHE_SIZE = 256
+
+
+def text_hash(text):
+    """Hash stable d'un chunk de texte, utilisé comme clé de cache"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """Cache disque des embeddings, indexé par (modèle, hash du texte).
+
+    Les vecteurs sont stockés dans SQLite en float32. Quand la taille totale
+    dépasse `max_bytes`, les entrées les moins récemment utilisées sont évincées.
+    """
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL,"
+            " text_hash TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " PRIMARY KEY (model, text_hash))"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)"
+        )
+        self._conn.commit()
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM embeddings"
+        ).fetchone()[0]
+
+    def get_many(self, model, hashes):
+        """Retourne {hash: vecteur} pour les hashes présents dans le cache"""
+        found = {}
+        if not hashes:
+            return found
+        now = time.time()
+        with self._lock:
+            unique = list(dict.fromkeys(hashes))
+            # SQLite limite le nombre de paramètres par requête
+            for start in range(0, len(unique), 500):
+                part = unique[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings "
+                    f"WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *part]
+                ).fetchall()
+                for h, blob in rows:
+                    vector = array('f')
+                    vector.frombytes(blob)
+                    found[h] = vector.tolist()
+                if rows:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                        [(now, model, h) for h, _ in rows]
+                    )
+            self._conn.commit()
+        return found
+
+    def put_many(self, model, items):
+        """Ajoute au cache une liste de (hash, vecteur)"""
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for h, vector in items:
+            blob = array('f', vector).tobytes()
+            rows.append((model, h, blob, len(blob), now))
+        with self._lock:
+            for model_, h, _, size, _ in rows:
+                previous = self._conn.execute(
+                    "SELECT size FROM embeddings WHERE model = ? AND text_hash = ?",
+                    (model_, h)
+                ).fetchone()
+                if previous:
+                    self._total_bytes -= previous[0]
+                self._total_bytes += size
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, size, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        if self._total_bytes <= self.max_bytes:
+            return
+        # On descend à 90% de la limite pour ne pas évincer à chaque insertion
+        target = int(self.max_bytes * 0.9)
+        rows = self._conn.execute(
+            "SELECT rowid, size FROM embeddings ORDER BY last_used ASC"
+        )
+        evicted = []
+        for rowid, size in rows:
+            if self._total_bytes <= target:
+                break
+            evicted.append((rowid,))
+            self._total_bytes -= size
+        self._conn.executemany("DELETE FROM embeddings WHERE rowid = ?", evicted)
+        logger.debug(f"{len(evicted)} embeddings évincés du cache")
+
+    @property
+    def size_bytes(self):
+        return self._total_bytes
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class BatchedEmbeddings(Embeddings):
+    """Étape d'embedding par lots, concurrente et mise en cache.
+
+    Les textes déjà vus (y compris les doublons d'un même lot) ne sont jamais
+    renvoyés au modèle ; les autres sont envoyés par lots de `batch_size` sur un
+    pool d'au plus `max_workers` requêtes simultanées.
+    """
+
+    def __init__(self, embeddings, model_name, cache=None, batch_size=32, max_workers=4):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache = cache
+        self.batch_size = max(1, batch_size)
+        self.max_workers = max(1, max_workers)
+        self.last_report = None
+        self._queries = OrderedDict()
+        self._queries_lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        """Vectorise une liste de textes en s'appuyant sur le cache"""
+        start = time.perf_counter()
+        hashes = [text_hash(text) for text in texts]
+        vectors = self.cache.get_many(self.model_name, hashes) if self.cache else {}
+        cached = sum(1 for h in hashes if h in vectors)
+
+        # Textes uniques restant à calculer
+        pending = {}
+        for h, text in zip(hashes, texts):
+            if h not in vectors and h not in pending:
+                pending[h] = text
+        pending_hashes = list(pending)
+        batches = [
+            pending_hashes[i:i + self.batch_size]
+            for i in range(0, len(pending_hashes), self.batch_size)
+        ]
+
+        if batches:
+            def embed_batch(batch):
+                return self.embeddings.embed_documents([pending[h] for h in batch])
+
+            workers = min(self.max_workers, len(batches))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for batch, result in zip(batches, executor.map(embed_batch, batches)):
+                    computed = list(zip(batch, result))
+                    vectors.update(computed)
+                    if self.cache:
+                        self.cache.put_many(self.model_name, computed)
+
+        elapsed = time.perf_counter() - start
+        self.last_report = {
+            'chunks': len(texts),
+            'cached': cached,
+            'embedded': len(pending_hashes),
+            'batches': len(batches),
+            'batch_size': self.batch_size,
+            'max_workers': self.max_workers,
+            'seconds': elapsed,
+            'chunks_per_sec': len(texts) / elapsed if elapsed > 0 else 0.0
+        }
+        if texts:
+            logger.info(format_report(self.last_report))
+        return [vectors[h] for h in hashes]
+
+    def embed_query(self, text):
+        """Vectorise une question.
+
+        Les questions ne vont ni dans le cache disque, réservé aux chunks, ni
+        dans le rapport de débit : seules les QUERY_CACHE_SIZE dernières sont
+        gardées en mémoire, car une même question est vectorisée pour le cache
+        de réponses puis pour la recherche.
+        """
+        key = text_hash(text)
+        with self._queries_lock:
+            vector = self._queries.get(key)
+            if vector is not None:
+                self._queries.move_to_end(key)
+                return vector
+        vector = self.embeddings.embed_query(text)
+        with self._queries_lock:
+            self._queries[key] = vector
+            while len(self._queries) > QUERY_CACHE_SIZE:
+                self._queries.popitem(last=False)
+        return vector
+
+
+def format_report(report):
+    """Résumé lisible d'un rapport de débit d'embedding"""
+    return (
+        f"Embeddings: {report['chunks']} chunks en {report['seconds']:.2f}s "
+        f"({report['chunks_per_sec']:.1f} chunks/s) - {report['cached']} depuis le cache, "
+        f"{report['embedded']} calculés en {report['batches']} lots "
+        f"(taille {report['batch_size']}, {report['max_workers']} workers)"
+    )
@@ -0,0 +1,153 @@
+from config import Config
+from document_registry import list_manifests
+from jobs import JobManager
+from ollama_client import OllamaClient
+from rag_handler import RAGHandler, create_answer_cache, create_embeddings
+import hashlib
+import json
+import logging
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COLLECTION = Config.DEFAULT_COLLECTION
+# Noms acceptés à la fois par Chroma et comme nom de fichier
+COLLECTION_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{1,61}[A-Za-z0-9]$")
+
+
+def validate_collection_name(name):
+    if not COLLECTION_NAME.match(name or ""):
+        raise ValueError(
+            "Nom de collection invalide : 3 à 63 caractères (lettres, chiffres, - et _), "
+            "commençant et finissant par une lettre ou un chiffre"
+        )
+    return name
+
+
+class RAGEngine:
+    """Ressources partagées par toutes les sessions Streamlit du processus.
+
+    Un seul client Chroma (backend "chroma"), un seul client Ollama (modèles
+    préchargés en arrière-plan), une seule étape d'embedding, un seul cache
+    de réponses, un seul service Drive (avec son pool de connexions), un
+    `RAGHandler` par collection et une file d'ingestions persistante. Les
+    sessions ne conservent que leur historique de chat et leurs réglages.
+
+    La construction ne charge rien de lourd : Drive, Chroma et le pipeline
+    d'ingestion (et leurs modules) ne sont créés qu'au premier usage, pour
+    que la page s'affiche sans attendre.
+    """
+
+    def __init__(self, model_name=None):
+        self.ollama = OllamaClient(chat_model=model_name)
+        self.model_name = self.ollama.chat_model
+        if Config.OLLAMA_WARMUP:
+            # Le premier utilisateur ne doit pas attendre le chargement des modèles
+            threading.Thread(target=self.ollama.warmup, name="ollama-warmup", daemon=True).start()
+        self.embeddings = create_embeddings(self.ollama)
+        self.answer_cache = create_answer_cache()
+        self.jobs = JobManager(
+            Config.JOBS_PATH,
+            workers=Config.INGEST_JOB_WORKERS,
+            max_pending=Config.INGEST_MAX_PENDING_JOBS,
+            max_attempts=Config.INGEST_JOB_ATTEMPTS,
+            retry_delay=Config.INGEST_JOB_RETRY_DELAY
+        )
+        # Les ingestions restées en attente au dernier arrêt reprennent ici
+        self.jobs.register("ingest", self._ingest)
+        self._drive_handler = None
+        self._rag_handlers = {}
+        self._lock = threading.Lock()
+
+    @property
+    def drive_handler(self):
+        """Service Drive, créé (authentification comprise) au premier usage"""
+        with self._lock:
+            if self._drive_handler is None:
+                from drive_handler import GoogleDriveHandler
+                self._drive_handler = GoogleDriveHandler()
+            return self._drive_handler
+
+    def collections(self):
+        """Bases de connaissances enregistrées (lues depuis leurs manifestes)"""
+        # Le handler par défaut reprend l'ancien registre global s'il existe encore
+        self.rag_handler(DEFAULT_COLLECTION)
+        saved = {manifest['name']: manifest for manifest in list_manifests(Config.COLLECTIONS_DIR)}
+        with self._lock:
+            opened = list(self._rag_handlers)
+        for name in [DEFAULT_COLLECTION, *opened]:
+            saved.setdefault(name, {'name': name, 'documents': 0, 'chunks': 0})
+        for name, manifest in saved.items():
+            manifest['loaded'] = name in opened and self._rag_handlers[name].loaded
+        return list(saved.values())
+
+    def rag_handler(self, collection_name=DEFAULT_COLLECTION):
+        """Retourne le handler d'une collection ; ses index sont ouverts au premier usage"""
+        with self._lock:
+            handler = self._rag_handlers.get(collection_name)
+            if handler is None:
+                validate_collection_name(collection_name)
+                handler = RAGHandler(
+                    model_name=self.model_name,
+                    collection_name=collection_name,
+                    embeddings=self.embeddings,
+                    answer_cache=self.answer_cache,
+                    ollama_client=self.ollama
+                )
+                self._rag_handlers[collection_name] = handler
+            return handler
+
+    def ingest_in_background(self, pdfs, collection_name=DEFAULT_COLLECTION):
+        """Planifie l'ingestion de PDFs Drive dans une collection ; retourne l'état du travail.
+
+        Une ingestion des mêmes versions des mêmes PDFs déjà en attente ou en
+        cours est réutilisée ; les ingestions d'une même collection passent
+        l'une après l'autre.
+        """
+        validate_collection_name(collection_name)
+        versions = sorted((pdf['id'], pdf.get('md5Checksum')) for pdf in pdfs)
+        key = hashlib.sha256(json.dumps([collection_name, versions]).encode('utf-8')).hexdigest()
+        return self.jobs.submit(
+            "ingest",
+            {"collection": collection_name, "pdfs": pdfs},
+            key=key,
+            lane=collection_name,
+            total=len(pdfs)
+        )
+
+    def _ingest(self, job, progress):
+        from ingest_pipeline import IngestPipeline
+
+        collection_name = job["payload"]["collection"]
+        pipeline = IngestPipeline(self.drive_handler, self.rag_handler(collection_name))
+        # Documents indexés par une tentative précédente : ils sont désormais "à jour"
+        indexed_before = {item for item, state in job["items"].items() if state["stage"] == "done"}
+        failed = []
+
+        def on_progress(pdf, stage, detail):
+            if stage == "cached" and pdf['id'] in indexed_before:
+                return
+            if stage == "error":
+                failed.append(pdf['name'])
+            progress(pdf['id'], name=pdf['name'], stage=stage, detail=detail)
+
+        indexed = pipeline.run(job["payload"]["pdfs"], on_progress=on_progress)
+        if failed:
+            # Nouvel essai : seuls les PDFs en échec seront retraités
+            raise RuntimeError(f"{len(failed)} PDF(s) en échec : {', '.join(failed)}")
+        return {"indexed": indexed + len(indexed_before), "collection": collection_name}
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """Retourne le moteur partagé du processus, en le créant au premier appel"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            logger.info("Initialisation du moteur RAG partagé")
+            _engine = RAGEngine()
+        return _engine
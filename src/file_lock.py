@@ -0,0 +1,107 @@
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+LOCKED_OFFSET = 1 << 20
+
+
+class FileLock:
+    """Verrou exclusif partagé entre processus, posé sur un fichier.
+
+    Sert à sérialiser les écritures sur une collection quand plusieurs
+    processus (interface Streamlit, API) ouvrent le même stockage. Le verrou
+    est réentrant : le thread qui le détient peut le reprendre ; les autres
+    threads du processus attendent sur un verrou ordinaire, les autres
+    processus sur le verrou du fichier (`fcntl.flock`, ou `msvcrt.locking`
+    sous Windows). Il est libéré par le système si le processus s'arrête.
+
+    Le fichier porte aussi un compteur d'écritures : le détenteur du verrou
+    l'incrémente après avoir écrit (`bump`), les autres processus comparent
+    `generation` à la dernière valeur vue pour savoir s'ils doivent relire.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        if self._depth == 0:
+            try:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                self._file = open(self.path, 'a+b')
+                _lock_file(self._file)
+            except BaseException:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                self._lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        self._depth -= 1
+        if self._depth == 0:
+            try:
+                _unlock_file(self._file)
+            finally:
+                self._file.close()
+                self._file = None
+        self._lock.release()
+
+    def generation(self):
+        """Compteur d'écritures (0 si le fichier n'existe pas encore)"""
+        try:
+            with open(self.path, 'rb') as f:
+                return _read_counter(f)
+        except FileNotFoundError:
+            return 0
+
+    def bump(self):
+        """Incrémente le compteur d'écritures et retourne sa valeur ; le verrou doit être pris"""
+        with self._lock:
+            if self._file is None:
+                raise RuntimeError("Verrou non détenu")
+            value = _read_counter(self._file) + 1
+            self._file.truncate(0)
+            self._file.write(str(value).encode('ascii'))
+            self._file.flush()
+            return value
+
+
+def _read_counter(f):
+    f.seek(0)
+    data = f.read(32).strip()
+    return int(data) if data.isdigit() else 0
+
+
+def _lock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return
+    # Octet verrouillé au-delà du compteur, qui reste lisible par les autres processus
+    f.seek(LOCKED_OFFSET)
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            # LK_LOCK abandonne après 10 s : on attend tant que le verrou est pris
+            time.sleep(0.1)
+
+
+def _unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        return
+    f.seek(LOCKED_OFFSET)
+    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
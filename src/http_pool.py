@@ -0,0 +1,29 @@
+from contextlib import contextmanager
+import queue
+import threading
+
+
+class HttpPool:
+    """Pool borné de clients HTTP réutilisables.
+
+    httplib2 n'est pas thread-safe : chaque requête emprunte un client dédié,
+    rendu au pool ensuite pour réutiliser sa connexion keep-alive. Au plus
+    `size` clients sont utilisés simultanément ; les autres appelants attendent.
+    """
+
+    def __init__(self, factory, size=8):
+        self._factory = factory
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    @contextmanager
+    def connection(self):
+        with self._slots:
+            try:
+                http = self._idle.get_nowait()
+            except queue.Empty:
+                http = self._factory()
+            try:
+                yield http
+            finally:
+                self._idle.put(http)
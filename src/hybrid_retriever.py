@@ -0,0 +1,63 @@
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from keyword_index import reciprocal_rank_fusion
+from typing import Any, List, Optional, Set
+
+
+def document_key(document):
+    """Clé d'un chunk : son identifiant s'il est connu, sinon son contenu"""
+    return (
+        document.metadata.get("chunk_id")
+        or getattr(document, "id", None)
+        or document.page_content
+    )
+
+
+class HybridRetriever(BaseRetriever):
+    """Recherche hybride : vecteurs + mots-clés (BM25), fusionnés par RRF.
+
+    Chaque moteur renvoie ses `fetch_k` meilleurs chunks ; les deux classements
+    sont fusionnés avec les poids `vector_weight` / `keyword_weight` et les `k`
+    premiers sont retournés. `file_ids` restreint la recherche aux chunks de
+    ces documents (filtre de métadonnées côté base vectorielle, `chunk_ids`
+    côté BM25).
+    """
+
+    vector_store: Any
+    keyword_index: Any
+    k: int = 4
+    fetch_k: int = 20
+    vector_weight: float = 1.0
+    keyword_weight: float = 1.0
+    rrf_k: int = 60
+    file_ids: Optional[List[str]] = None
+    chunk_ids: Optional[Set[str]] = None
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        documents = {}
+
+        dense_ranking = []
+        if self.vector_weight > 0:
+            dense = self.vector_store.similarity_search(query, k=self.fetch_k, file_ids=self.file_ids)
+            for document in dense:
+                key = document_key(document)
+                documents.setdefault(key, document)
+                dense_ranking.append(key)
+
+        keyword_ranking = []
+        if self.keyword_weight > 0:
+            for chunk_id, _, text, metadata in self.keyword_index.search_chunks(
+                query, k=self.fetch_k, allowed_ids=self.chunk_ids
+            ):
+                documents.setdefault(chunk_id, Document(page_content=text, metadata=metadata))
+                keyword_ranking.append(chunk_id)
+
+        fused = reciprocal_rank_fusion(
+            [dense_ranking, keyword_ranking],
+            [self.vector_weight, self.keyword_weight],
+            k=self.rrf_k
+        )
+        return [documents[key] for key in fused[:self.k]]
@@ -0,0 +1,198 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from config import Config
+from document_registry import compute_file_hash
+from instrumentation import metrics, profiled
+from page_extraction import PageExtractor, create_parse_pool, stop_parse_pool
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class IngestPipeline:
+    """Ingestion en pipeline des PDFs sélectionnés.
+
+    Les téléchargements Drive tournent sur un pool de threads, l'extraction des
+    pages (liée au CPU) sur un pool de processus, par lots de pages, avec un
+    cache par page. Si aucune tâche d'extraction ne se termine pendant
+    `parse_timeout` secondes, les documents en cours d'extraction échouent. Chaque document est indexé dès que toutes ses pages sont
+    extraites, sans attendre les autres ; ses pages sont alors relues du cache
+    au fil de l'indexation plutôt que gardées en mémoire.
+
+    `on_progress(pdf, stage, detail)` est appelé pour chaque document avec les
+    étapes "download", "parse", "index", "done", "cached" et "error".
+    """
+
+    def __init__(self, drive_handler, rag_handler, download_workers=None, parse_workers=None,
+                 parse_timeout=None):
+        self.drive_handler = drive_handler
+        self.rag_handler = rag_handler
+        self.download_workers = download_workers or Config.INGEST_DOWNLOAD_WORKERS
+        self.parse_workers = parse_workers or Config.INGEST_PARSE_WORKERS or os.cpu_count()
+        self.parse_timeout = parse_timeout or Config.INGEST_PARSE_TIMEOUT
+
+    def run(self, pdfs, on_progress=None):
+        """Ingère une liste de PDFs Drive ; retourne le nombre de documents indexés.
+
+        Le manifeste et l'index BM25 sont sauvegardés une fois, à la fin du lot.
+        """
+        with profiled("ingest"), self.rag_handler.batch():
+            return self._run(pdfs, on_progress)
+
+    def _run(self, pdfs, on_progress):
+        trace = metrics.start_trace("ingest")
+
+        def notify(pdf, stage, detail=None):
+            if on_progress:
+                on_progress(pdf, stage, detail)
+
+        pending_pdfs = []
+        for pdf in pdfs:
+            if self.rag_handler.is_indexed(pdf['id'], pdf.get('md5Checksum')):
+                notify(pdf, "cached")
+            else:
+                pending_pdfs.append(pdf)
+
+        indexed = 0
+        if pending_pdfs:
+            download_pool = ThreadPoolExecutor(
+                max_workers=min(self.download_workers, len(pending_pdfs))
+            )
+            parse_pool = create_parse_pool(self.parse_workers)
+            extractor = PageExtractor(pool=parse_pool)
+            # Dernière tâche d'extraction terminée (ou planifiée alors qu'aucune n'était en cours)
+            parse_progress = time.monotonic()
+            stalled = False
+            try:
+                stages = {}
+                # Documents en cours d'extraction : tâches restantes et nombre de pages
+                extracting = {}
+                ready = []
+                # Pages protégées de l'éviction du cache jusqu'à la fin de l'indexation
+                pinned = []
+
+                def release(content_hash):
+                    pinned.remove(content_hash)
+                    extractor.cache.unpin(content_hash)
+
+                for pdf in pending_pdfs:
+                    notify(pdf, "download")
+                    future = download_pool.submit(self._download, pdf, extractor, trace)
+                    stages[future] = ("download", pdf, None)
+
+                while stages or ready:
+                    done = set()
+                    if stages:
+                        parsing = [future for future, (stage, _, _) in stages.items() if stage == "parse"]
+                        timeout = None
+                        if parsing:
+                            timeout = max(0.0, parse_progress + self.parse_timeout - time.monotonic())
+                        done, _ = wait(stages, timeout=timeout, return_when=FIRST_COMPLETED)
+                        if not done:
+                            # Pool bloqué : les extractions en cours échouent
+                            stalled = True
+                            done = set(parsing)
+                    for future in done:
+                        stage, pdf, content_hash = stages.pop(future)
+                        state = extracting.get(pdf['id'])
+                        try:
+                            if not future.done():
+                                raise TimeoutError(
+                                    f"Aucune page extraite depuis {self.parse_timeout:.0f}s"
+                                )
+                            result = future.result()
+                        except Exception as e:
+                            logger.error(f"Erreur d'ingestion ({stage}) pour {pdf['name']}: {e}")
+                            if state is None or not state["failed"]:
+                                notify(pdf, "error", str(e))
+                            if state is not None:
+                                state["failed"] = True
+                                state["remaining"] -= 1
+                                if state["remaining"] == 0:
+                                    del extracting[pdf['id']]
+                                    release(content_hash)
+                            continue
+
+                        if stage == "download":
+                            pdf_path, content_hash = result
+                            if self.rag_handler.is_indexed(pdf['id'], content_hash):
+                                notify(pdf, "cached")
+                                continue
+                            notify(pdf, "parse")
+                            if not any(stage == "parse" for stage, _, _ in stages.values()):
+                                parse_progress = time.monotonic()
+                            extractor.cache.pin(content_hash)
+                            pinned.append(content_hash)
+                            page_count, futures = extractor.submit(pdf_path, content_hash)
+                            state = extracting[pdf['id']] = {
+                                "pdf": pdf,
+                                "content_hash": content_hash,
+                                "page_count": page_count,
+                                "remaining": len(futures),
+                                "failed": False
+                            }
+                            for parse_future in futures:
+                                stages[parse_future] = ("parse", pdf, content_hash)
+                        else:
+                            parse_progress = time.monotonic()
+                            extractor.store(content_hash, result, trace)
+                            state["remaining"] -= 1
+                        if state["remaining"] == 0:
+                            del extracting[pdf['id']]
+                            if state["failed"]:
+                                release(content_hash)
+                            else:
+                                ready.append(state)
+
+                    # L'indexation reste dans ce thread : les écritures
+                    # Chroma et le registre sont sérialisés.
+                    while ready:
+                        state = ready.pop(0)
+                        if self._index(extractor, state, notify, trace):
+                            indexed += 1
+                        release(state["content_hash"])
+            finally:
+                for content_hash in list(pinned):
+                    release(content_hash)
+                download_pool.shutdown(wait=False, cancel_futures=True)
+                if stalled:
+                    stop_parse_pool(parse_pool, wait=False)
+                else:
+                    parse_pool.shutdown(wait=False, cancel_futures=True)
+
+        self.rag_handler.build_retriever()
+        trace.finish()
+        return indexed
+
+    def _index(self, extractor, state, notify, trace):
+        pdf = state["pdf"]
+        notify(pdf, "index", state["page_count"])
+        try:
+            chunks = self.rag_handler.index_document(
+                pdf['id'],
+                state["content_hash"],
+                extractor.documents(state["content_hash"], page_count=state["page_count"]),
+                name=pdf['name'],
+                trace=trace,
+                modified=pdf.get('modifiedTime')
+            )
+        except Exception as e:
+            logger.error(f"Erreur d'indexation pour {pdf['name']}: {e}")
+            notify(pdf, "error", str(e))
+            return False
+        trace.count("documents", 1)
+        trace.count("chunks", chunks)
+        notify(pdf, "done", chunks)
+        return True
+
+    def _download(self, pdf, extractor, trace):
+        start = time.perf_counter()
+        pdf_path = self.drive_handler.fetch_pdf(pdf)
+        trace.add("download", time.perf_counter() - start)
+        if pdf_path is None:
+            raise IOError(f"Téléchargement impossible de {pdf['name']}")
+        content_hash = compute_file_hash(pdf_path)
+        # Le nombre de pages est lu ici pour ne pas bloquer le thread d'indexation
+        extractor.page_count(pdf_path, content_hash)
+        return pdf_path, content_hash
@@ -0,0 +1,236 @@
+from collections import deque
+from contextlib import contextmanager
+from config import Config
+import bisect
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Étapes instrumentées, de l'ingestion à la génération
+STAGES = ("upload", "download", "load", "split", "embed", "upsert", "attach", "retrieve", "condense", "generate")
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 384, 512, 1024, 2048)
+
+METRIC_HELP = {
+    "rag_stage_duration_seconds": "Durée des étapes du pipeline RAG",
+    "rag_generation_tokens_per_second": "Débit de génération du LLM (tokens estimés)",
+    "rag_chunks_total": "Nombre de chunks traités par étape",
+    "rag_chunk_tokens": "Taille des chunks indexés (tokens estimés)",
+    "rag_pages_total": "Nombre de pages PDF extraites (hors cache)",
+    "rag_tokens_total": "Nombre de tokens estimés envoyés et reçus du LLM",
+    "rag_download_bytes_total": "Octets téléchargés depuis Drive",
+    "rag_upload_bytes_total": "Octets envoyés vers Drive",
+    "rag_ollama_requests_total": "Requêtes Ollama, par démarrage du modèle (cold = chargé pour la requête)",
+    "rag_ollama_load_seconds": "Temps de chargement du modèle rapporté par Ollama",
+    "rag_ollama_request_seconds": "Durée des requêtes Ollama, modèle froid ou chaud",
+    "rag_ollama_first_token_seconds": "Délai avant le premier token généré, modèle froid ou chaud",
+}
+
+
+class Histogram:
+    """Histogramme cumulatif au format Prometheus"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            yield bound, total
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "buckets": {_format_bound(bound): total for bound, total in self.cumulative()}
+        }
+
+
+class Trace:
+    """Détail d'une requête (ou d'une ingestion) : durée et compteurs par étape.
+
+    Les étapes exécutées en parallèle (téléchargements d'une ingestion) sont
+    cumulées : leur durée peut dépasser le total.
+    """
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self.timings = {}
+        self.counts = {}
+
+    @contextmanager
+    def span(self, stage):
+        with self.metrics.span(stage, trace=self):
+            yield
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+    def count(self, key, value):
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + value
+
+    def finish(self):
+        self.timings["total"] = time.perf_counter() - self._start
+        self.metrics.record_trace(self)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "started_at": self.started_at,
+            "timings": dict(self.timings),
+            "counts": dict(self.counts)
+        }
+
+
+class Metrics:
+    """Registre des métriques du processus (histogrammes, compteurs, traces récentes)"""
+
+    def __init__(self, max_traces=50):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._traces = deque(maxlen=max_traces)
+
+    def observe(self, name, value, buckets=DURATION_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def increment(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    @contextmanager
+    def span(self, stage, trace=None):
+        """Mesure la durée d'un bloc et l'enregistre pour l'étape donnée"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.observe("rag_stage_duration_seconds", seconds, stage=stage)
+            if trace is not None:
+                trace.add(stage, seconds)
+
+    def start_trace(self, name):
+        return Trace(self, name)
+
+    def record_trace(self, trace):
+        with self._lock:
+            self._traces.append(trace.to_dict())
+
+    def recent_traces(self, limit=None):
+        """Dernières traces terminées, de la plus récente à la plus ancienne"""
+        with self._lock:
+            traces = list(self._traces)
+        traces.reverse()
+        return traces[:limit] if limit else traces
+
+    def to_json(self):
+        with self._lock:
+            data = {
+                "histograms": [
+                    {"name": name, "labels": dict(labels), **histogram.to_dict()}
+                    for (name, labels), histogram in self._histograms.items()
+                ],
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in self._counters.items()
+                ],
+                "traces": list(self._traces)
+            }
+        return json.dumps(data, indent=2)
+
+    def prometheus_text(self):
+        """Export au format texte d'exposition Prometheus"""
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+
+        declared = set()
+        for (name, labels), histogram in histograms:
+            if name not in declared:
+                lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+                declared.add(name)
+            for bound, total in histogram.cumulative():
+                bucket_labels = _format_labels(labels + (("le", _format_bound(bound)),))
+                lines.append(f"{name}_bucket{bucket_labels} {total}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+
+        for (name, labels), value in counters:
+            if name not in declared:
+                lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+                declared.add(name)
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_bound(bound):
+    return "+Inf" if bound == float('inf') else repr(float(bound))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (f'{key}="{str(value).replace(chr(34), chr(92) + chr(34))}"' for key, value in labels)
+    return "{" + ",".join(escaped) + "}"
+
+
+metrics = Metrics()
+
+
+@contextmanager
+def profiled(name):
+    """Profile le bloc avec cProfile si RAG_PROFILE est activé.
+
+    Le profil est écrit dans PROFILE_DIR (lisible avec `python -m pstats` ou
+    snakeviz) et les fonctions les plus coûteuses sont journalisées.
+    """
+    if not Config.PROFILE:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        os.makedirs(Config.PROFILE_DIR, exist_ok=True)
+        path = os.path.join(Config.PROFILE_DIR, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.prof")
+        profiler.dump_stats(path)
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(20)
+        logger.info(f"Profil {name} écrit dans {path}\n{summary.getvalue()}")
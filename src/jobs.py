@@ -0,0 +1,306 @@
+from admission import Overloaded
+from contextlib import contextmanager
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+ACTIVE = ("queued", "running")
+FINISHED = ("done", "error")
+# Colonnes exposées par `get` et `list` (le payload reste interne)
+PUBLIC_COLUMNS = (
+    "id", "kind", "lane", "status", "attempts", "total", "items", "result", "error",
+    "created_at", "started_at", "finished_at", "next_run_at"
+)
+
+
+class JobManager:
+    """File persistante de travaux d'arrière-plan (ingestion), dans SQLite.
+
+    Un travail est un type (`kind`) et un payload JSON, exécuté par le
+    handler enregistré pour ce type (`register`) sur l'un des `workers`
+    threads. La file survit au processus : un travail en attente, ou
+    interrompu par un arrêt, reprend au démarrage suivant, et son état reste
+    consultable après une reconnexion du navigateur.
+
+    - `key` : un travail identique déjà en attente ou en cours est réutilisé
+      au lieu d'être planifié une seconde fois ;
+    - `lane` : un seul travail à la fois par file (ex. une collection), les
+      autres attendent leur tour ;
+    - un travail en échec est retenté jusqu'à `max_attempts` fois, après
+      `retry_delay` secondes puis un délai doublé à chaque essai ;
+    - un travail "running" dont le processus ne donne plus signe de vie
+      depuis `stale_after` secondes est remis en attente.
+
+    Au plus `max_pending` travaux peuvent être en attente ou en cours, au-delà
+    `submit` lève `Overloaded`. Les `history` derniers travaux terminés
+    restent consultables.
+    """
+
+    def __init__(self, path=None, workers=1, max_pending=16, max_attempts=3, retry_delay=10.0,
+                 history=100, stale_after=60.0):
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.history = history
+        self.stale_after = stale_after
+        self.owner = uuid.uuid4().hex
+        self._handlers = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._stopping = threading.Event()
+
+        if path:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # Transactions explicites : la réservation d'un travail doit être atomique entre processus
+        self._conn = sqlite3.connect(path or ":memory:", check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " kind TEXT NOT NULL,"
+            " key TEXT,"
+            " lane TEXT,"
+            " payload TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " total INTEGER,"
+            " items TEXT NOT NULL DEFAULT '{}',"
+            " result TEXT,"
+            " error TEXT,"
+            " owner TEXT,"
+            " created_at REAL NOT NULL,"
+            " started_at REAL,"
+            " finished_at REAL,"
+            " next_run_at REAL NOT NULL,"
+            " heartbeat_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, next_run_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key)")
+
+        self._threads = [
+            threading.Thread(target=self._work, name=f"job-{i}", daemon=True) for i in range(workers)
+        ]
+        self._threads.append(threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def register(self, kind, handler):
+        """Associe `handler(job, progress)` aux travaux de type `kind`.
+
+        `job` contient le `payload`, le nombre de tentatives (`attempts`) et
+        l'avancement des tentatives précédentes (`items`) ; `progress(item,
+        **state)` met à jour l'avancement d'un élément (ex. `progress(file_id,
+        name=..., stage="index")`). La valeur retournée (JSON) devient le
+        `result` du travail, une exception déclenche un nouvel essai.
+        """
+        self._handlers[kind] = handler
+        self._wake()
+
+    def submit(self, kind, payload, key=None, lane=None, total=None):
+        """Planifie un travail ; retourne son état (celui du travail identique s'il existe)"""
+        now = time.time()
+        with self._transaction() as conn:
+            existing = None
+            if key is not None:
+                existing = conn.execute(
+                    f"SELECT id FROM jobs WHERE key = ? AND status IN {ACTIVE}", (key,)
+                ).fetchone()
+            if existing:
+                job_id = existing[0]
+                logger.info(f"Travail {kind} identique déjà planifié ({job_id})")
+            else:
+                pending = conn.execute(f"SELECT COUNT(*) FROM jobs WHERE status IN {ACTIVE}").fetchone()[0]
+                if pending >= self.max_pending:
+                    raise Overloaded("Trop de travaux en attente", retry_after=5)
+                job_id = uuid.uuid4().hex
+                conn.execute(
+                    "INSERT INTO jobs (id, kind, key, lane, payload, status, total, created_at, next_run_at) "
+                    "VALUES (?, ?, ?, ?, ?, 'queued', ?, ?, ?)",
+                    (job_id, kind, key, lane, json.dumps(payload), total, now, now)
+                )
+                self._trim(conn)
+        self._wake()
+        return self.get(job_id)
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(PUBLIC_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return None if row is None else _to_job(row)
+
+    def list(self, lane=None, limit=None):
+        """Travaux du plus récent au plus ancien, éventuellement d'une seule file"""
+        query = f"SELECT {', '.join(PUBLIC_COLUMNS)} FROM jobs"
+        params = []
+        if lane is not None:
+            query += " WHERE lane = ?"
+            params.append(lane)
+        query += " ORDER BY created_at DESC"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [_to_job(row) for row in rows]
+
+    def shutdown(self):
+        """Arrête les workers ; les travaux en cours seront repris au prochain démarrage"""
+        self._stopping.set()
+        self._wake()
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _wake(self):
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+    def _work(self):
+        while not self._stopping.is_set():
+            job, delay = self._claim()
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(timeout=delay)
+                continue
+            self._run(job)
+
+    def _claim(self):
+        """Réserve le plus ancien travail prêt ; retourne (travail, None) ou (None, attente max)"""
+        now = time.time()
+        kinds = list(self._handlers)
+        if not kinds:
+            return None, self.stale_after
+        with self._transaction() as conn:
+            self._recover(conn, now)
+            row = conn.execute(
+                f"SELECT id, kind, payload, attempts, items FROM jobs"
+                f" WHERE status = 'queued' AND next_run_at <= ?"
+                f" AND kind IN ({', '.join('?' * len(kinds))})"
+                f" AND (lane IS NULL OR lane NOT IN"
+                f" (SELECT lane FROM jobs WHERE status = 'running' AND lane IS NOT NULL))"
+                f" ORDER BY next_run_at, created_at LIMIT 1",
+                (now, *kinds)
+            ).fetchone()
+            if row is None:
+                # Prochain nouvel essai planifié ; un `submit` réveille les workers plus tôt
+                next_run = conn.execute(
+                    "SELECT MIN(next_run_at) FROM jobs WHERE status = 'queued'"
+                ).fetchone()[0]
+                delay = self.stale_after if next_run is None else max(0.05, next_run - now)
+                return None, min(delay, self.stale_after)
+            job_id, kind, payload, attempts, items = row
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, owner = ?,"
+                " started_at = ?, heartbeat_at = ? WHERE id = ?",
+                (self.owner, now, now, job_id)
+            )
+        return {
+            "id": job_id,
+            "kind": kind,
+            "payload": json.loads(payload),
+            "attempts": attempts + 1,
+            "items": json.loads(items)
+        }, None
+
+    def _recover(self, conn, now):
+        """Remet en attente les travaux dont le processus s'est arrêté en cours de route"""
+        stale = conn.execute(
+            "SELECT id, attempts FROM jobs WHERE status = 'running' AND heartbeat_at < ?",
+            (now - self.stale_after,)
+        ).fetchall()
+        for job_id, attempts in stale:
+            if attempts >= self.max_attempts:
+                conn.execute(
+                    "UPDATE jobs SET status = 'error', owner = NULL, finished_at = ?,"
+                    " error = 'Travail interrompu' WHERE id = ?",
+                    (now, job_id)
+                )
+            else:
+                logger.warning(f"Travail {job_id} interrompu, remis en attente")
+                conn.execute(
+                    "UPDATE jobs SET status = 'queued', owner = NULL, next_run_at = ? WHERE id = ?",
+                    (now, job_id)
+                )
+
+    def _run(self, job):
+        items = job["items"]
+
+        def progress(item, **state):
+            with self._lock:
+                items[item] = state
+                self._conn.execute(
+                    "UPDATE jobs SET items = ?, heartbeat_at = ? WHERE id = ?",
+                    (json.dumps(items), time.time(), job["id"])
+                )
+
+        try:
+            result = self._handlers[job["kind"]](job, progress)
+        except Exception as e:
+            finished = job["attempts"] >= self.max_attempts
+            with self._lock:
+                if finished:
+                    logger.error(f"Échec du travail {job['id']} ({job['kind']}): {e}")
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'error', error = ?, owner = NULL, finished_at = ?"
+                        " WHERE id = ?",
+                        (str(e), time.time(), job["id"])
+                    )
+                else:
+                    delay = self.retry_delay * 2 ** (job["attempts"] - 1)
+                    logger.warning(
+                        f"Échec du travail {job['id']} ({job['kind']}), "
+                        f"nouvel essai dans {delay:.0f}s: {e}"
+                    )
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'queued', error = ?, owner = NULL, next_run_at = ?"
+                        " WHERE id = ?",
+                        (str(e), time.time() + delay, job["id"])
+                    )
+            self._wake()
+            return
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'done', result = ?, error = NULL, owner = NULL, finished_at = ?"
+                " WHERE id = ?",
+                (json.dumps(result), time.time(), job["id"])
+            )
+        # Un travail de la même file attendait peut-être la fin de celui-ci
+        self._wake()
+
+    def _heartbeat(self):
+        while not self._stopping.wait(self.stale_after / 3):
+            with self._lock:
+                self._conn.execute(
+                    "UPDATE jobs SET heartbeat_at = ? WHERE owner = ? AND status = 'running'",
+                    (time.time(), self.owner)
+                )
+
+    def _trim(self, conn):
+        conn.execute(
+            f"DELETE FROM jobs WHERE status IN {FINISHED} AND id NOT IN"
+            f" (SELECT id FROM jobs WHERE status IN {FINISHED} ORDER BY finished_at DESC LIMIT ?)",
+            (self.history,)
+        )
+
+
+def _to_job(row):
+    job = dict(zip(PUBLIC_COLUMNS, row))
+    job["items"] = json.loads(job["items"])
+    job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+    return job
@@ -0,0 +1,240 @@
+from collections import defaultdict
+import logging
+import math
+import numpy as np
+import os
+import pickle
+import re
+import threading
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+# Les identifiants (références, codes, numéros) sont gardés entiers en plus de
+# leurs morceaux : "CVEC-2024-AB12" donne "cvec-2024-ab12", "cvec", "2024", "ab12".
+TOKEN_PATTERN = re.compile(r"\w+(?:[-./]\w+)*")
+
+
+def tokenize(text):
+    """Découpe un texte en termes normalisés (minuscules, sans accents)"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text):
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(part for part in re.split(r"[-./_]", token) if part)
+    return tokens
+
+
+class KeywordIndex:
+    """Index inversé BM25 des chunks d'une collection.
+
+    Il est alimenté en même temps que la base vectorielle et garde, avec les
+    postings, le texte et les métadonnées de chaque chunk pour pouvoir les
+    retourner sans repasser par Chroma. `version` mémorise la version du
+    registre à laquelle l'index correspond, pour détecter une désynchronisation.
+
+    Les postings sont tenus dans des dictionnaires (mises à jour incrémentales)
+    et compilés à la demande en tableaux NumPy : le score d'une requête est
+    alors calculé en une passe vectorisée plutôt que posting par posting.
+    """
+
+    def __init__(self, path=None, k1=1.5, b=0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.version = None
+        self._lock = threading.RLock()
+        self.clear()
+        if path and os.path.exists(path):
+            self._load()
+
+    def __len__(self):
+        return len(self._numbers)
+
+    def clear(self):
+        with self._lock:
+            # Chaque chunk reçoit un numéro interne ; les numéros libérés par
+            # une suppression ne sont pas réutilisés avant la prochaine compaction.
+            self._numbers = {}
+            self._chunk_ids = []
+            self._chunks = []
+            self._lengths = []
+            self._postings = defaultdict(dict)
+            self._total_length = 0
+            self._compiled = {}
+            self._lengths_array = None
+
+    def add(self, ids, texts, metadatas):
+        """Indexe (ou réindexe) des chunks"""
+        with self._lock:
+            self._remove(ids)
+            for chunk_id, text, metadata in zip(ids, texts, metadatas):
+                frequencies = defaultdict(int)
+                tokens = tokenize(text)
+                for token in tokens:
+                    frequencies[token] += 1
+                number = len(self._chunk_ids)
+                self._numbers[chunk_id] = number
+                self._chunk_ids.append(chunk_id)
+                self._chunks.append((text, metadata, tuple(frequencies)))
+                self._lengths.append(len(tokens))
+                self._total_length += len(tokens)
+                for token, count in frequencies.items():
+                    self._postings[token][number] = count
+                    self._compiled.pop(token, None)
+            self._lengths_array = None
+
+    def remove(self, ids):
+        """Retire des chunks de l'index"""
+        with self._lock:
+            self._remove(ids)
+            if len(self._chunk_ids) > 2 * len(self._numbers) + 1024:
+                self._compact()
+
+    def _remove(self, ids):
+        for chunk_id in ids:
+            number = self._numbers.pop(chunk_id, None)
+            if number is None:
+                continue
+            _, _, terms = self._chunks[number]
+            self._chunks[number] = None
+            self._total_length -= self._lengths[number]
+            for token in terms:
+                postings = self._postings.get(token)
+                if postings is not None:
+                    postings.pop(number, None)
+                    self._compiled.pop(token, None)
+                    if not postings:
+                        del self._postings[token]
+
+    def _compact(self):
+        """Renumérote les chunks vivants pour récupérer la place des suppressions"""
+        live = [
+            (chunk_id, self._chunks[number][0], self._chunks[number][1])
+            for chunk_id, number in self._numbers.items()
+        ]
+        version = self.version
+        self.clear()
+        self.add([c[0] for c in live], [c[1] for c in live], [c[2] for c in live])
+        self.version = version
+
+    def _compiled_postings(self, term):
+        compiled = self._compiled.get(term)
+        if compiled is None:
+            postings = self._postings[term]
+            compiled = (
+                np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)),
+                np.fromiter(postings.values(), dtype=np.float32, count=len(postings))
+            )
+            self._compiled[term] = compiled
+        return compiled
+
+    def search(self, query, k=10, allowed_ids=None):
+        """Retourne les `k` meilleurs (chunk_id, score) BM25 pour la requête.
+
+        `allowed_ids` restreint la recherche à un sous-ensemble de chunks.
+        """
+        with self._lock:
+            count = len(self._numbers)
+            terms = [t for t in dict.fromkeys(tokenize(query)) if t in self._postings]
+            if not count or not terms:
+                return []
+            if self._lengths_array is None:
+                self._lengths_array = np.asarray(self._lengths, dtype=np.float32)
+            avg_length = self._total_length / count
+
+            mask = None
+            if allowed_ids is not None:
+                mask = np.zeros(len(self._chunk_ids), dtype=bool)
+                mask[[self._numbers[i] for i in allowed_ids if i in self._numbers]] = True
+
+            numbers = []
+            contributions = []
+            for term in terms:
+                docs, tfs = self._compiled_postings(term)
+                # L'IDF reste celui de toute la collection, même pour un sous-ensemble
+                idf = math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+                if mask is not None:
+                    keep = mask[docs]
+                    docs, tfs = docs[keep], tfs[keep]
+                norm = self.k1 * (1 - self.b + self.b * self._lengths_array[docs] / avg_length)
+                numbers.append(docs)
+                contributions.append(idf * tfs * (self.k1 + 1) / (tfs + norm))
+            scores = np.bincount(
+                np.concatenate(numbers),
+                weights=np.concatenate(contributions),
+                minlength=len(self._chunk_ids)
+            )
+
+            candidates = np.flatnonzero(scores > 0)
+            if len(candidates) > k:
+                candidates = candidates[np.argpartition(-scores[candidates], k)[:k]]
+            candidates = candidates[np.argsort(-scores[candidates])]
+            return [(self._chunk_ids[n], float(scores[n])) for n in candidates]
+
+    def search_chunks(self, query, k=10, allowed_ids=None):
+        """Comme `search`, mais retourne des (chunk_id, score, texte, métadonnées) lus
+        sous le même verrou : un chunk retiré entre-temps ne peut pas manquer"""
+        with self._lock:
+            return [
+                (chunk_id, score, *self.get(chunk_id))
+                for chunk_id, score in self.search(query, k=k, allowed_ids=allowed_ids)
+            ]
+
+    def get(self, chunk_id):
+        """Retourne (texte, métadonnées) d'un chunk indexé"""
+        with self._lock:
+            text, metadata, _ = self._chunks[self._numbers[chunk_id]]
+            return text, metadata
+
+    def save(self):
+        """Écrit l'index sur disque (écriture atomique)"""
+        if not self.path:
+            return
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump({
+                    'version': self.version,
+                    'numbers': self._numbers,
+                    'chunk_ids': self._chunk_ids,
+                    'chunks': self._chunks,
+                    'lengths': self._lengths,
+                    'postings': dict(self._postings),
+                    'total_length': self._total_length
+                }, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+
+    def _load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                data = pickle.load(f)
+            self._numbers = data['numbers']
+            self._chunk_ids = data['chunk_ids']
+            self._chunks = data['chunks']
+            self._lengths = data['lengths']
+            self._postings = defaultdict(dict, data['postings'])
+            self._total_length = data['total_length']
+            self.version = data['version']
+        except (OSError, pickle.UnpicklingError, KeyError, EOFError) as e:
+            logger.error(f"Index BM25 illisible ({self.path}), il sera reconstruit: {e}")
+            self.clear()
+            self.version = None
+
+
+def reciprocal_rank_fusion(rankings, weights=None, k=60):
+    """Fusionne des classements par Reciprocal Rank Fusion.
+
+    `rankings` est une liste de listes de clés ordonnées (meilleure en premier) ;
+    chaque clé reçoit la somme des `poids / (k + rang)`. Retourne les clés triées
+    par score décroissant.
+    """
+    weights = weights or [1.0] * len(rankings)
+    scores = defaultdict(float)
+    for ranking, weight in zip(rankings, weights):
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] += weight / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
@@ -0,0 +1,163 @@
+from langchain_core.embeddings import Embeddings
+from config import Config
+from instrumentation import metrics
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Au-delà, le temps de chargement rapporté par Ollama signale un modèle
+# qui n'était pas en mémoire (démarrage à froid)
+COLD_LOAD_SECONDS = 0.1
+
+
+def parse_keep_alive(value):
+    """Durée de rétention d'Ollama : nombre de secondes ("-1" = illimité) ou durée ("30m")"""
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return value
+
+
+class OllamaClient:
+    """Client Ollama partagé par tout le processus.
+
+    Une seule connexion HTTP (pool httpx, keep-alive) sert la génération et
+    les embeddings ; chaque requête demande à Ollama de garder le modèle en
+    mémoire `keep_alive` (OLLAMA_KEEP_ALIVE), pour que le modèle de chat et
+    celui d'embedding ne se chassent pas l'un l'autre entre deux questions
+    (côté serveur, OLLAMA_MAX_LOADED_MODELS doit permettre les deux).
+    `warmup` charge les deux modèles au démarrage. La température est un
+    paramètre de chaque requête : aucun objet n'est reconstruit pour la changer.
+
+    Chaque requête est mesurée et classée "cold" ou "warm" d'après le temps
+    de chargement du modèle rapporté par Ollama (`load_duration`). Le client
+    HTTP (et le module `ollama`) n'est créé qu'à la première requête, le plus
+    souvent dans le thread de préchargement plutôt qu'au démarrage de l'UI.
+    """
+
+    def __init__(self, host=None, chat_model=None, embed_model=None, keep_alive=None,
+                 timeout=None, max_connections=None):
+        self.host = host or Config.OLLAMA_HOST
+        self.chat_model = chat_model or Config.MODEL_NAME
+        self.embed_model = embed_model or Config.EMBED_MODEL or self.chat_model
+        self.keep_alive = parse_keep_alive(Config.OLLAMA_KEEP_ALIVE if keep_alive is None else keep_alive)
+        self.timeout = timeout or Config.OLLAMA_TIMEOUT
+        self.max_connections = max_connections or Config.OLLAMA_MAX_CONNECTIONS
+        self._ollama = None
+        self._lock = threading.Lock()
+        self._last_start = {}
+        self.warmed_up = False
+
+    @property
+    def _client(self):
+        """Client `ollama` sous-jacent, créé au premier usage"""
+        with self._lock:
+            if self._ollama is None:
+                import httpx
+                import ollama
+                self._ollama = ollama.Client(
+                    host=self.host,
+                    timeout=self.timeout,
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections,
+                        max_keepalive_connections=self.max_connections
+                    )
+                )
+            return self._ollama
+
+    def generate_stream(self, prompt, temperature=None):
+        """Génère une réponse token par token"""
+        start = time.perf_counter()
+        first_token = None
+        stream = self._client.generate(
+            model=self.chat_model,
+            prompt=prompt,
+            stream=True,
+            options={"temperature": Config.TEMPERATURE if temperature is None else temperature},
+            keep_alive=self.keep_alive
+        )
+        for part in stream:
+            if part.response:
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                yield part.response
+            if part.done:
+                self._record("generate", self.chat_model, part, time.perf_counter() - start, first_token)
+
+    def generate(self, prompt, temperature=None):
+        return "".join(self.generate_stream(prompt, temperature))
+
+    def embed(self, texts):
+        start = time.perf_counter()
+        response = self._client.embed(model=self.embed_model, input=texts, keep_alive=self.keep_alive)
+        self._record("embed", self.embed_model, response, time.perf_counter() - start)
+        return [list(vector) for vector in response.embeddings]
+
+    def warmup(self):
+        """Charge les modèles de chat et d'embedding ; retourne la durée de chaque chargement"""
+        durations = {}
+        for kind, load in (("embed", lambda: self.embed(["warmup"])),
+                           ("generate", self._load_chat_model)):
+            start = time.perf_counter()
+            try:
+                load()
+            except Exception as e:
+                logger.warning(f"Préchargement du modèle ({kind}) impossible: {e}")
+                continue
+            durations[kind] = time.perf_counter() - start
+        self.warmed_up = len(durations) == 2
+        logger.info(
+            "Modèles Ollama préchargés: "
+            + ", ".join(f"{kind} {seconds:.2f}s" for kind, seconds in durations.items())
+        )
+        return durations
+
+    def _load_chat_model(self):
+        # Un prompt vide charge le modèle sans rien générer
+        response = self._client.generate(model=self.chat_model, prompt="", keep_alive=self.keep_alive)
+        self._record("generate", self.chat_model, response, None)
+
+    def _record(self, kind, model, response, seconds, first_token=None):
+        load = (response.load_duration or 0) / 1e9
+        start = "cold" if load > COLD_LOAD_SECONDS else "warm"
+        with self._lock:
+            self._last_start[kind] = start
+        metrics.increment("rag_ollama_requests_total", kind=kind, model=model, start=start)
+        if load:
+            metrics.observe("rag_ollama_load_seconds", load, kind=kind, model=model)
+        if seconds is not None:
+            metrics.observe("rag_ollama_request_seconds", seconds, kind=kind, start=start)
+        if first_token is not None:
+            metrics.observe("rag_ollama_first_token_seconds", first_token, start=start)
+        if start == "cold":
+            logger.info(f"Modèle {model} chargé par Ollama ({kind}) en {load:.2f}s")
+
+    def status(self):
+        with self._lock:
+            last_start = dict(self._last_start)
+        return {
+            "host": self.host,
+            "chat_model": self.chat_model,
+            "embed_model": self.embed_model,
+            "keep_alive": self.keep_alive,
+            "warmed_up": self.warmed_up,
+            "last_start": last_start
+        }
+
+
+class OllamaEmbeddings(Embeddings):
+    """Embeddings LangChain servis par le client Ollama partagé"""
+
+    def __init__(self, client):
+        self.client = client
+        self.model_name = client.embed_model
+
+    def embed_documents(self, texts):
+        return self.client.embed(texts)
+
+    def embed_query(self, text):
+        return self.client.embed([text])[0]
@@ -0,0 +1,385 @@
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from config import Config
+from instrumentation import metrics
+import logging
+import multiprocessing
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Écart horizontal marquant une séparation de colonnes dans le mode "layout"
+COLUMN_GAP = re.compile(r" {2,}")
+
+
+def normalize_layout_text(text):
+    """Compacte le texte extrait en mode "layout" sans perdre sa structure.
+
+    Les lignes gardent leur ordre et les colonnes restent séparées par deux
+    espaces (paires libellé/valeur des formulaires, tableaux), mais
+    l'indentation et les suites de lignes vides sont supprimées.
+    """
+    lines = []
+    for line in text.splitlines():
+        line = COLUMN_GAP.sub("  ", line.strip())
+        if line or (lines and lines[-1]):
+            lines.append(line)
+    return "\n".join(lines).strip()
+
+
+def extract_page_text(page, mode):
+    if mode == "layout":
+        try:
+            return normalize_layout_text(page.extract_text(extraction_mode="layout"))
+        except Exception as e:
+            # Certaines pages (polices exotiques) ne supportent que le mode simple
+            logger.debug(f"Extraction layout impossible, repli sur le mode simple: {e}")
+    return page.extract_text() or ""
+
+
+def count_pages(pdf_path):
+    from pypdf import PdfReader
+
+    return len(PdfReader(pdf_path).pages)
+
+
+def extract_pages(pdf_path, page_numbers, mode):
+    """Extrait le texte d'un lot de pages (exécuté dans un processus du pool).
+
+    Retourne les `(numéro, texte)` des pages et la durée de l'extraction,
+    mesurée dans le processus enfant pour ne pas compter l'attente dans la file.
+    """
+    from pypdf import PdfReader
+
+    start = time.perf_counter()
+    reader = PdfReader(pdf_path)
+    pages = [(number, extract_page_text(reader.pages[number], mode)) for number in page_numbers]
+    return pages, time.perf_counter() - start
+
+
+def create_parse_pool(workers=None):
+    """Pool de processus d'extraction.
+
+    Ses processus ne sont pas créés par `fork` : l'application (Streamlit,
+    API) a des threads (workers de la file d'ingestion, httpx, logging) et un
+    enfant qui hérite d'un de leurs verrous, pris au moment du fork, resterait
+    bloqué. Ils partent d'un interpréteur neuf ("forkserver", ou "spawn" à défaut) ;
+    chacun importe ce module, que LangChain n'alourdit pas (import différé).
+    """
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return ProcessPoolExecutor(
+        max_workers=workers or Config.INGEST_PARSE_WORKERS or os.cpu_count(),
+        mp_context=multiprocessing.get_context(method)
+    )
+
+
+def stop_parse_pool(pool, wait=True):
+    """Arrête un pool d'extraction ; sans `wait` (après une erreur ou un délai
+    dépassé), les tâches en attente sont annulées et les processus tués plutôt
+    qu'attendus, un processus bloqué ne devant pas bloquer l'arrêt"""
+    if wait:
+        pool.shutdown()
+        return
+    # `ProcessPoolExecutor` n'expose pas ses processus avant Python 3.14
+    processes = list((getattr(pool, "_processes", None) or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.terminate()
+
+
+class PageCache:
+    """Cache disque du texte des pages, indexé par (hash du fichier, mode, page).
+
+    Seul le processus principal y accède (une connexion SQLite ne survit pas à
+    un fork) : les processus d'extraction lui renvoient le texte des pages.
+    Quand le texte en cache dépasse `max_bytes`, les documents les moins
+    récemment extraits ou relus sont évincés en entier ; il suffira de les
+    extraire à nouveau. Ne sont jamais évincés le document qui vient d'être
+    écrit ni les documents épinglés (`pin`) par une ingestion en cours, dans ce
+    processus ou un autre, tant que l'épingle a moins de `pin_ttl` secondes
+    (celle d'un processus arrêté en cours de route finit par expirer).
+    """
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024, pin_ttl=3600.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.pin_ttl = pin_ttl
+        self.owner = uuid.uuid4().hex
+        self._pins = {}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " content_hash TEXT NOT NULL,"
+            " mode TEXT NOT NULL,"
+            " page INTEGER NOT NULL,"
+            " text TEXT NOT NULL,"
+            " PRIMARY KEY (content_hash, mode, page))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " content_hash TEXT PRIMARY KEY,"
+            " page_count INTEGER NOT NULL)"
+        )
+        tracked = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'usage'"
+        ).fetchone()
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS usage ("
+            " content_hash TEXT NOT NULL,"
+            " mode TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " PRIMARY KEY (content_hash, mode))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pins ("
+            " content_hash TEXT NOT NULL,"
+            " owner TEXT NOT NULL,"
+            " pinned_at REAL NOT NULL,"
+            " PRIMARY KEY (content_hash, owner))"
+        )
+        if not tracked:
+            # Cache antérieur au suivi de la taille : ses documents seront évincés en premier
+            self._conn.execute(
+                "INSERT OR IGNORE INTO usage (content_hash, mode, size, last_used) "
+                "SELECT content_hash, mode, SUM(LENGTH(CAST(text AS BLOB))), 0 FROM pages "
+                "GROUP BY content_hash, mode"
+            )
+        self._conn.commit()
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM usage"
+        ).fetchone()[0]
+
+    def page_count(self, content_hash):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT page_count FROM documents WHERE content_hash = ?", (content_hash,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_page_count(self, content_hash, page_count):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents (content_hash, page_count) VALUES (?, ?)",
+                (content_hash, page_count)
+            )
+            self._conn.commit()
+
+    def missing_pages(self, content_hash, mode, page_count):
+        """Numéros des pages absentes du cache"""
+        with self._lock:
+            cached = {
+                row[0] for row in self._conn.execute(
+                    "SELECT page FROM pages WHERE content_hash = ? AND mode = ?", (content_hash, mode)
+                )
+            }
+        return [number for number in range(page_count) if number not in cached]
+
+    def put_many(self, content_hash, mode, pages):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO pages (content_hash, mode, page, text) VALUES (?, ?, ?, ?)",
+                [(content_hash, mode, number, text) for number, text in pages]
+            )
+            size = self._conn.execute(
+                "SELECT COALESCE(SUM(LENGTH(CAST(text AS BLOB))), 0) FROM pages "
+                "WHERE content_hash = ? AND mode = ?",
+                (content_hash, mode)
+            ).fetchone()[0]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO usage (content_hash, mode, size, last_used) VALUES (?, ?, ?, ?)",
+                (content_hash, mode, size, time.time())
+            )
+            # Relu à chaque écriture : d'autres processus remplissent le même cache
+            self._total_bytes = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM usage"
+            ).fetchone()[0]
+            self._evict(keep=(content_hash, mode))
+            self._conn.commit()
+
+    def pin(self, content_hash):
+        """Protège les pages d'un document de l'éviction jusqu'au `unpin` correspondant"""
+        with self._lock:
+            self._pins[content_hash] = self._pins.get(content_hash, 0) + 1
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pins (content_hash, owner, pinned_at) VALUES (?, ?, ?)",
+                (content_hash, self.owner, time.time())
+            )
+            self._conn.commit()
+
+    def unpin(self, content_hash):
+        with self._lock:
+            self._pins[content_hash] -= 1
+            if self._pins[content_hash]:
+                return
+            del self._pins[content_hash]
+            self._conn.execute(
+                "DELETE FROM pins WHERE content_hash = ? AND owner = ?", (content_hash, self.owner)
+            )
+            self._conn.commit()
+
+    def iter_pages(self, content_hash, mode, batch_size=16):
+        """Parcourt les pages en cache dans l'ordre, par petits lots"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE usage SET last_used = ? WHERE content_hash = ? AND mode = ?",
+                (time.time(), content_hash, mode)
+            )
+            self._conn.commit()
+        last = -1
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT page, text FROM pages WHERE content_hash = ? AND mode = ? AND page > ? "
+                    "ORDER BY page LIMIT ?",
+                    (content_hash, mode, last, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            yield from rows
+            last = rows[-1][0]
+
+    def _evict(self, keep):
+        if self._total_bytes <= self.max_bytes:
+            return
+        # On descend à 90% de la limite pour ne pas évincer à chaque insertion
+        target = int(self.max_bytes * 0.9)
+        rows = self._conn.execute(
+            "SELECT content_hash, mode, size FROM usage ORDER BY last_used ASC"
+        ).fetchall()
+        pinned = {
+            row[0] for row in self._conn.execute(
+                "SELECT content_hash FROM pins WHERE pinned_at > ?", (time.time() - self.pin_ttl,)
+            )
+        }
+        evicted = []
+        for content_hash, mode, size in rows:
+            if self._total_bytes <= target:
+                break
+            if (content_hash, mode) == keep or content_hash in pinned:
+                continue
+            evicted.append((content_hash, mode))
+            self._total_bytes -= size
+        self._conn.executemany("DELETE FROM pages WHERE content_hash = ? AND mode = ?", evicted)
+        self._conn.executemany("DELETE FROM usage WHERE content_hash = ? AND mode = ?", evicted)
+        logger.debug(f"{len(evicted)} document(s) évincé(s) du cache des pages")
+
+    @property
+    def size_bytes(self):
+        return self._total_bytes
+
+    def close(self):
+        self._conn.close()
+
+
+class PageExtractor:
+    """Extraction des pages de PDFs sur un pool de processus, avec cache par page.
+
+    `submit` répartit les pages non encore extraites d'un document en lots
+    traités en parallèle, dont le résultat est écrit dans le cache par `store` ;
+    `documents` relit ensuite les pages depuis le cache sous forme de
+    `Document` (métadonnées `page`, `total_pages`), par petits lots, pour que
+    l'indexation n'ait jamais tout le document en mémoire.
+    Sans `pool`, un pool propre à l'extracteur est créé (voir `close`).
+    Une tâche qui ne rend pas son résultat en `timeout` secondes fait échouer
+    l'extraction plutôt que de bloquer l'ingestion.
+    """
+
+    def __init__(self, cache=None, pool=None, workers=None, mode=None, pages_per_task=None,
+                 timeout=None):
+        self.cache = cache or PageCache(
+            Config.PAGE_CACHE_PATH, max_bytes=Config.PAGE_CACHE_MAX_MB * 1024 * 1024
+        )
+        self.mode = mode or Config.PDF_EXTRACTION_MODE
+        self.pages_per_task = pages_per_task or Config.EXTRACT_PAGES_PER_TASK
+        self.timeout = timeout or Config.INGEST_PARSE_TIMEOUT
+        self._own_pool = pool is None
+        self.pool = pool or create_parse_pool(workers)
+
+    def page_count(self, pdf_path, content_hash):
+        count = self.cache.page_count(content_hash)
+        if count is None:
+            count = count_pages(pdf_path)
+            self.cache.set_page_count(content_hash, count)
+        return count
+
+    def submit(self, pdf_path, content_hash):
+        """Planifie l'extraction des pages manquantes ; retourne (nb pages, futures)"""
+        page_count = self.page_count(pdf_path, content_hash)
+        missing = self.cache.missing_pages(content_hash, self.mode, page_count)
+        futures = [
+            self.pool.submit(
+                extract_pages,
+                pdf_path,
+                missing[start:start + self.pages_per_task],
+                self.mode
+            )
+            for start in range(0, len(missing), self.pages_per_task)
+        ]
+        return page_count, futures
+
+    def extract(self, pdf_path, content_hash):
+        """Extrait (si besoin) toutes les pages d'un document ; retourne le nombre de pages"""
+        page_count, futures = self.submit(pdf_path, content_hash)
+        for future in futures:
+            self.store(content_hash, future.result(timeout=self.timeout))
+        return page_count
+
+    def store(self, content_hash, result, trace=None):
+        """Écrit dans le cache le résultat d'une tâche d'extraction (étape "load")"""
+        pages, seconds = result
+        self.cache.put_many(content_hash, self.mode, pages)
+        metrics.observe("rag_stage_duration_seconds", seconds, stage="load")
+        metrics.increment("rag_pages_total", len(pages))
+        if trace is not None:
+            trace.add("load", seconds)
+            trace.count("pages", len(pages))
+
+    @contextmanager
+    def pinned(self, content_hash):
+        """Garde les pages d'un document en cache le temps de l'extraire et de l'indexer"""
+        self.cache.pin(content_hash)
+        try:
+            yield
+        finally:
+            self.cache.unpin(content_hash)
+
+    def documents(self, content_hash, metadata=None, page_count=None):
+        """Pages en cache d'un document, sous forme de `Document`, dans l'ordre.
+
+        Avec `page_count`, lève RuntimeError après la dernière page si des
+        pages manquent (évincées du cache entre-temps) : un document incomplet
+        ne doit pas être indexé comme à jour.
+        """
+        # Import différé : les processus d'extraction importent ce module sans en avoir besoin
+        from langchain_core.documents import Document
+
+        base = dict(metadata or {})
+        if page_count is not None:
+            base["total_pages"] = page_count
+        found = 0
+        for number, text in self.cache.iter_pages(content_hash, self.mode):
+            found += 1
+            yield Document(page_content=text, metadata={**base, "page": number})
+        if page_count is not None and found < page_count:
+            raise RuntimeError(
+                f"{page_count - found} page(s) sur {page_count} absente(s) du cache, document à réextraire"
+            )
+
+    def close(self, wait=True):
+        if self._own_pool:
+            stop_parse_pool(self.pool, wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        self.close(wait=exc_type is None)
@@ -1,85 +1,635 @@
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_ollama import OllamaEmbeddings
-from langchain_community.vectorstores import Chroma
-from langchain_ollama import OllamaLLM
-from langchain.chains import ConversationalRetrievalChain
-import chromadb
+from chunking import LEGACY_POLICY, count_tokens, create_splitter, normalize_chunk_policy
+from config import Config
+from document_registry import DocumentRegistry, compute_file_hash
+from embedding_pipeline import BatchedEmbeddings, EmbeddingCache
+from file_lock import FileLock
+from answer_cache import AnswerCache, cache_scope
+from keyword_index import KeywordIndex
+from page_extraction import PageExtractor
+from ollama_client import OllamaClient, OllamaEmbeddings
+from vector_backends import create_vector_backend
+from instrumentation import RATE_BUCKETS, TOKEN_BUCKETS, metrics, profiled
+from conversation import (
+    CondensedQuestionCache,
+    estimate_tokens,
+    format_history,
+    is_self_contained,
+    trim_history
+)
+from contextlib import contextmanager
+import itertools
+import logging
 import os
-import streamlit as st
+import time
+
+logger = logging.getLogger(__name__)
+
+NO_DOCUMENTS_MESSAGE = "Veuillez d'abord charger des PDFs pour que je puisse répondre à vos questions."
+
+def create_answer_cache():
+    """Construit le cache persistant des réponses RAG"""
+    return AnswerCache(
+        Config.ANSWER_CACHE_PATH,
+        threshold=Config.ANSWER_CACHE_THRESHOLD,
+        ttl=Config.ANSWER_CACHE_TTL,
+        max_entries=Config.ANSWER_CACHE_MAX_ENTRIES
+    )
+
+
+def create_embeddings(ollama_client):
+    """Construit l'étape d'embedding (lots, concurrence et cache disque)"""
+    return BatchedEmbeddings(
+        OllamaEmbeddings(ollama_client),
+        model_name=ollama_client.embed_model,
+        cache=EmbeddingCache(
+            Config.EMBED_CACHE_PATH,
+            max_bytes=Config.EMBED_CACHE_MAX_MB * 1024 * 1024
+        ),
+        batch_size=Config.EMBED_BATCH_SIZE,
+        max_workers=Config.EMBED_MAX_WORKERS
+    )
+
 
 class RAGHandler:
-    def __init__(self, model_name="mistral"):
-        self.model_name = model_name
-        self.embeddings = OllamaEmbeddings(
-            model=model_name
-        )
-        self.vector_store = None
-        self.chain = None
-        
-        # Initialiser le client ChromaDB avec les paramètres par défaut
-        self.chroma_client = chromadb.PersistentClient(path="storage/chromadb")
-
-    def process_pdfs(self, pdf_paths):
-        """Traite les PDFs et crée la base de connaissances"""
-        documents = []
-        
-        # Chargement des PDFs
-        for pdf_path in pdf_paths:
-            if os.path.exists(pdf_path):
-                loader = PyPDFLoader(pdf_path)
-                documents.extend(loader.load())
-
-        # Découpage du texte en chunks plus petits
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=500,
-            chunk_overlap=50
-        )
-        splits = text_splitter.split_documents(documents)
-
-        # Création de la base vectorielle avec un nom de collection spécifique
-        self.vector_store = Chroma.from_documents(
-            documents=splits,
-            embedding=self.embeddings,
-            client=self.chroma_client,
-            collection_name="pdf_collection"
+    def __init__(self, model_name=None, collection_name=Config.DEFAULT_COLLECTION,
+                 chroma_client=None, embeddings=None, answer_cache=None, ollama_client=None,
+                 chunk_policy=None):
+        """`chroma_client`, `embeddings`, `answer_cache` et `ollama_client` peuvent être
+        partagés entre handlers. Le modèle de chat est `model_name` ou, à
+        défaut, MODEL_NAME ; le modèle d'embedding et l'hôte Ollama viennent de
+        EMBED_MODEL et OLLAMA_HOST.
+
+        La base vectorielle est choisie par VECTOR_BACKEND ; `chroma_client`
+        n'est utilisé que pour le backend Chroma (par défaut, le client partagé
+        du processus, créé à l'ouverture de la première collection). Seul le manifeste de
+        la collection est lu ici : la base vectorielle et l'index BM25 sont
+        ouverts au premier usage (voir `load`), et le retriever est rattaché
+        à la collection existante sans réindexation.
+
+        La politique de découpage est propre à la collection et notée dans son
+        manifeste (voir `set_chunk_policy`) ; `chunk_policy` la remplace.
+
+        Plusieurs processus (interface, API) peuvent ouvrir la même
+        collection : leurs écritures sont sérialisées par un verrou de
+        fichier, et chacun reprend celles des autres avant de lire ou
+        d'écrire (voir `refresh`).
+        """
+        self.ollama = ollama_client or OllamaClient(chat_model=model_name)
+        self.model_name = self.ollama.chat_model
+        self.collection_name = collection_name
+        self.embeddings = embeddings or create_embeddings(self.ollama)
+        self.answer_cache = answer_cache or create_answer_cache()
+        self.condense_cache = CondensedQuestionCache(Config.CONDENSE_CACHE_SIZE)
+        # Sérialise les écritures (base vectorielle, registre, retriever) entre sessions et processus
+        self._write_lock = FileLock(os.path.join(Config.COLLECTIONS_DIR, f"{collection_name}.lock"))
+        # Dernière écriture (compteur du verrou) prise en compte par ce processus
+        self._generation = self._write_lock.generation()
+        self._chroma_client = chroma_client
+        self._vector_store = None
+        self._keyword_index = None
+        # Index BM25 modifié pendant un lot, sauvegardé à la fin (voir `batch`)
+        self._keyword_unsaved = False
+        self._retriever = None
+
+        self.registry = DocumentRegistry(
+            os.path.join(Config.COLLECTIONS_DIR, f"{collection_name}.json"),
+            legacy_path=Config.REGISTRY_PATH if collection_name == Config.DEFAULT_COLLECTION else None
         )
+        stored_policy = self.registry.info.get('chunking')
+        if stored_policy is None:
+            # Une collection déjà remplie l'a été avec l'ancien découpage : on le conserve
+            stored_policy = LEGACY_POLICY if len(self.registry) else normalize_chunk_policy()
+            with self._writing():
+                self.registry.set_info(chunking=stored_policy)
+        self.chunk_policy = normalize_chunk_policy(stored_policy)
+        self.splitter = create_splitter(self.chunk_policy)
+        if chunk_policy is not None:
+            self.set_chunk_policy(chunk_policy)
+
+    @property
+    def vector_store(self):
+        return self.load()._vector_store
+
+    @property
+    def keyword_index(self):
+        return self.load()._keyword_index
+
+    @property
+    def retriever(self):
+        """Retriever hybride, ou None si la collection est vide.
+
+        Au premier accès, une collection déjà indexée (manifeste non vide) est
+        rouverte : seuls les index sont chargés, rien n'est revectorisé.
+        """
+        self.refresh()
+        if self._retriever is None and len(self.registry):
+            self.load()
+            with self._write_lock:
+                if self._retriever is None and len(self.registry):
+                    self._retriever = self._make_retriever()
+        return self._retriever
+
+    @property
+    def loaded(self):
+        return self._keyword_index is not None
+
+    def load(self):
+        """Ouvre la base vectorielle et l'index BM25 de la collection (une seule fois)"""
+        if self.loaded:
+            return self
+        with self._writing():
+            if self.loaded:
+                return self
+            with metrics.span("attach"):
+                self._vector_store = create_vector_backend(
+                    self.collection_name,
+                    self.embeddings,
+                    chroma_client=self._chroma_client
+                )
+                self._purge_unregistered_collection()
+                self._check_manifest()
+                keyword_index = KeywordIndex(
+                    path=os.path.join(Config.KEYWORD_INDEX_DIR, f"{self.collection_name}.pkl")
+                )
+                self._sync_keyword_index(keyword_index)
+                self._keyword_index = keyword_index
+            logger.info(
+                f"Collection {self.collection_name} ouverte: {len(self.registry)} document(s), "
+                f"{len(keyword_index)} chunk(s)"
+            )
+        return self
+
+    def _check_manifest(self):
+        """Vérifie que les vecteurs stockés correspondent au manifeste de la collection.
+
+        Un changement de modèle d'embedding ou de backend, ou une base vide
+        alors que le manifeste liste des documents, rend les vecteurs
+        inutilisables : la collection est vidée pour être réindexée.
+        """
+        model = getattr(self.embeddings, 'model_name', self.model_name)
+        info = self.registry.info
+        reason = None
+        if info.get('embedding_model') not in (None, model):
+            reason = f"modèle d'embedding {info['embedding_model']} remplacé par {model}"
+        elif info.get('vector_backend') not in (None, Config.VECTOR_BACKEND):
+            reason = f"backend {info['vector_backend']} remplacé par {Config.VECTOR_BACKEND}"
+        elif len(self.registry) and self._vector_store.count() == 0:
+            reason = "base vectorielle vide"
+        if reason:
+            logger.warning(f"Collection {self.collection_name} à réindexer: {reason}")
+            self._vector_store.reset()
+            self.registry.clear()
+        self.registry.set_info(embedding_model=model, vector_backend=Config.VECTOR_BACKEND)
+
+    def _sync_keyword_index(self, keyword_index):
+        """Reconstruit l'index BM25 depuis la base vectorielle s'il ne correspond plus au registre"""
+        if keyword_index.version == self.registry.version():
+            return
+        logger.info(f"Reconstruction de l'index BM25 de {self.collection_name}")
+        ids, texts, stored_metadatas = self._vector_store.get_all()
+        metadatas = []
+        for chunk_id, metadata in zip(ids, stored_metadatas):
+            metadatas.append({**(metadata or {}), "chunk_id": chunk_id})
+        keyword_index.clear()
+        keyword_index.add(ids, texts, metadatas)
+        keyword_index.version = self.registry.version()
+        keyword_index.save()
+
+    @contextmanager
+    def _writing(self):
+        """Section d'écriture : verrou de la collection, reprise des écritures des
+        autres processus, puis incrément du compteur qui leur signale la nôtre"""
+        with self._write_lock:
+            self._refresh()
+            try:
+                yield
+            finally:
+                self._generation = self._write_lock.bump()
+
+    @contextmanager
+    def batch(self):
+        """Lot d'écritures (ingestion de plusieurs documents, suppressions) : le
+        manifeste et l'index BM25 ne sont sauvegardés qu'une fois, à la fin du
+        lot, plutôt qu'à chaque document. Le verrou n'est pas gardé pendant le
+        lot ; en attendant, les autres processus voient la version précédente."""
+        self.registry.hold()
+        try:
+            yield self
+        finally:
+            with self._writing():
+                self.registry.release()
+                if self._keyword_unsaved:
+                    self._save_keyword_index()
+
+    def refresh(self):
+        """Reprend les écritures faites par un autre processus sur la collection.
+
+        Rien n'est relu si le compteur d'écritures du verrou n'a pas bougé.
+        Sinon le manifeste est relu s'il a changé, la base vectorielle
+        rattrape les écritures, et l'index BM25 est mis à jour par différence
+        (chunks ajoutés relus depuis la base vectorielle, chunks retirés supprimés).
+        """
+        if self._write_lock.generation() != self._generation:
+            with self._write_lock:
+                self._refresh()
+
+    def _refresh(self):
+        generation = self._write_lock.generation()
+        if generation == self._generation:
+            return
+        before = self.registry.chunk_ids(self.registry.file_ids())
+        if self.registry.changed():
+            self.registry.reload()
+        stored_policy = self.registry.info.get('chunking')
+        if stored_policy is not None and normalize_chunk_policy(stored_policy) != self.chunk_policy:
+            self.chunk_policy = normalize_chunk_policy(stored_policy)
+            self.splitter = create_splitter(self.chunk_policy)
+        if self.loaded:
+            self._vector_store.refresh()
+            after = self.registry.chunk_ids(self.registry.file_ids())
+            self._keyword_index.remove(list(before - after))
+            ids, texts, stored_metadatas = self._vector_store.get(list(after - before))
+            self._keyword_index.add(
+                ids, texts, [{**(metadata or {}), "chunk_id": chunk_id}
+                             for chunk_id, metadata in zip(ids, stored_metadatas)]
+            )
+            self._keyword_index.version = self.registry.version()
+        self._retriever = None
+        self._generation = generation
+        logger.debug(f"Collection {self.collection_name} modifiée par un autre processus, reprise")
+
+    def _save_keyword_index(self):
+        self.keyword_index.version = self.registry.version()
+        self._keyword_unsaved = self.registry.held
+        if not self._keyword_unsaved:
+            self.keyword_index.save()
+
+    def _purge_unregistered_collection(self):
+        """Vide une collection remplie avant l'existence du registre.
+
+        Les anciennes versions ajoutaient les chunks sans identifiant stable, ce
+        qui produisait des doublons impossibles à rattacher à un document.
+        """
+        if self.registry.exists:
+            return
+        if self._vector_store.count() > 0:
+            logger.info(f"Collection {self.collection_name} sans registre, réinitialisation")
+            self._vector_store.reset()
+        self.registry.save()
+
+    def set_chunk_policy(self, policy):
+        """Change la politique de découpage de la collection.
+
+        Les chunks existants ne correspondent plus à la nouvelle politique :
+        les documents sont retirés de l'index (à réindexer) et leurs
+        identifiants retournés. Lève ValueError si la politique est invalide.
+        """
+        policy = normalize_chunk_policy(policy)
+        with self._writing():
+            if policy == self.chunk_policy:
+                return []
+            removed = self.registry.file_ids()
+            if removed:
+                logger.warning(
+                    f"Découpage de {self.collection_name} modifié: {len(removed)} document(s) à réindexer"
+                )
+                self.remove_documents(removed)
+            self.chunk_policy = policy
+            self.splitter = create_splitter(policy)
+            self.registry.set_info(chunking=policy)
+            self._retriever = None
+        return removed
+
+    def chunk_stats(self):
+        """Politique de découpage et statistiques des chunks indexés"""
+        self.refresh()
+        return {"policy": self.chunk_policy, **self.registry.stats()}
 
-        # Initialisation de la chaîne de conversation
-        self.chain = ConversationalRetrievalChain.from_llm(
-            llm=self.get_llm(),
-            retriever=self.vector_store.as_retriever(
-                search_kwargs={"k": 2}
-            ),
-            return_source_documents=True
+    def is_indexed(self, file_id, content_hash):
+        """Indique si un document est déjà indexé avec ce contenu (md5 Drive)"""
+        self.refresh()
+        return self.registry.is_current(file_id, content_hash)
+
+    def process_pdfs(self, pdf_paths, file_ids=None):
+        """Traite les PDFs et met à jour la base de connaissances de façon incrémentale.
+
+        Seuls les documents nouveaux ou modifiés sont découpés et vectorisés ; les
+        chunks de la version précédente d'un document modifié sont supprimés.
+        Retourne le nombre de documents (ré)indexés.
+        """
+        if file_ids is None:
+            file_ids = [os.path.basename(pdf_path) for pdf_path in pdf_paths]
+
+        indexed = 0
+        with self.batch(), PageExtractor() as extractor:
+            for file_id, pdf_path in zip(file_ids, pdf_paths):
+                if not os.path.exists(pdf_path):
+                    continue
+
+                content_hash = compute_file_hash(pdf_path)
+                if self.registry.is_current(file_id, content_hash):
+                    logger.debug(f"Document {file_id} inchangé, réutilisation de l'index")
+                    continue
+
+                # Pages extraites en parallèle (ou relues du cache), puis indexées au fil de l'eau
+                with extractor.pinned(content_hash):
+                    page_count = extractor.extract(pdf_path, content_hash)
+                    self.index_document(
+                        file_id,
+                        content_hash,
+                        extractor.documents(content_hash, page_count=page_count),
+                        name=os.path.basename(pdf_path)
+                    )
+                indexed += 1
+            self.build_retriever()
+        return indexed
+
+    def index_document(self, file_id, content_hash, documents, name=None, text_splitter=None,
+                       trace=None, modified=None):
+        """Découpe et indexe les pages d'un document, en remplaçant sa version précédente.
+
+        `documents` peut être un itérateur : les pages sont traitées par lots de
+        INDEX_PAGE_BATCH (découpage, embeddings, écriture), sans jamais garder
+        tout le document en mémoire. L'ancienne version n'est retirée qu'une fois
+        la nouvelle entièrement écrite. `trace` reçoit la durée des étapes
+        split/embed/upsert ; `modified` (date de modification Drive) est
+        noté dans le manifeste. Le découpage suit la politique de la collection
+        sauf si `text_splitter` est fourni. Retourne le nombre de chunks insérés.
+        """
+        text_splitter = text_splitter or self.splitter
+        pages = iter(documents)
+        chunk_ids = []
+        chunk_tokens = []
+        try:
+            while True:
+                batch = list(itertools.islice(pages, Config.INDEX_PAGE_BATCH))
+                if not batch:
+                    break
+                batch_ids, batch_tokens = self._index_batch(file_id, content_hash, batch, name,
+                                                            text_splitter, len(chunk_ids), trace)
+                chunk_ids.extend(batch_ids)
+                chunk_tokens.extend(batch_tokens)
+        except Exception:
+            # Les chunks déjà écrits de cette version ne doivent pas rester orphelins
+            with self._writing():
+                previous = set((self.registry.get(file_id) or {}).get('chunk_ids', []))
+                self._delete_chunks([i for i in chunk_ids if i not in previous])
+            raise
+
+        with self._writing():
+            # Remplacement de l'ancienne version du document
+            new_ids = set(chunk_ids)
+            previous = (self.registry.get(file_id) or {}).get('chunk_ids', [])
+            self._delete_chunks([i for i in previous if i not in new_ids])
+            self.registry.record(file_id, content_hash, chunk_ids, name=name, modified=modified,
+                                 chunk_tokens=chunk_tokens)
+        return len(chunk_ids)
+
+    def _index_batch(self, file_id, content_hash, pages, name, text_splitter, offset, trace):
+        """Découpe, vectorise et écrit un lot de pages ; retourne les ids et tailles des chunks"""
+        with metrics.span("split", trace):
+            splits = text_splitter.split_documents(pages)
+        metrics.increment("rag_chunks_total", len(splits), stage="split")
+        if not splits:
+            return [], []
+        chunk_ids = [f"{file_id}:{content_hash}:{offset + i}" for i in range(len(splits))]
+        tokens = []
+        for split, chunk_id in zip(splits, chunk_ids):
+            split.metadata["file_id"] = file_id
+            split.metadata["chunk_id"] = chunk_id
+            if name:
+                split.metadata["source"] = name
+            split.metadata.setdefault("tokens", count_tokens(split.page_content))
+            tokens.append(split.metadata["tokens"])
+            metrics.observe("rag_chunk_tokens", split.metadata["tokens"], buckets=TOKEN_BUCKETS)
+        # Les embeddings sont calculés hors du verrou d'écriture
+        with metrics.span("embed", trace):
+            vectors = self.embeddings.embed_documents([split.page_content for split in splits])
+        metrics.increment("rag_chunks_total", len(splits), stage="embed")
+
+        with self._writing(), metrics.span("upsert", trace):
+            self.vector_store.upsert(
+                ids=chunk_ids,
+                embeddings=vectors,
+                documents=[split.page_content for split in splits],
+                metadatas=[split.metadata for split in splits]
+            )
+            self.keyword_index.add(
+                chunk_ids,
+                [split.page_content for split in splits],
+                [split.metadata for split in splits]
+            )
+        return chunk_ids, tokens
+
+    def remove_documents(self, file_ids):
+        """Supprime de la base vectorielle les chunks des documents donnés (en un seul lot)"""
+        file_ids = list(file_ids)
+        if not file_ids:
+            return
+        with self._writing(), self.batch():
+            self._delete_chunks([
+                chunk_id for file_id in file_ids for chunk_id in self.registry.remove(file_id)
+            ])
+            self._save_keyword_index()
+
+    def prune_documents(self, existing_file_ids):
+        """Supprime les documents indexés qui n'existent plus dans le bucket.
+
+        `existing_file_ids` doit venir d'un listing complet et réussi : une
+        liste vide retire tous les documents.
+        """
+        existing = set(existing_file_ids)
+        with self._writing():
+            removed = [file_id for file_id in self.registry.file_ids() if file_id not in existing]
+            self.remove_documents(removed)
+        return removed
+
+    def _delete_chunks(self, chunk_ids):
+        if chunk_ids:
+            self.vector_store.delete(chunk_ids)
+            self.keyword_index.remove(chunk_ids)
+
+    def _make_retriever(self, file_ids=None, chunk_ids=None):
+        # Import différé : BaseRetriever tire tout le runtime LangChain (runnables, langsmith)
+        from hybrid_retriever import HybridRetriever
+        return HybridRetriever(
+            vector_store=self.vector_store,
+            keyword_index=self.keyword_index,
+            k=Config.RETRIEVAL_K,
+            fetch_k=Config.RETRIEVAL_FETCH_K,
+            vector_weight=Config.RRF_VECTOR_WEIGHT,
+            keyword_weight=Config.RRF_KEYWORD_WEIGHT,
+            rrf_k=Config.RRF_K,
+            file_ids=file_ids,
+            chunk_ids=chunk_ids
         )
 
-    def get_response(self, question, chat_history=[]):
+    def retriever_for(self, file_ids=None):
+        """Retriever limité aux documents donnés (tous si `file_ids` vaut None).
+
+        Le filtre s'applique à l'index partagé de la collection : changer de
+        sélection ne réindexe rien. Retourne None si aucun de ces documents
+        n'est indexé.
+        """
+        if file_ids is None:
+            return self.retriever
+        self.refresh()
+        indexed = [file_id for file_id in dict.fromkeys(file_ids) if self.registry.get(file_id)]
+        if not indexed:
+            return None
+        return self._make_retriever(file_ids=indexed, chunk_ids=self.registry.chunk_ids(indexed))
+
+    def build_retriever(self):
+        """(Re)construit le retriever hybride sur la collection courante"""
+        retriever = self._make_retriever()
+        with self._writing():
+            # Fin d'une ingestion : les index (BM25, IVF) sont persistés avec le retriever
+            self._save_keyword_index()
+            self.vector_store.persist()
+            self._retriever = retriever
+
+    def get_response(self, question, chat_history=[], temperature=None, file_ids=None):
         """Obtient une réponse à partir de la question et de l'historique"""
-        if not self.chain:
-            return "Veuillez d'abord charger des PDFs pour que je puisse répondre à vos questions."
-        
+        if not self.retriever_for(file_ids):
+            return NO_DOCUMENTS_MESSAGE
+
+        answer = []
+        response = {"sources": [], "stats": None}
+        with profiled("query"):
+            for kind, value in self.stream_response(question, chat_history, temperature, file_ids):
+                if kind == "token":
+                    answer.append(value)
+                else:
+                    response[kind] = value
+        response["answer"] = "".join(answer)
+        return response
+
+    def stream_response(self, question, chat_history=[], temperature=None, file_ids=None):
+        """Génère la réponse RAG au fil de l'eau.
+
+        Produit d'abord ("sources", [métadonnées]) dès la fin de la recherche,
+        puis des ("token", texte) à mesure qu'Ollama génère la réponse, et enfin
+        ("stats", {...}) : appels LLM, tokens estimés et durée de chaque étape.
+        `file_ids` limite la recherche aux chunks de ces documents.
+        """
+        retriever = self.retriever_for(file_ids)
+        if not retriever:
+            yield ("sources", [])
+            yield ("token", NO_DOCUMENTS_MESSAGE)
+            return
+
+        trace = metrics.start_trace("query")
+        stats = {
+            "llm_calls": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "condensed": False,
+            "cache_hit": False,
+            "timings": trace.timings
+        }
+        start = time.perf_counter()
         try:
-            result = self.chain({"question": question, "chat_history": chat_history})
-            return {
-                "answer": result["answer"],
-                "sources": [doc.metadata for doc in result["source_documents"]]
-            }
+            temperature = Config.TEMPERATURE if temperature is None else temperature
+            standalone_question = self._condense_question(question, chat_history, temperature, stats, trace)
+
+            # La question reformulée est autonome : elle peut servir de clé de cache
+            scope = cache_scope(
+                self.collection_name,
+                self.registry.version(file_ids),
+                self.model_name,
+                temperature,
+                settings={
+                    "chunking": self.chunk_policy,
+                    "retrieval": [Config.RETRIEVAL_K, Config.RETRIEVAL_FETCH_K, Config.RRF_K,
+                                  Config.RRF_VECTOR_WEIGHT, Config.RRF_KEYWORD_WEIGHT]
+                }
+            )
+            question_embedding = self.embeddings.embed_query(standalone_question)
+            cached = self.answer_cache.lookup(scope, standalone_question, question_embedding)
+            if cached is not None:
+                stats["cache_hit"] = True
+                yield ("sources", cached["sources"])
+                yield ("token", cached["answer"])
+            else:
+                with trace.span("retrieve"):
+                    documents = retriever.invoke(standalone_question)
+                sources = [doc.metadata for doc in documents]
+                yield ("sources", sources)
+
+                # Import différé : langchain est long à charger et inutile avant la première question
+                from langchain.chains.conversational_retrieval.prompts import QA_PROMPT
+                prompt = QA_PROMPT.format(
+                    context="\n\n".join(doc.page_content for doc in documents),
+                    question=standalone_question
+                )
+                step = time.perf_counter()
+                answer = []
+                with trace.span("generate"):
+                    for token in self.ollama.generate_stream(prompt, temperature):
+                        if not answer:
+                            trace.add("first_token", time.perf_counter() - start)
+                        answer.append(token)
+                        yield ("token", token)
+                answer = "".join(answer)
+                generate_seconds = time.perf_counter() - step
+                completion_tokens = estimate_tokens(answer)
+                if generate_seconds > 0:
+                    metrics.observe(
+                        "rag_generation_tokens_per_second",
+                        completion_tokens / generate_seconds,
+                        buckets=RATE_BUCKETS
+                    )
+                stats["llm_calls"] += 1
+                stats["prompt_tokens"] += estimate_tokens(prompt)
+                stats["completion_tokens"] += completion_tokens
+                self.answer_cache.store(scope, standalone_question, question_embedding, answer, sources)
         except Exception as e:
-            return f"Erreur lors de la génération de la réponse: {str(e)}"
+            yield ("token", f"Erreur lors de la génération de la réponse: {str(e)}")
 
-    def get_llm(self):
-        """Retourne une nouvelle instance du LLM avec la température actuelle"""
-        return OllamaLLM(
-            model=self.model_name,
-            temperature=st.session_state.temperature
-        )
+        metrics.increment("rag_tokens_total", stats["prompt_tokens"], direction="prompt")
+        metrics.increment("rag_tokens_total", stats["completion_tokens"], direction="completion")
+        trace.count("llm_calls", stats["llm_calls"])
+        trace.count("prompt_tokens", stats["prompt_tokens"])
+        trace.count("completion_tokens", stats["completion_tokens"])
+        trace.finish()
+        yield ("stats", stats)
+
+    def _condense_question(self, question, chat_history, temperature, stats, trace):
+        """Reformule la question en question autonome, seulement si nécessaire.
+
+        L'historique est borné à HISTORY_MAX_TOKENS ; la reformulation (un appel
+        LLM) est sautée si la question se suffit à elle-même ou si elle a déjà
+        été reformulée dans le même contexte.
+        """
+        history = trim_history(chat_history, Config.HISTORY_MAX_TOKENS)
+        if not history or is_self_contained(question):
+            return question
 
-    def get_direct_response(self, question):
+        history_text = format_history(history)
+        condensed = self.condense_cache.get(history_text, question)
+        if condensed is None:
+            from langchain.chains.conversational_retrieval.prompts import CONDENSE_QUESTION_PROMPT
+            prompt = CONDENSE_QUESTION_PROMPT.format(chat_history=history_text, question=question)
+            with trace.span("condense"):
+                condensed = self.ollama.generate(prompt, temperature).strip()
+            stats["llm_calls"] += 1
+            stats["prompt_tokens"] += estimate_tokens(prompt)
+            stats["completion_tokens"] += estimate_tokens(condensed)
+            self.condense_cache.put(history_text, question, condensed)
+        stats["condensed"] = True
+        return condensed
+
+    def get_direct_response(self, question, temperature=None):
         """Répond directement sans utiliser RAG"""
-        llm = self.get_llm()
         try:
-            response = llm(question)
-            return response
+            return self.ollama.generate(question, temperature)
         except Exception as e:
             return f"Erreur lors de la génération de la réponse: {str(e)}"
+
+    def stream_direct_response(self, question, temperature=None):
+        """Répond directement sans RAG, token par token"""
+        try:
+            for token in self.ollama.generate_stream(question, temperature):
+                yield token
+        except Exception as e:
+            yield f"Erreur lors de la génération de la réponse: {str(e)}"
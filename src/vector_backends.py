@@ -0,0 +1,777 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from langchain_core.documents import Document
+from config import Config
+import logging
+import math
+import numpy as np
+import os
+import pickle
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+_chroma_clients = {}
+_chroma_lock = threading.Lock()
+
+
+def shared_chroma_client(path=None):
+    """Client Chroma du processus pour un répertoire, créé (et chromadb importé) au premier usage"""
+    path = path or Config.CHROMA_PATH
+    with _chroma_lock:
+        if path not in _chroma_clients:
+            _chroma_clients[path] = SharedChromaClient(path, reopen_interval=Config.CHROMA_REOPEN_INTERVAL)
+        return _chroma_clients[path]
+
+
+class SharedChromaClient:
+    """Client Chroma d'un répertoire, partagé par toutes ses collections.
+
+    Un client garde les index HNSW en mémoire et ne voit pas les vecteurs
+    ajoutés depuis par les autres processus : `reopen` demande un client neuf,
+    qui relit le répertoire. Il est ouvert au premier `using` qui suit, et au
+    plus une fois toutes les `reopen_interval` secondes (en attendant, les
+    recherches portent sur les index déjà chargés). L'ancien système Chroma est
+    arrêté dès que plus aucune opération ne l'utilise.
+
+    `client` enveloppe un client chromadb déjà construit, qui n'est jamais rouvert.
+    """
+
+    def __init__(self, path=None, client=None, reopen_interval=0.0):
+        self.path = path
+        self.reopen_interval = reopen_interval
+        self._lock = threading.Lock()
+        self._stale = False
+        self._current = {"client": client, "system": None, "users": 0}
+        if client is None:
+            self._current = self._connect()
+
+    def _connect(self):
+        import chromadb
+        client = chromadb.PersistentClient(path=self.path)
+        self._opened_at = time.monotonic()
+        return {"client": client, "system": client._system, "users": 0}
+
+    def reopen(self):
+        if self.path is not None:
+            with self._lock:
+                self._stale = True
+
+    @contextmanager
+    def using(self):
+        """Client courant, gardé ouvert jusqu'à la fin de l'opération"""
+        with self._lock:
+            if self._stale and time.monotonic() - self._opened_at >= self.reopen_interval:
+                self._replace()
+            current = self._current
+            current["users"] += 1
+        try:
+            yield current["client"]
+        finally:
+            with self._lock:
+                current["users"] -= 1
+                if not current["users"] and current is not self._current:
+                    current["system"].stop()
+
+    def _replace(self):
+        from chromadb.api.client import SharedSystemClient
+
+        previous = self._current
+        # chromadb garde un système par répertoire : celui-ci doit être oublié
+        # pour qu'un nouveau client relise le répertoire
+        identifier = previous["client"]._identifier
+        SharedSystemClient._identifier_to_system.pop(identifier, None)
+        SharedSystemClient._identifier_to_refcount.pop(identifier, None)
+        self._current = self._connect()
+        self._stale = False
+        if not previous["users"]:
+            previous["system"].stop()
+
+
+def create_vector_backend(collection_name, embeddings, chroma_client=None, kind=None):
+    """Construit la base vectorielle d'une collection selon VECTOR_BACKEND"""
+    kind = kind or Config.VECTOR_BACKEND
+    if kind == "chroma":
+        if chroma_client is not None and not isinstance(chroma_client, SharedChromaClient):
+            chroma_client = SharedChromaClient(client=chroma_client)
+        return ChromaBackend(chroma_client or shared_chroma_client(), collection_name, embeddings)
+    if kind == "numpy":
+        return NumpyBackend(
+            os.path.join(Config.VECTOR_DIR, collection_name),
+            embeddings,
+            dtype=Config.VECTOR_DTYPE,
+            index=Config.VECTOR_INDEX,
+            ivf_threshold=Config.VECTOR_IVF_THRESHOLD,
+            nprobe=Config.VECTOR_IVF_NPROBE
+        )
+    raise ValueError(f"Base vectorielle inconnue: {kind}")
+
+
+class ChromaBackend:
+    """Collection Chroma, via le vector store LangChain.
+
+    Le parcours HNSW filtré de Chroma est lent et peu précis sur un petit
+    sous-ensemble : une recherche limitée à des documents (`file_ids`) est
+    faite exactement sur leurs vecteurs, relus une fois depuis Chroma puis
+    gardés en mémoire par document (au plus `exact_filter_limit` vecteurs,
+    invalidés à chaque écriture). Au-delà, le filtre est délégué à Chroma.
+
+    `client` est un `SharedChromaClient` : chaque opération passe par
+    `_using`, qui rattache le vector store au client courant.
+    """
+
+    def __init__(self, client, collection_name, embeddings, exact_filter_limit=5000):
+        self.client = client
+        self.collection_name = collection_name
+        self.embeddings = embeddings
+        self.exact_filter_limit = exact_filter_limit
+        self._lock = threading.Lock()
+        self._store = None
+        self._store_client = None
+        self._file_cache = OrderedDict()
+        self._cached_rows = 0
+
+    @contextmanager
+    def _using(self):
+        """Vector store LangChain de la collection sur le client courant"""
+        from langchain_community.vectorstores import Chroma
+
+        with self.client.using() as client:
+            with self._lock:
+                if self._store is None or self._store_client is not client:
+                    self._store = Chroma(
+                        client=client,
+                        collection_name=self.collection_name,
+                        embedding_function=self.embeddings
+                    )
+                    self._store_client = client
+                store = self._store
+            yield store
+
+    def count(self):
+        with self._using() as store:
+            return store._collection.count()
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self._invalidate({metadata.get("file_id") for metadata in metadatas})
+        with self._using() as store:
+            store._collection.upsert(
+                ids=ids,
+                embeddings=embeddings,
+                documents=documents,
+                metadatas=metadatas
+            )
+
+    def delete(self, ids):
+        if ids:
+            deleted = set(ids)
+            with self._lock:
+                stale = [
+                    file_id for file_id, entry in self._file_cache.items()
+                    if not deleted.isdisjoint(entry[0])
+                ]
+            self._invalidate(stale)
+            with self._using() as store:
+                store.delete(ids=ids)
+
+    def get_all(self):
+        """Retourne (ids, textes, métadonnées) de tous les chunks"""
+        with self._using() as store:
+            data = store._collection.get(include=["documents", "metadatas"])
+        return data["ids"], data["documents"], data["metadatas"]
+
+    def get(self, ids):
+        """Retourne (ids, textes, métadonnées) des chunks présents parmi `ids`"""
+        if not ids:
+            return [], [], []
+        with self._using() as store:
+            data = store._collection.get(ids=list(ids), include=["documents", "metadatas"])
+        return data["ids"], data["documents"], data["metadatas"]
+
+    def refresh(self):
+        """Reprend la collection après une écriture d'un autre processus : elle a pu
+        être recréée (le vector store est rattaché à nouveau) et ses index HNSW
+        doivent être relus (le client partagé sera rouvert)"""
+        self.client.reopen()
+        with self._lock:
+            self._store = None
+            self._file_cache.clear()
+            self._cached_rows = 0
+
+    def similarity_search(self, query, k=4, file_ids=None):
+        if file_ids is None:
+            with self._using() as store:
+                return store.similarity_search(query, k=k)
+        if not file_ids:
+            return []
+        entries = self._file_vectors(list(dict.fromkeys(file_ids)))
+        if entries is None:
+            with self._using() as store:
+                return store.similarity_search(
+                    query, k=k, filter={"file_id": {"$in": list(file_ids)}}
+                )
+        if not entries:
+            return []
+        vectors = np.concatenate([entry[1] for entry in entries])
+        chunks = [chunk for entry in entries for chunk in entry[2]]
+        embedding = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        scores = vectors @ embedding
+        top = np.argsort(-scores)[:k]
+        return [Document(page_content=chunks[i][0], metadata=dict(chunks[i][1])) for i in top]
+
+    def _file_vectors(self, file_ids):
+        """(ids, vecteurs normalisés, [(texte, métadonnées)]) de chaque document,
+        ou None si le sous-ensemble dépasse `exact_filter_limit`"""
+        with self._lock:
+            cached = {file_id: self._file_cache.get(file_id) for file_id in file_ids}
+            for file_id in file_ids:
+                if cached[file_id] is not None:
+                    self._file_cache.move_to_end(file_id)
+        missing = [file_id for file_id, entry in cached.items() if entry is None]
+        if sum(len(entry[0]) for entry in cached.values() if entry) > self.exact_filter_limit:
+            return None
+        if missing:
+            with self._using() as store:
+                data = store._collection.get(
+                    where={"file_id": {"$in": missing}},
+                    include=["embeddings", "documents", "metadatas"]
+                )
+            if len(data["ids"]) > self.exact_filter_limit:
+                return None
+            grouped = {file_id: ([], [], []) for file_id in missing}
+            for chunk_id, vector, text, metadata in zip(
+                data["ids"], data["embeddings"], data["documents"], data["metadatas"]
+            ):
+                ids, vectors, chunks = grouped[metadata["file_id"]]
+                ids.append(chunk_id)
+                vectors.append(vector)
+                chunks.append((text, metadata))
+            for file_id, (ids, vectors, chunks) in grouped.items():
+                vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1)
+                vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+                cached[file_id] = (set(ids), vectors, chunks)
+            self._remember({file_id: cached[file_id] for file_id in missing})
+        return [cached[file_id] for file_id in file_ids if cached[file_id][0]]
+
+    def _remember(self, entries):
+        with self._lock:
+            for file_id, entry in entries.items():
+                previous = self._file_cache.pop(file_id, None)
+                if previous is not None:
+                    self._cached_rows -= len(previous[0])
+                self._file_cache[file_id] = entry
+                self._cached_rows += len(entry[0])
+            # Le cache garde les sélections récentes, dans la limite de quelques sous-ensembles
+            while self._cached_rows > 4 * self.exact_filter_limit and len(self._file_cache) > 1:
+                _, evicted = self._file_cache.popitem(last=False)
+                self._cached_rows -= len(evicted[0])
+
+    def _invalidate(self, file_ids):
+        with self._lock:
+            for file_id in file_ids:
+                entry = self._file_cache.pop(file_id, None)
+                if entry is not None:
+                    self._cached_rows -= len(entry[0])
+
+    def reset(self):
+        with self._using() as store:
+            store.delete_collection()
+        with self._lock:
+            self._store = None
+            self._file_cache.clear()
+            self._cached_rows = 0
+
+    def persist(self):
+        # Chroma écrit au fil de l'eau
+        pass
+
+
+class NumpyBackend:
+    """Base vectorielle en processus : vecteurs quantifiés, mappés en mémoire.
+
+    Les vecteurs sont normalisés (similarité cosinus) puis stockés en float16,
+    en int8 (une échelle par vecteur) ou en float32 dans un fichier lu par
+    `np.memmap` : seules les pages parcourues occupent la RAM. Textes et
+    métadonnées sont gardés en mémoire et journalisés dans un fichier
+    d'opérations (ajouts, suppressions) rejoué au chargement ; les suppressions
+    laissent des trous récupérés par compaction.
+
+    La recherche est exacte (produits matriciels par blocs de `block_rows`
+    vecteurs) ou, au-delà de `ivf_threshold` vecteurs (`index="auto"`), passe
+    par un index IVF : k-means sur les vecteurs, puis seules les `nprobe`
+    listes dont le centroïde est le plus proche de la requête sont parcourues.
+    Une recherche restreinte à des documents (`file_ids`) ne parcourt que
+    leurs lignes, retrouvées par un index file_id -> lignes tenu en mémoire.
+
+    Plusieurs processus peuvent ouvrir le même répertoire, à condition de
+    sérialiser leurs écritures (verrou de collection) : chaque écriture, et
+    `refresh`, rejoue d'abord les opérations journalisées par les autres.
+    """
+
+    DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+    def __init__(self, directory, embeddings=None, dtype="float16", index="auto",
+                 ivf_threshold=50000, nprobe=16, block_rows=8192):
+        if dtype not in self.DTYPES:
+            raise ValueError(f"Type de vecteur non supporté: {dtype}")
+        self.directory = directory
+        self.embeddings = embeddings
+        self.dtype = dtype
+        self.index = index
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        self.block_rows = block_rows
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+        self._vectors_path = os.path.join(directory, f"vectors.{dtype}")
+        self._log_path = os.path.join(directory, "log.pkl")
+        self._ivf_path = os.path.join(directory, "ivf.npz")
+        self._clear_state()
+        self._load()
+
+    # -- stockage ---------------------------------------------------------
+
+    def _clear_state(self):
+        self.dimension = None
+        self._size = 0
+        self._capacity = 0
+        self._vectors = None
+        self._scales = np.zeros(0, dtype=np.float32)
+        self._live = np.zeros(0, dtype=bool)
+        self._ids = []
+        self._texts = []
+        self._metadatas = []
+        self._rows = {}
+        self._file_rows = {}
+        self._ivf = None
+        # Position du journal déjà appliquée, et inode du fichier lu (change après une compaction)
+        self._log_offset = 0
+        self._log_inode = None
+
+    def _load(self):
+        if not os.path.exists(self._log_path):
+            return
+        self._replay()
+        self._load_ivf()
+
+    def _replay(self):
+        """Applique les opérations journalisées depuis la dernière lecture"""
+        with open(self._log_path, 'rb') as f:
+            self._log_inode = os.fstat(f.fileno()).st_ino
+            f.seek(self._log_offset)
+            while True:
+                try:
+                    record = pickle.load(f)
+                except EOFError:
+                    break
+                except (pickle.UnpicklingError, ValueError, TypeError) as e:
+                    # Opération incomplète : ignorée, et écrasée par la prochaine écriture
+                    logger.warning(f"Journal vectoriel tronqué ({self._log_path}): {e}")
+                    break
+                self._apply(record)
+                self._log_offset = f.tell()
+
+    def _apply(self, record):
+        kind = record[0]
+        if kind == "init":
+            self.dimension = record[1]
+            self._open_vectors()
+        elif kind == "add":
+            _, start, ids, texts, metadatas, scales = record
+            self._append_rows(start, ids, texts, metadatas, scales)
+        elif kind == "delete":
+            self._delete_rows(record[1])
+
+    def _open_vectors(self):
+        row_bytes = self.dimension * np.dtype(self.DTYPES[self.dtype]).itemsize
+        if not os.path.exists(self._vectors_path):
+            open(self._vectors_path, 'wb').close()
+        self._capacity = os.path.getsize(self._vectors_path) // row_bytes
+        self._map()
+
+    def _map(self):
+        if self._capacity:
+            self._vectors = np.memmap(
+                self._vectors_path,
+                dtype=self.DTYPES[self.dtype],
+                mode='r+',
+                shape=(self._capacity, self.dimension)
+            )
+        else:
+            self._vectors = None
+        self._scales = np.resize(self._scales, self._capacity)
+        live = np.zeros(self._capacity, dtype=bool)
+        live[:len(self._live)] = self._live[:self._capacity]
+        self._live = live
+
+    def _reserve(self, rows):
+        if self._size + rows <= self._capacity:
+            return
+        row_bytes = self.dimension * np.dtype(self.DTYPES[self.dtype]).itemsize
+        if self._vectors is not None:
+            self._vectors.flush()
+        # Le fichier a pu être agrandi par un autre processus : il ne doit pas rétrécir
+        capacity = os.path.getsize(self._vectors_path) // row_bytes
+        if capacity < self._size + rows:
+            capacity = max(1024, self._capacity * 2, self._size + rows)
+            with open(self._vectors_path, 'r+b') as f:
+                f.truncate(capacity * row_bytes)
+        self._capacity = capacity
+        self._map()
+
+    def _log(self, record):
+        with open(self._log_path, 'ab') as f:
+            if f.tell() > self._log_offset:
+                # Fin de journal incomplète (écriture interrompue)
+                f.truncate(self._log_offset)
+            pickle.dump(record, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+            self._log_offset = f.tell()
+            self._log_inode = os.fstat(f.fileno()).st_ino
+
+    def _append_rows(self, start, ids, texts, metadatas, scales):
+        stop = start + len(ids)
+        if stop > self._capacity:
+            self._reserve(stop - self._size)
+        for offset, chunk_id in enumerate(ids):
+            previous = self._rows.get(chunk_id)
+            if previous is not None:
+                self._live[previous] = False
+                self._forget_file_row(previous)
+            self._rows[chunk_id] = start + offset
+            file_id = metadatas[offset].get("file_id")
+            if file_id is not None:
+                self._file_rows.setdefault(file_id, set()).add(start + offset)
+        self._ids.extend(ids)
+        self._texts.extend(texts)
+        self._metadatas.extend(metadatas)
+        if scales is not None:
+            self._scales[start:stop] = scales
+        self._live[start:stop] = True
+        self._size = stop
+
+    def _delete_rows(self, ids):
+        for chunk_id in ids:
+            row = self._rows.pop(chunk_id, None)
+            if row is not None:
+                self._live[row] = False
+                self._forget_file_row(row)
+                self._texts[row] = None
+                self._metadatas[row] = None
+
+    def _forget_file_row(self, row):
+        file_id = self._metadatas[row].get("file_id")
+        rows = self._file_rows.get(file_id)
+        if rows is not None:
+            rows.discard(row)
+            if not rows:
+                del self._file_rows[file_id]
+
+    def _quantize(self, vectors):
+        if self.dtype == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+        return vectors.astype(self.DTYPES[self.dtype]), None
+
+    # -- API commune aux backends ----------------------------------------
+
+    def count(self):
+        with self._lock:
+            return len(self._rows)
+
+    def refresh(self):
+        """Rattrape les écritures faites par un autre processus depuis la dernière lecture"""
+        with self._lock:
+            try:
+                inode = os.stat(self._log_path).st_ino
+            except FileNotFoundError:
+                inode = None
+            if inode != self._log_inode:
+                # Base vidée ou compactée ailleurs : relecture complète
+                self._clear_state()
+                self._load()
+            elif inode is not None and os.path.getsize(self._log_path) > self._log_offset:
+                size = self._size
+                self._replay()
+                if self._ivf is not None:
+                    self._ivf["pending"].extend(range(size, self._size))
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        if not ids:
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors = vectors / norms
+        with self._lock:
+            self.refresh()
+            if self.dimension is None:
+                self.dimension = vectors.shape[1]
+                self._log(("init", self.dimension))
+                self._open_vectors()
+            elif vectors.shape[1] != self.dimension:
+                raise ValueError(
+                    f"Dimension {vectors.shape[1]} incompatible avec la collection ({self.dimension})"
+                )
+            quantized, scales = self._quantize(vectors)
+            start = self._size
+            self._reserve(len(ids))
+            # Les vecteurs sont écrits avant le journal, qui fait foi
+            self._vectors[start:start + len(ids)] = quantized
+            self._vectors.flush()
+            record = ("add", start, list(ids), list(documents), [dict(m) for m in metadatas],
+                      None if scales is None else scales.tolist())
+            self._log(record)
+            self._apply(record)
+            if self._ivf is not None:
+                self._ivf["pending"].extend(range(start, start + len(ids)))
+
+    def delete(self, ids):
+        if not ids:
+            return
+        with self._lock:
+            self.refresh()
+            ids = [chunk_id for chunk_id in ids if chunk_id in self._rows]
+            if not ids:
+                return
+            self._log(("delete", ids))
+            self._delete_rows(ids)
+            dead = self._size - len(self._rows)
+            if dead > 1024 and dead > len(self._rows):
+                self._compact()
+
+    def get_all(self):
+        with self._lock:
+            rows = sorted(self._rows.values())
+            return (
+                [self._ids[row] for row in rows],
+                [self._texts[row] for row in rows],
+                [self._metadatas[row] for row in rows]
+            )
+
+    def get(self, ids):
+        """Retourne (ids, textes, métadonnées) des chunks présents parmi `ids`"""
+        with self._lock:
+            rows = [self._rows[chunk_id] for chunk_id in ids if chunk_id in self._rows]
+            return (
+                [self._ids[row] for row in rows],
+                [self._texts[row] for row in rows],
+                [self._metadatas[row] for row in rows]
+            )
+
+    def similarity_search(self, query, k=4, file_ids=None):
+        return self.similarity_search_by_vector(self.embeddings.embed_query(query), k=k, file_ids=file_ids)
+
+    def similarity_search_by_vector(self, embedding, k=4, file_ids=None):
+        with self._lock:
+            results = [
+                (self._texts[row], self._metadatas[row])
+                for row, _ in self.search(embedding, k, file_ids=file_ids)
+            ]
+        return [Document(page_content=text, metadata=dict(metadata)) for text, metadata in results]
+
+    def reset(self):
+        with self._lock:
+            for path in (self._log_path, self._vectors_path, self._ivf_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._clear_state()
+
+    def persist(self):
+        with self._lock:
+            # Fin d'une ingestion : l'IVF est (re)construit ici plutôt qu'à la première requête
+            if self._rows and self._use_ivf() and self._ivf_stale():
+                self._build_ivf()
+            if self._ivf is not None and self._ivf.get("dirty"):
+                self._save_ivf()
+
+    # -- recherche ---------------------------------------------------------
+
+    def search(self, embedding, k=4, file_ids=None):
+        """Retourne les `k` meilleurs (ligne, similarité cosinus).
+
+        Avec `file_ids`, seuls les chunks de ces documents sont comparés : le
+        coût suit la taille du sous-ensemble, pas celle de la collection.
+        """
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        with self._lock:
+            if not self._rows:
+                return []
+            if file_ids is not None:
+                rows = self._rows_of(file_ids)
+                if self._use_ivf() and len(rows) >= self.ivf_threshold:
+                    candidates = self._ivf_candidates(query)
+                    rows = candidates[np.isin(candidates, rows, assume_unique=True)]
+                scores = self._score_rows(rows, query)
+            elif self._use_ivf():
+                rows = self._ivf_candidates(query)
+                scores = self._score_rows(rows, query)
+            else:
+                rows, scores = self._exact_scores(query)
+        if not len(rows):
+            return []
+        if len(rows) > k:
+            top = np.argpartition(-scores, k)[:k]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores)
+        return [(int(rows[i]), float(scores[i])) for i in order]
+
+    def _rows_of(self, file_ids):
+        """Lignes vivantes des documents donnés, dans l'ordre du fichier"""
+        rows = [row for file_id in set(file_ids) for row in self._file_rows.get(file_id, ())]
+        return np.sort(np.asarray(rows, dtype=np.int64))
+
+    def _use_ivf(self):
+        if self.index == "exact":
+            return False
+        if self.index == "ivf":
+            return True
+        return len(self._rows) >= self.ivf_threshold
+
+    def _dequantize(self, block, rows):
+        block = block.astype(np.float32)
+        if self.dtype == "int8":
+            block *= self._scales[rows][:, None]
+        return block
+
+    def _exact_scores(self, query):
+        """Similarité avec tous les vecteurs vivants, bloc par bloc"""
+        all_rows, all_scores = [], []
+        for start in range(0, self._size, self.block_rows):
+            stop = min(start + self.block_rows, self._size)
+            live = np.flatnonzero(self._live[start:stop]) + start
+            if not len(live):
+                continue
+            block = self._vectors[start:stop]
+            scores = block.astype(np.float32) @ query
+            if self.dtype == "int8":
+                scores *= self._scales[start:stop]
+            all_rows.append(live)
+            all_scores.append(scores[live - start])
+        return np.concatenate(all_rows), np.concatenate(all_scores)
+
+    def _score_rows(self, rows, query):
+        scores = np.empty(len(rows), dtype=np.float32)
+        for start in range(0, len(rows), self.block_rows):
+            part = rows[start:start + self.block_rows]
+            scores[start:start + len(part)] = self._dequantize(self._vectors[part], part) @ query
+        return scores
+
+    # -- index IVF ---------------------------------------------------------
+
+    def _ivf_candidates(self, query):
+        if self._ivf_stale():
+            self._build_ivf()
+        ivf = self._ivf
+        centroid_scores = ivf["centroids"] @ query
+        nprobe = min(self.nprobe, len(centroid_scores))
+        probes = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        offsets = ivf["offsets"]
+        parts = [ivf["order"][offsets[c]:offsets[c + 1]] for c in probes]
+        # Les vecteurs ajoutés depuis la construction sont parcourus exhaustivement
+        parts.append(np.asarray(ivf["pending"], dtype=np.int64))
+        # Lecture du memmap dans l'ordre du fichier
+        rows = np.sort(np.concatenate(parts))
+        return rows[self._live[rows]]
+
+    def _ivf_stale(self):
+        """Pas d'IVF, ou trop de vecteurs ajoutés depuis sa construction (parcourus exhaustivement)"""
+        ivf = self._ivf
+        return ivf is None or len(ivf["pending"]) > 0.2 * max(1, ivf["covered"])
+
+    def _build_ivf(self, iterations=10, seed=0):
+        rows = np.flatnonzero(self._live[:self._size])
+        nlist = max(1, min(4096, int(math.sqrt(len(rows)))))
+        rng = np.random.default_rng(seed)
+        sample = rows if len(rows) <= 256 * nlist else np.sort(rng.choice(rows, 256 * nlist, replace=False))
+        data = self._dequantize(self._vectors[sample], sample)
+        centroids = data[rng.choice(len(data), nlist, replace=False)]
+        for _ in range(iterations):
+            assign = np.argmax(data @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = data[assign == c]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    centroids[c] = centroid / (np.linalg.norm(centroid) or 1.0)
+
+        assign = np.empty(len(rows), dtype=np.int32)
+        for start in range(0, len(rows), self.block_rows):
+            part = rows[start:start + self.block_rows]
+            assign[start:start + len(part)] = np.argmax(
+                self._dequantize(self._vectors[part], part) @ centroids.T, axis=1
+            )
+        self._set_ivf(centroids, rows, assign, covered=self._size)
+        self._ivf["dirty"] = True
+        logger.info(f"Index IVF construit: {len(rows)} vecteurs, {nlist} listes")
+
+    def _set_ivf(self, centroids, rows, assign, covered):
+        order = np.argsort(assign, kind='stable')
+        self._ivf = {
+            "centroids": centroids.astype(np.float32),
+            "order": rows[order],
+            "offsets": np.searchsorted(assign[order], np.arange(len(centroids) + 1)),
+            "covered": covered,
+            "pending": list(range(covered, self._size)),
+            "dirty": False
+        }
+
+    def _save_ivf(self):
+        ivf = self._ivf
+        # Chaque ligne couverte est retrouvée avec sa liste pour pouvoir recharger l'index
+        assign = np.repeat(np.arange(len(ivf["centroids"])), np.diff(ivf["offsets"]))
+        tmp_path = f"{self._ivf_path}.tmp.npz"
+        np.savez(tmp_path, centroids=ivf["centroids"], rows=ivf["order"], assign=assign,
+                 covered=ivf["covered"])
+        os.replace(tmp_path, self._ivf_path)
+        ivf["dirty"] = False
+
+    def _load_ivf(self):
+        if not os.path.exists(self._ivf_path) or self.dimension is None:
+            return
+        try:
+            data = np.load(self._ivf_path)
+            if data["centroids"].shape[1] != self.dimension or int(data["covered"]) > self._size:
+                return
+            self._set_ivf(data["centroids"], data["rows"], data["assign"], int(data["covered"]))
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning(f"Index IVF illisible ({self._ivf_path}), il sera reconstruit: {e}")
+
+    def _compact(self):
+        """Réécrit vecteurs et journal sans les lignes supprimées"""
+        rows = np.asarray(sorted(self._rows.values()), dtype=np.int64)
+        ids = [self._ids[row] for row in rows]
+        texts = [self._texts[row] for row in rows]
+        metadatas = [self._metadatas[row] for row in rows]
+        scales = self._scales[rows].tolist() if self.dtype == "int8" else None
+
+        tmp_vectors = f"{self._vectors_path}.tmp"
+        compacted = np.memmap(tmp_vectors, dtype=self.DTYPES[self.dtype], mode='w+',
+                              shape=(max(1, len(rows)), self.dimension))
+        for start in range(0, len(rows), self.block_rows):
+            part = rows[start:start + self.block_rows]
+            compacted[start:start + len(part)] = self._vectors[part]
+        compacted.flush()
+        del compacted
+
+        tmp_log = f"{self._log_path}.tmp"
+        with open(tmp_log, 'wb') as f:
+            pickle.dump(("init", self.dimension), f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(("add", 0, ids, texts, metadatas, scales), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_vectors, self._vectors_path)
+        os.replace(tmp_log, self._log_path)
+        if os.path.exists(self._ivf_path):
+            os.remove(self._ivf_path)
+
+        dimension = self.dimension
+        self._clear_state()
+        self.dimension = dimension
+        self._open_vectors()
+        self._append_rows(0, ids, texts, metadatas, scales)
+        stat = os.stat(self._log_path)
+        self._log_offset, self._log_inode = stat.st_size, stat.st_ino
+        logger.debug(f"Base vectorielle compactée: {len(ids)} vecteurs")
@@ -0,0 +1,12 @@
+"""Configuration commune des tests : modules de `src` (et aides des benchmarks)
+importables, stockage dans un dossier temporaire plutôt que dans `storage/`."""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'src'), os.path.join(ROOT, 'src', 'benchmarks')]
+# Avant tout import de `config`, qui lit l'environnement une seule fois
+os.environ['STORAGE_DIR'] = tempfile.mkdtemp(prefix='rag-tests-')
+os.environ.setdefault('VECTOR_BACKEND', 'numpy')
+os.environ['OLLAMA_WARMUP'] = '0'
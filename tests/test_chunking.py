@@ -0,0 +1,67 @@
+import random
+
+import pytest
+
+from chunking import StructuredSplitter, count_tokens, parse_blocks
+
+WORDS = "le contrat prend effet au premier jour du mois suivant la signature des parties".split()
+HEADINGS = ["ARTICLE 1 - OBJET", "Chapitre II", "1.2 Conditions générales", "A) Tarifs"]
+
+
+def paragraph(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def random_page(rng):
+    lines = []
+    for _ in range(rng.randint(1, 10)):
+        kind = rng.random()
+        if kind < 0.3:
+            lines.append(rng.choice(HEADINGS))
+        elif kind < 0.45:
+            lines.append("Poste     Montant     Échéance")
+            lines += [f"{paragraph(rng, rng.randint(1, 8))}     {rng.randint(1, 999)}     mars"
+                      for _ in range(rng.randint(2, 30))]
+        elif kind < 0.5:
+            lines.append("https://exemple.fr/" + "x" * rng.randint(50, 600))
+        else:
+            lines.append(paragraph(rng, rng.randint(1, 400)))
+        lines.append("")
+    return "\n".join(lines)
+
+
+@pytest.mark.parametrize("max_tokens,min_tokens,overlap_tokens", [
+    (64, 16, 8), (256, 64, 32), (32, 8, 4), (8, 2, 1)
+])
+def test_chunks_never_exceed_max_tokens(max_tokens, min_tokens, overlap_tokens):
+    rng = random.Random(max_tokens)
+    splitter = StructuredSplitter(max_tokens, min_tokens, overlap_tokens)
+    for _ in range(100):
+        for text, _ in splitter.split_text(random_page(rng)):
+            assert count_tokens(text) <= max_tokens
+
+
+def test_repeated_heading_counts_against_the_limit():
+    rng = random.Random(0)
+    text = "ARTICLE 1 - OBJET\n\n" + paragraph(rng, 301)
+    chunks = StructuredSplitter(64, 16, 8).split_text(text)
+    assert len(chunks) > 1
+    for chunk, section in chunks:
+        assert chunk.startswith("ARTICLE 1 - OBJET\n\n")
+        assert section == "ARTICLE 1 - OBJET"
+        assert count_tokens(chunk) <= 64
+
+
+def test_table_rows_keep_their_header():
+    rows = [f"Ligne {i}     {i * 10}     euros" for i in range(80)]
+    text = "\n".join(["Poste     Montant     Devise"] + rows)
+    chunks = StructuredSplitter(64, 16, 8).split_text(text)
+    assert len(chunks) > 1
+    for chunk, _ in chunks:
+        assert chunk.startswith("Poste     Montant     Devise")
+        assert count_tokens(chunk) <= 64
+
+
+def test_parse_blocks_recognizes_structure():
+    text = "CHAPITRE 1\n\nUn paragraphe de texte.\n\nNom     Valeur\nA     1\nB     2"
+    assert [block.kind for block in parse_blocks(text)] == ["heading", "paragraph", "table"]
@@ -0,0 +1,58 @@
+from document_registry import DocumentRegistry
+
+
+def test_record_and_remove(tmp_path):
+    registry = DocumentRegistry(str(tmp_path / "collection.json"))
+    empty = registry.version()
+    registry.record("a", "h1", ["a:h1:0", "a:h1:1"], name="a.pdf", chunk_tokens=[10, 30])
+    assert registry.is_current("a", "h1")
+    assert not registry.is_current("a", "h2")
+    assert registry.chunk_ids(["a", "inconnu"]) == {"a:h1:0", "a:h1:1"}
+    assert registry.get("a")["max_tokens"] == 30
+    assert registry.version() != empty
+
+    assert registry.remove("a") == ["a:h1:0", "a:h1:1"]
+    assert registry.remove("a") == []
+    assert registry.version() == empty
+
+
+def test_version_of_a_subset(tmp_path):
+    registry = DocumentRegistry(str(tmp_path / "collection.json"))
+    registry.record("a", "h1", ["a:0"])
+    registry.record("b", "h1", ["b:0"])
+    before = registry.version(["a"])
+    registry.record("b", "h2", ["b:1"])
+    assert registry.version(["a"]) == before
+    registry.record("a", "h2", ["a:1"])
+    assert registry.version(["a"]) != before
+
+
+def test_other_instance_sees_changes(tmp_path):
+    path = str(tmp_path / "collection.json")
+    writer = DocumentRegistry(path)
+    reader = DocumentRegistry(path)
+    writer.record("a", "h1", ["a:0"])
+    assert reader.changed()
+    reader.reload()
+    assert not reader.changed()
+    assert reader.file_ids() == ["a"]
+
+
+def test_hold_saves_once_and_keeps_pending_changes(tmp_path):
+    path = str(tmp_path / "collection.json")
+    registry = DocumentRegistry(path)
+    other = DocumentRegistry(path)
+    registry.hold()
+    registry.record("a", "h1", ["a:0"])
+    registry.record("b", "h1", ["b:0"])
+    assert not registry.exists
+
+    # Écriture d'un autre processus pendant le lot : relue sans perdre le lot
+    other.record("c", "h1", ["c:0"])
+    registry.reload()
+    assert sorted(registry.file_ids()) == ["a", "b", "c"]
+
+    registry.remove("b")
+    registry.release()
+    assert not registry.held
+    assert sorted(DocumentRegistry(path).file_ids()) == ["a", "c"]
@@ -0,0 +1,26 @@
+import pytest
+
+from drive_handler import GoogleDriveHandler
+from fake_drive import FakeDriveService
+from synthetic_pdfs import generate_corpus
+
+
+@pytest.fixture
+def drive_handler():
+    return GoogleDriveHandler(service=FakeDriveService())
+
+
+def test_listing(drive_handler, tmp_path):
+    paths, _ = generate_corpus(str(tmp_path), documents=2, pages=1)
+    for path in paths:
+        drive_handler.upload_pdf(path)
+    listed = drive_handler.list_public_pdfs(force_refresh=True)
+    assert sorted(pdf['name'] for pdf in listed) == ["document-00000.pdf", "document-00001.pdf"]
+
+
+def test_failed_listing_is_not_an_empty_folder(drive_handler, monkeypatch):
+    def unavailable(force_refresh=False):
+        raise ConnectionError("Drive injoignable")
+
+    monkeypatch.setattr(drive_handler.listing, "list", unavailable)
+    assert drive_handler.list_public_pdfs(force_refresh=True) is None
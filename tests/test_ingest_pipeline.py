@@ -0,0 +1,61 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import ingest_pipeline
+import page_extraction
+from drive_handler import GoogleDriveHandler
+from fake_drive import FakeDriveService
+from fake_ollama import FakeOllamaServer
+from ingest_pipeline import IngestPipeline
+from ollama_client import OllamaClient
+from page_extraction import PageExtractor
+from rag_handler import RAGHandler
+from synthetic_pdfs import generate_corpus
+
+
+@pytest.fixture
+def stuck_parser(monkeypatch):
+    """Extraction bloquée (processus enfant figé sur un verrou hérité)"""
+    release = threading.Event()
+
+    def extract_pages(pdf_path, page_numbers, mode):
+        release.wait(30)
+        raise RuntimeError("débloqué")
+
+    monkeypatch.setattr(page_extraction, "extract_pages", extract_pages)
+    monkeypatch.setattr(ingest_pipeline, "create_parse_pool", lambda workers: ThreadPoolExecutor(workers))
+    yield
+    release.set()
+
+
+def test_pipeline_fails_stuck_extractions(tmp_path, stuck_parser):
+    paths, _ = generate_corpus(str(tmp_path / "pdfs"), documents=2, pages=1)
+    drive_handler = GoogleDriveHandler(service=FakeDriveService())
+    for path in paths:
+        drive_handler.upload_pdf(path)
+    stages = []
+    with FakeOllamaServer() as server:
+        rag_handler = RAGHandler(collection_name="stuck",
+                                 ollama_client=OllamaClient(host=server.url, chat_model="bench"))
+        pipeline = IngestPipeline(drive_handler, rag_handler, parse_workers=2, parse_timeout=0.5)
+        indexed = pipeline.run(
+            drive_handler.list_public_pdfs(force_refresh=True),
+            on_progress=lambda pdf, stage, detail: stages.append((pdf["name"], stage))
+        )
+    assert indexed == 0
+    assert sorted(name for name, stage in stages if stage == "error") == ["document-00000.pdf", "document-00001.pdf"]
+    assert rag_handler.registry.file_ids() == []
+
+
+def test_extract_times_out(tmp_path, stuck_parser):
+    paths, _ = generate_corpus(str(tmp_path / "pdfs"), documents=1, pages=1)
+    pool = ThreadPoolExecutor(1)
+    extractor = PageExtractor(cache=page_extraction.PageCache(str(tmp_path / "pages.sqlite")),
+                              pool=pool, timeout=0.2)
+    try:
+        with pytest.raises(TimeoutError):
+            extractor.extract(paths[0], "hash")
+    finally:
+        pool.shutdown(wait=False)
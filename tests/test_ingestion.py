@@ -0,0 +1,60 @@
+"""Ingestion de bout en bout : PDFs synthétiques, embeddings du faux serveur Ollama"""
+import os
+
+import pytest
+
+from fake_ollama import FakeOllamaServer
+from ollama_client import OllamaClient
+from rag_handler import RAGHandler
+from synthetic_pdfs import generate_corpus
+
+
+@pytest.fixture(scope="module")
+def ollama():
+    with FakeOllamaServer() as server:
+        yield server
+
+
+@pytest.fixture(scope="module")
+def corpus(tmp_path_factory):
+    return generate_corpus(str(tmp_path_factory.mktemp("pdfs")), documents=3, pages=2)
+
+
+def open_collection(ollama, name):
+    return RAGHandler(collection_name=name, ollama_client=OllamaClient(host=ollama.url, chat_model="bench"))
+
+
+def test_index_update_and_remove(ollama, corpus):
+    paths, _ = corpus
+    handler = open_collection(ollama, "ingestion")
+    assert handler.process_pdfs(paths) == 3
+    # Documents inchangés : rien n'est réindexé
+    assert handler.process_pdfs(paths) == 0
+
+    file_ids = [os.path.basename(path) for path in paths]
+    chunk_ids = handler.registry.chunk_ids(file_ids)
+    assert chunk_ids
+    assert sorted(handler.vector_store.get_all()[0]) == sorted(chunk_ids)
+    assert len(handler.keyword_index) == len(chunk_ids)
+
+    handler.remove_documents(file_ids[:1])
+    remaining = handler.registry.chunk_ids(file_ids[1:])
+    assert handler.registry.file_ids() == file_ids[1:]
+    assert sorted(handler.vector_store.get_all()[0]) == sorted(remaining)
+    assert len(handler.keyword_index) == len(remaining)
+
+    # Une autre ouverture de la collection retrouve le même état sur disque
+    reopened = open_collection(ollama, "ingestion")
+    assert sorted(reopened.registry.file_ids()) == file_ids[1:]
+    assert len(reopened.keyword_index) == len(remaining)
+
+
+def test_retrieval_finds_the_source_document(ollama, corpus):
+    paths, questions = corpus
+    handler = open_collection(ollama, "retrieval")
+    handler.process_pdfs(paths)
+    found = 0
+    for question, expected in questions:
+        sources = {document.metadata.get("source") for document in handler.retriever.invoke(question)}
+        found += any(source and os.path.basename(source) == expected for source in sources)
+    assert found >= len(questions) - 1
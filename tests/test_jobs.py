@@ -0,0 +1,87 @@
+import threading
+import time
+
+import pytest
+
+from admission import Overloaded
+from jobs import JobManager
+
+
+def wait_for(manager, job_id, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = manager.get(job_id)
+        if job["status"] in ("done", "error"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"Travail {job_id} non terminé: {manager.get(job_id)}")
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = JobManager(str(tmp_path / "jobs.db"), max_pending=2, max_attempts=3, retry_delay=0.01)
+    yield manager
+    manager.shutdown()
+
+
+def test_same_key_reuses_the_active_job(manager):
+    release = threading.Event()
+    manager.register("ingest", lambda job, progress: release.wait(5))
+    first = manager.submit("ingest", {"files": ["a"]}, key="ingest:a")
+    second = manager.submit("ingest", {"files": ["a"]}, key="ingest:a")
+    assert second["id"] == first["id"]
+    release.set()
+    wait_for(manager, first["id"])
+    # Une fois terminé, la même clé planifie un nouveau travail
+    assert manager.submit("ingest", {"files": ["a"]}, key="ingest:a")["id"] != first["id"]
+
+
+def test_max_pending(manager):
+    manager.submit("ingest", {}, key="a")
+    manager.submit("ingest", {}, key="b")
+    with pytest.raises(Overloaded):
+        manager.submit("ingest", {}, key="c")
+    # Un travail identique n'occupe pas de place supplémentaire
+    assert manager.submit("ingest", {}, key="a")
+
+
+def test_failed_job_is_retried(manager):
+    def flaky(job, progress):
+        progress("a.pdf", stage="index", attempt=job["attempts"])
+        if job["attempts"] < 2:
+            raise RuntimeError("Ollama indisponible")
+        return {"indexed": 1}
+
+    manager.register("ingest", flaky)
+    job = wait_for(manager, manager.submit("ingest", {})["id"])
+    assert job["status"] == "done"
+    assert job["attempts"] == 2
+    assert job["result"] == {"indexed": 1}
+    assert job["error"] is None
+    assert job["items"] == {"a.pdf": {"stage": "index", "attempt": 2}}
+
+
+def test_job_fails_after_max_attempts(manager):
+    def broken(job, progress):
+        raise RuntimeError("PDF illisible")
+
+    manager.register("ingest", broken)
+    job = wait_for(manager, manager.submit("ingest", {})["id"])
+    assert job["status"] == "error"
+    assert job["attempts"] == 3
+    assert job["error"] == "PDF illisible"
+
+
+def test_jobs_survive_a_restart(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    first = JobManager(path)
+    job = first.submit("ingest", {"files": ["a"]}, lane="docs")
+    first.shutdown()
+
+    second = JobManager(path)
+    try:
+        second.register("ingest", lambda job, progress: job["payload"]["files"])
+        assert wait_for(second, job["id"])["result"] == ["a"]
+        assert [j["id"] for j in second.list(lane="docs")] == [job["id"]]
+    finally:
+        second.shutdown()
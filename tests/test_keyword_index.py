@@ -0,0 +1,56 @@
+from keyword_index import KeywordIndex, reciprocal_rank_fusion
+
+TEXTS = {
+    "c1": "La contribution vie étudiante est due avant l'inscription, attestation CVEC-2024-00A1F.",
+    "c2": "La contribution est payée en ligne ; l'attestation CVEC-2024-00B7C est remise à l'étudiant.",
+    "c3": "Le logement en résidence universitaire dépend des ressources de l'étudiant.",
+}
+
+
+def build(path=None):
+    index = KeywordIndex(path)
+    index.add(list(TEXTS), list(TEXTS.values()), [{"file_id": chunk_id} for chunk_id in TEXTS])
+    return index
+
+
+def test_exact_identifier_ranks_first():
+    results = build().search("attestation CVEC-2024-00B7C", k=3)
+    assert results[0][0] == "c2"
+    assert "c3" not in [chunk_id for chunk_id, _ in results]
+
+
+def test_allowed_ids_restrict_the_search():
+    index = build()
+    results = index.search("attestation CVEC-2024-00B7C", k=3, allowed_ids={"c1", "c3"})
+    assert [chunk_id for chunk_id, _ in results] == ["c1"]
+
+
+def test_remove_and_reindex():
+    index = build()
+    index.remove(["c2"])
+    assert len(index) == 2
+    assert "c2" not in [chunk_id for chunk_id, _ in index.search("CVEC-2024-00B7C")]
+    index.add(["c1"], ["résidence universitaire"], [{}])
+    assert len(index) == 2
+    assert {chunk_id for chunk_id, _ in index.search("résidence")} == {"c1", "c3"}
+
+
+def test_search_chunks_returns_text_and_metadata():
+    chunk_id, score, text, metadata = build().search_chunks("logement", k=1)[0]
+    assert (chunk_id, text, metadata) == ("c3", TEXTS["c3"], {"file_id": "c3"})
+    assert score > 0
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / "index.pkl")
+    index = build(path)
+    index.version = "v1"
+    index.save()
+    loaded = KeywordIndex(path)
+    assert loaded.version == "v1"
+    assert loaded.search("attestation CVEC-2024-00A1F", k=3) == index.search("attestation CVEC-2024-00A1F", k=3)
+
+
+def test_reciprocal_rank_fusion():
+    assert reciprocal_rank_fusion([["a", "b", "c"], ["b", "c"]]) == ["b", "c", "a"]
+    assert reciprocal_rank_fusion([["a", "b"], ["b", "a"]], weights=[1.0, 0.5])[0] == "a"
@@ -0,0 +1,60 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from page_extraction import PageCache, PageExtractor
+
+PAGE = "x" * 1000
+
+
+def fill(cache, content_hash, pages=4):
+    cache.put_many(content_hash, "layout", [(number, PAGE) for number in range(pages)])
+
+
+def cached(cache, content_hash, pages=4):
+    return len(cache.missing_pages(content_hash, "layout", pages)) == 0
+
+
+def test_least_recently_used_documents_are_evicted(tmp_path):
+    cache = PageCache(str(tmp_path / "pages.sqlite"), max_bytes=10000)
+    for content_hash in ("a", "b", "c"):
+        fill(cache, content_hash)
+    assert not cached(cache, "a")
+    assert cached(cache, "b") and cached(cache, "c")
+    assert cache.size_bytes <= 10000
+
+
+def test_pinned_documents_are_not_evicted(tmp_path):
+    path = str(tmp_path / "pages.sqlite")
+    ingest = PageCache(path, max_bytes=10000)
+    # Autre ingestion (autre processus) sur le même cache
+    other = PageCache(path, max_bytes=10000)
+    fill(ingest, "a")
+    ingest.pin("a")
+    fill(other, "b")
+    fill(other, "c")
+    assert cached(ingest, "a")
+    assert not cached(ingest, "b")
+
+    ingest.unpin("a")
+    fill(other, "d")
+    assert not cached(ingest, "a")
+
+
+def test_expired_pins_are_ignored(tmp_path):
+    cache = PageCache(str(tmp_path / "pages.sqlite"), max_bytes=10000, pin_ttl=0)
+    fill(cache, "a")
+    cache.pin("a")
+    fill(cache, "b")
+    fill(cache, "c")
+    assert not cached(cache, "a")
+
+
+def test_documents_fail_on_missing_pages(tmp_path):
+    cache = PageCache(str(tmp_path / "pages.sqlite"))
+    with ThreadPoolExecutor(1) as pool:
+        extractor = PageExtractor(cache=cache, pool=pool, mode="layout")
+        fill(cache, "a", pages=3)
+        assert [page.metadata["page"] for page in extractor.documents("a", page_count=3)] == [0, 1, 2]
+        with pytest.raises(RuntimeError):
+            list(extractor.documents("a", page_count=5))
@@ -0,0 +1,160 @@
+import os
+
+import numpy as np
+import pytest
+
+from vector_backends import NumpyBackend
+
+DIMENSIONS = 32
+
+
+def corpus(count, files=4, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((count, DIMENSIONS)).astype(np.float32)
+    ids = [f"doc-{i % files}:v1:{i}" for i in range(count)]
+    metadatas = [{"file_id": f"doc-{i % files}", "chunk_id": ids[i]} for i in range(count)]
+    return ids, vectors, [f"texte {i}" for i in range(count)], metadatas
+
+
+def nearest(backend, vector, k=1, file_ids=None):
+    documents = backend.similarity_search_by_vector(vector, k=k, file_ids=file_ids)
+    return [document.metadata["chunk_id"] for document in documents]
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_finds_the_exact_vector(tmp_path, dtype):
+    ids, vectors, texts, metadatas = corpus(200)
+    backend = NumpyBackend(str(tmp_path), dtype=dtype)
+    backend.upsert(ids, vectors, texts, metadatas)
+    assert backend.count() == 200
+    for i in (0, 57, 199):
+        assert nearest(backend, vectors[i], k=3)[0] == ids[i]
+        assert backend.search(vectors[i], k=1)[0][1] == pytest.approx(1.0, abs=0.02)
+
+
+def test_file_filter_and_delete(tmp_path):
+    ids, vectors, texts, metadatas = corpus(100)
+    backend = NumpyBackend(str(tmp_path))
+    backend.upsert(ids, vectors, texts, metadatas)
+
+    documents = backend.similarity_search_by_vector(vectors[0], k=10, file_ids=["doc-1", "doc-2"])
+    assert len(documents) == 10
+    assert {document.metadata["file_id"] for document in documents} <= {"doc-1", "doc-2"}
+
+    backend.delete([ids[0], "inconnu"])
+    assert backend.count() == 99
+    assert ids[0] not in nearest(backend, vectors[0], k=5)
+    assert backend.get([ids[0], ids[1]]) == ([ids[1]], [texts[1]], [metadatas[1]])
+
+
+def test_upsert_replaces_a_chunk(tmp_path):
+    ids, vectors, texts, metadatas = corpus(10)
+    backend = NumpyBackend(str(tmp_path))
+    backend.upsert(ids, vectors, texts, metadatas)
+    backend.upsert(ids[:1], vectors[5:6], ["nouveau"], metadatas[:1])
+    assert backend.count() == 10
+    assert backend.get(ids[:1])[1] == ["nouveau"]
+    assert ids[0] in nearest(backend, vectors[5], k=2)
+
+
+def test_dimension_mismatch(tmp_path):
+    ids, vectors, texts, metadatas = corpus(2)
+    backend = NumpyBackend(str(tmp_path))
+    backend.upsert(ids[:1], vectors[:1], texts[:1], metadatas[:1])
+    with pytest.raises(ValueError):
+        backend.upsert(ids[1:], np.ones((1, DIMENSIONS + 1)), texts[1:], metadatas[1:])
+
+
+def test_reopen_and_refresh(tmp_path):
+    ids, vectors, texts, metadatas = corpus(50)
+    writer = NumpyBackend(str(tmp_path))
+    reader = NumpyBackend(str(tmp_path))
+    writer.upsert(ids[:40], vectors[:40], texts[:40], metadatas[:40])
+    writer.delete(ids[:5])
+
+    assert reader.count() == 0
+    reader.refresh()
+    assert reader.get_all()[0] == ids[5:40]
+
+    # Écritures successives de l'autre instance : seule la fin du journal est rejouée
+    writer.upsert(ids[40:], vectors[40:], texts[40:], metadatas[40:])
+    reader.refresh()
+    assert reader.count() == 45
+    assert nearest(reader, vectors[45]) == [ids[45]]
+
+    reopened = NumpyBackend(str(tmp_path))
+    assert reopened.get_all() == writer.get_all()
+
+
+def test_ivf_search(tmp_path):
+    ids, vectors, texts, metadatas = corpus(2000, files=20)
+    backend = NumpyBackend(str(tmp_path), index="ivf", nprobe=8)
+    backend.upsert(ids, vectors, texts, metadatas)
+    backend.persist()
+    assert os.path.exists(os.path.join(str(tmp_path), "ivf.npz"))
+
+    found = sum(nearest(backend, vectors[i]) == [ids[i]] for i in range(0, 2000, 20))
+    assert found >= 90
+
+    # Vecteurs ajoutés après la construction : parcourus en plus des listes sondées
+    _, extra_vectors, extra_texts, _ = corpus(10, seed=1)
+    extra_ids = [f"extra:{i}" for i in range(10)]
+    extra_metadatas = [{"file_id": "extra", "chunk_id": chunk_id} for chunk_id in extra_ids]
+    backend.upsert(extra_ids, extra_vectors, extra_texts, extra_metadatas)
+    assert nearest(backend, extra_vectors[3]) == ["extra:3"]
+
+    reopened = NumpyBackend(str(tmp_path), index="ivf", nprobe=8)
+    assert nearest(reopened, vectors[40]) == [ids[40]]
+
+
+def test_reset(tmp_path):
+    ids, vectors, texts, metadatas = corpus(10)
+    backend = NumpyBackend(str(tmp_path))
+    backend.upsert(ids, vectors, texts, metadatas)
+    backend.reset()
+    assert backend.count() == 0
+    assert backend.search(vectors[0]) == []
+    assert NumpyBackend(str(tmp_path)).count() == 0
+
+
+def test_chroma_sees_writes_of_another_process(tmp_path):
+    pytest.importorskip("chromadb")
+    import subprocess
+    import sys
+
+    from vector_backends import ChromaBackend, SharedChromaClient
+
+    class Lookup:
+        """Embedding d'une requête "i" : le vecteur i du corpus"""
+
+        def embed_query(self, text):
+            return vectors[int(text)].tolist()
+
+    def nearest_chroma(i):
+        return [document.metadata["chunk_id"] for document in backend.similarity_search(str(i), k=1)]
+
+    path = str(tmp_path / "chroma")
+    ids, vectors, texts, metadatas = corpus(20)
+    shared = SharedChromaClient(path)
+    backend = ChromaBackend(shared, "tests", Lookup())
+    backend.upsert(ids[:10], vectors[:10].tolist(), texts[:10], metadatas[:10])
+    assert nearest_chroma(15) != [ids[15]]
+
+    writer = (
+        "import sys; sys.path.insert(0, sys.argv[1]); import numpy as np\n"
+        "from vector_backends import ChromaBackend, SharedChromaClient\n"
+        "backend = ChromaBackend(SharedChromaClient(sys.argv[2]), 'tests', None)\n"
+        "backend.upsert([sys.argv[3]], [np.load(sys.argv[4]).tolist()], ['texte'],"
+        " [{'file_id': 'doc-3', 'chunk_id': sys.argv[3]}])\n"
+    )
+    np.save(tmp_path / "vector.npy", vectors[15])
+    src = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+    subprocess.run([sys.executable, "-c", writer, src, path, ids[15], str(tmp_path / "vector.npy")], check=True)
+
+    with shared.using() as previous:
+        pass
+    backend.refresh()
+    assert nearest_chroma(15) == [ids[15]]
+    with shared.using() as client:
+        assert client is not previous
+    assert backend.count() == 11